@@ -0,0 +1,129 @@
+"""
+Access Log Policy
+Decides which requests the after_request hook records, and how.
+
+For every response the policy returns one of:
+- 'log':   write a full ACCESS entry (file, stdout and system_logs)
+- 'count': add the request to a per-minute hit counter (summary mode)
+- 'skip':  record nothing
+
+Errors (4xx/5xx) and admin routes are always logged. Excluded paths (static
+files, health checks, the polled /neb/api/stats/* endpoints) are skipped,
+including their 304 revalidations.
+Everything else is sampled per endpoint, or counted in summary mode. Counters
+are written as one ACCESS row per (minute, method, endpoint, status) once the
+minute is over. Minutes are UTC, like the system_logs timestamps.
+"""
+
+import atexit
+import logging
+import random
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+
+from log_sink import log_sink
+
+
+access_logger = logging.getLogger('access_logger')
+
+ACCESS_LOG_MODES = ('full', 'summary')
+
+
+class AccessLogPolicy:
+    """Sampling, filtering and per-minute aggregation for ACCESS logs"""
+
+    def __init__(self, app=None):
+        self.mode = 'full'
+        self.exclude_paths = ()
+        self.always_paths = ()
+        self.sample_rates = {}
+        self.default_sample_rate = 1.0
+
+        self._counts = Counter()
+        self._current_minute = None
+        self._lock = threading.Lock()
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.mode = app.config.get('ACCESS_LOG_MODE', 'full')
+        if self.mode not in ACCESS_LOG_MODES:
+            raise ValueError(f"ACCESS_LOG_MODE must be one of {ACCESS_LOG_MODES}")
+        self.exclude_paths = tuple(app.config.get('ACCESS_LOG_EXCLUDE_PATHS', ()))
+        self.always_paths = tuple(app.config.get('ACCESS_LOG_ALWAYS_PATHS', ()))
+        self.sample_rates = dict(app.config.get('ACCESS_LOG_SAMPLE_RATES', {}))
+        self.default_sample_rate = app.config.get('ACCESS_LOG_DEFAULT_SAMPLE_RATE', 1.0)
+
+        app.extensions['access_log_policy'] = self
+        atexit.register(self.flush_summaries)
+
+    def decide(self, path, endpoint, status_code):
+        """
+        Decide how to record a request.
+
+        Args:
+            path: Request path
+            endpoint: Flask endpoint name (None for unmatched routes)
+            status_code: Response status code
+
+        Returns:
+            str: 'log', 'count' or 'skip'
+        """
+        # Redirects and 304 Not Modified are successes too
+        if status_code >= 400:
+            return 'log'
+        if path.startswith(self.always_paths):
+            return 'log'
+        if path.startswith(self.exclude_paths):
+            return 'skip'
+        if self.mode == 'summary':
+            return 'count'
+
+        rate = self.sample_rates.get(endpoint, self.default_sample_rate)
+        if rate >= 1 or random.random() < rate:
+            return 'log'
+        return 'skip'
+
+    # ========================
+    # Summary mode
+    # ========================
+    def count(self, method, endpoint, status_code, now=None):
+        """Add one hit to the current minute's counters."""
+        minute = (now or datetime.utcnow()).replace(second=0, microsecond=0)
+        finished = None
+        with self._lock:
+            if self._current_minute is not None and minute != self._current_minute:
+                finished = (self._current_minute, self._counts)
+                self._counts = Counter()
+            self._current_minute = minute
+            self._counts[(method, endpoint or 'unknown', status_code)] += 1
+
+        if finished:
+            self._write_summaries(*finished)
+
+    def flush_summaries(self):
+        """Write out the counters of the minute in progress."""
+        with self._lock:
+            minute, counts = self._current_minute, self._counts
+            self._current_minute, self._counts = None, Counter()
+        if minute is not None and counts:
+            self._write_summaries(minute, counts)
+
+    @staticmethod
+    def _write_summaries(minute, counts):
+        window = f"{minute:%Y-%m-%d %H:%M}-{minute + timedelta(minutes=1):%H:%M}"
+        for (method, endpoint, status_code), hits in sorted(counts.items()):
+            message = f"{method} {endpoint} {status_code} x{hits}"
+            access_logger.info(f"[ACCESS] {message} ({window})")
+            log_sink.emit(
+                log_type='ACCESS',
+                level='INFO',
+                message=message,
+                module='access_summary',
+                details=f"Hits: {hits} | Window: {window}"
+            )
+
+
+access_log_policy = AccessLogPolicy()
@@ -0,0 +1,216 @@
+"""
+Response cache for the public stats API.
+
+Responses are cached per route + query string with a per-route TTL and served
+with ETag / Cache-Control headers so browsers and proxies can revalidate with
+a cheap 304. Rendered HTML pages use the same cache, keyed additionally on
+whatever they vary by (e.g. the session language). Two storage backends are
+available:
+
+- memory: in-process LRU (default, one cache per worker)
+- sqlite: a local SQLite file shared by every worker on the host, so an
+  invalidation in one worker is seen by all of them
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from functools import wraps
+
+from flask import Response, current_app, make_response, request
+
+
+CacheEntry = namedtuple('CacheEntry', ['body', 'mimetype', 'etag', 'expires_at'])
+
+
+class MemoryBackend:
+    """Thread-safe in-process LRU store"""
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteBackend:
+    """Store shared between worker processes through a local SQLite file"""
+
+    def __init__(self, path, max_entries=512):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache ("
+                " key TEXT PRIMARY KEY, body BLOB NOT NULL, mimetype TEXT NOT NULL,"
+                " etag TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._connect().execute(
+            "SELECT body, mimetype, etag, expires_at FROM response_cache"
+            " WHERE key = ? AND expires_at > ?",
+            (key, time.time())
+        ).fetchone()
+        return CacheEntry(*row) if row else None
+
+    def set(self, key, entry):
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO response_cache (key, body, mimetype, etag, expires_at)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (key, entry.body, entry.mimetype, entry.etag, entry.expires_at)
+        )
+        # Keep the table bounded: drop expired rows, then the soonest-to-expire
+        conn.execute("DELETE FROM response_cache WHERE expires_at <= ?", (time.time(),))
+        conn.execute(
+            "DELETE FROM response_cache WHERE key IN ("
+            " SELECT key FROM response_cache ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+
+    def delete(self, key):
+        self._connect().execute("DELETE FROM response_cache WHERE key = ?", (key,))
+
+    def clear(self):
+        self._connect().execute("DELETE FROM response_cache")
+
+
+class StatsCache:
+    """Route-level response cache with TTLs, explicit invalidation and ETags"""
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.enabled = False
+        self.default_ttl = 60
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('STATS_CACHE_ENABLED', True)
+        self.default_ttl = app.config.get('STATS_CACHE_DEFAULT_TTL', 60)
+        max_entries = app.config.get('STATS_CACHE_MAX_ENTRIES', 512)
+
+        if app.config.get('STATS_CACHE_BACKEND', 'memory') == 'sqlite':
+            path = app.config.get('STATS_CACHE_PATH') or os.path.join(app.instance_path, 'stats_cache.db')
+            self.backend = SQLiteBackend(path, max_entries)
+        else:
+            self.backend = MemoryBackend(max_entries)
+
+        app.extensions['stats_cache'] = self
+
+    @staticmethod
+    def make_key(namespace=''):
+        """Cache key for the current request: route + sorted query args."""
+        args = '&'.join(f"{k}={v}" for k, v in sorted(request.args.items(multi=True)))
+        return f"{namespace}{request.path}?{args}"
+
+    def get(self, key):
+        if not self.enabled or self.backend is None:
+            return None
+        try:
+            return self.backend.get(key)
+        except Exception as e:
+            current_app.logger.warning(f"Stats cache read failed: {e}")
+            return None
+
+    def set(self, key, body, mimetype, ttl=None):
+        """Store a rendered body and return its CacheEntry."""
+        ttl = ttl or self.default_ttl
+        entry = CacheEntry(body, mimetype, hashlib.sha1(body).hexdigest(), time.time() + ttl)
+        if self.enabled and self.backend is not None:
+            try:
+                self.backend.set(key, entry)
+            except Exception as e:
+                current_app.logger.warning(f"Stats cache write failed: {e}")
+        return entry
+
+    def invalidate(self):
+        """Drop every cached response (called when pledge data changes)."""
+        if self.backend is None:
+            return
+        try:
+            self.backend.clear()
+        except Exception as e:
+            current_app.logger.warning(f"Stats cache invalidation failed: {e}")
+
+    @staticmethod
+    def conditional_response(entry, max_age=None):
+        """Build a response for a cache entry, answering If-None-Match with 304."""
+        if max_age is None:
+            max_age = max(round(entry.expires_at - time.time()), 0)
+        response = Response(entry.body, mimetype=entry.mimetype)
+        response.set_etag(entry.etag)
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+        return response.make_conditional(request)
+
+    def cached(self, ttl=None, vary=None, unless=None, max_age=None):
+        """
+        Cache a view's 200 responses for `ttl` seconds (default STATS_CACHE_DEFAULT_TTL).
+
+        Args:
+            ttl: Optional per-route time to live in seconds
+            vary: Optional callable returning what else the response depends on
+                (added to the cache key, e.g. the session language)
+            unless: Optional callable; when it returns True the view runs uncached
+            max_age: Optional browser max-age (defaults to the remaining TTL;
+                0 makes browsers revalidate every time)
+        """
+        def decorator(f):
+            @wraps(f)
+            def wrapper(*args, **kwargs):
+                if unless is not None and unless():
+                    return f(*args, **kwargs)
+                key = self.make_key(f"{vary()}:" if vary is not None else '')
+                entry = self.get(key)
+                if entry is None:
+                    response = make_response(f(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+                    entry = self.set(key, response.get_data(), response.mimetype, ttl)
+                return self.conditional_response(entry, max_age)
+            return wrapper
+        return decorator
+
+
+stats_cache = StatsCache()
@@ -1,97 +1,189 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, request
 from dashboard_analytics import DashboardAnalytics
+from api.cache import stats_cache
 
 stats_bp = Blueprint('stats', __name__, url_prefix='/neb/api/stats')
 
+
+# ========================
+# Widget payload builders
+# ========================
+# Each public widget is built by one function so the single-widget routes and
+# the /bundle route share exactly the same payloads.
+
+def summary_widget():
+    return DashboardAnalytics.get_summary_stats()
+
+def monthly_widget():
+    # Ensure current year focus if needed by frontend, but standard monthly is fine
+    return DashboardAnalytics.get_temporal_trends(period='monthly', limit=12)
+
+def weekly_widget():
+    data = DashboardAnalytics.get_temporal_trends(period='daily', limit=7)
+    return {
+        'labels': data['labels'],
+        'data': data['data']
+    }
+
+def yearly_widget():
+    return DashboardAnalytics.get_temporal_trends(period='yearly')
+
+def historical_widget():
+    return DashboardAnalytics.get_historical_comparison(years=5)
+
+def comparative_widget():
+    return DashboardAnalytics.get_comparative_metrics()
+
+def sources_widget():
+    return DashboardAnalytics.get_source_distribution()
+
+def consent_widget():
+    return DashboardAnalytics.get_medical_consent_stats()
+
+def states_widget():
+    # Assuming frontend wants simple list or detailed map data
+    data = DashboardAnalytics.get_geographic_distribution(top_n=5)
+
+    # Format for the list view in stats.html
+    # The existing template expects a list of [state, count] tuples or objects
+    return [[s['state'], s['count']] for s in data['top_states']]
+
+def demographics_widget():
+    data = DashboardAnalytics.get_demographic_insights()
+
+    # Age chart data formatting
+    age_labels = [item['group'] for item in data['age_groups']]
+    age_counts = [item['count'] for item in data['age_groups']]
+
+    # Gender chart data formatting
+    gender_labels = [item['gender'] for item in data['gender']]
+    gender_counts = [item['count'] for item in data['gender']]
+
+    return {
+        'age': {'labels': age_labels, 'data': age_counts},
+        'gender': {'labels': gender_labels, 'data': gender_counts}
+    }
+
+def hourly_widget():
+    return DashboardAnalytics.get_peak_activity_analysis()['hourly']
+
+
+STATS_WIDGETS = {
+    'summary': summary_widget,
+    'monthly': monthly_widget,
+    'weekly': weekly_widget,
+    'yearly': yearly_widget,
+    'historical': historical_widget,
+    'comparative': comparative_widget,
+    'sources': sources_widget,
+    'consent': consent_widget,
+    'states': states_widget,
+    'demographics': demographics_widget,
+    'hourly': hourly_widget,
+}
+
+
+def parse_widget_names(registry):
+    """
+    Read the requested widget list from ?widgets=a,b,c (or repeated ?widget=).
+
+    Returns:
+        tuple: (names, unknown) - all widgets when none are requested
+    """
+    names = []
+    for value in request.args.getlist('widgets') + request.args.getlist('widget'):
+        names.extend(n.strip() for n in value.split(',') if n.strip())
+    if not names:
+        names = list(registry)
+    unknown = [n for n in names if n not in registry]
+    return list(dict.fromkeys(names)), unknown
+
+
+# ========================
+# Routes
+# ========================
+@stats_bp.route('/bundle')
+@stats_cache.cached(ttl=60)
+def get_bundle():
+    """Get several widgets in one response: /bundle?widgets=summary,monthly"""
+    names, unknown = parse_widget_names(STATS_WIDGETS)
+    if unknown:
+        return jsonify({
+            'error': f"Unknown widgets: {', '.join(unknown)}",
+            'available': list(STATS_WIDGETS)
+        }), 400
+    data = DashboardAnalytics.compute_bundle(STATS_WIDGETS, names)
+    return jsonify(data)
+
 @stats_bp.route('/summary')
+@stats_cache.cached(ttl=30)
 def get_summary():
     """Get high-level summary statistics"""
-    data = DashboardAnalytics.get_summary_stats()
-    return jsonify(data)
+    return jsonify(summary_widget())
 
 @stats_bp.route('/monthly')
+@stats_cache.cached(ttl=300)
 def get_monthly_trend():
     """Get monthly pledge trend for the current year"""
-    data = DashboardAnalytics.get_temporal_trends(period='monthly', limit=12)
-    # Ensure current year focus if needed by frontend, but standard monthly is fine
-    return jsonify(data)
+    return jsonify(monthly_widget())
 
 @stats_bp.route('/weekly')
+@stats_cache.cached(ttl=120)
 def get_weekly_trend():
     """Get last 7 days pledge trend"""
-    data = DashboardAnalytics.get_temporal_trends(period='daily', limit=7)
-    return jsonify({
-        'labels': data['labels'],
-        'data': data['data']
-    })
+    return jsonify(weekly_widget())
 
 @stats_bp.route('/yearly')
+@stats_cache.cached(ttl=900)
 def get_yearly_growth():
     """Get yearly cumulative growth"""
-    data = DashboardAnalytics.get_temporal_trends(period='yearly')
-    return jsonify(data)
+    return jsonify(yearly_widget())
 
 @stats_bp.route('/historical')
+@stats_cache.cached(ttl=900)
 def get_historical():
     """Get multi-year historical data"""
-    data = DashboardAnalytics.get_historical_comparison(years=5)
-    return jsonify(data)
+    return jsonify(historical_widget())
 
 @stats_bp.route('/comparative')
+@stats_cache.cached(ttl=300)
 def get_comparative():
     """Get comparative growth metrics"""
-    data = DashboardAnalytics.get_comparative_metrics()
-    return jsonify(data)
+    return jsonify(comparative_widget())
 
 @stats_bp.route('/sources')
+@stats_cache.cached(ttl=300)
 def get_sources():
     """Get pledge source distribution"""
-    data = DashboardAnalytics.get_source_distribution()
-    return jsonify(data)
+    return jsonify(sources_widget())
 
 @stats_bp.route('/consent')
+@stats_cache.cached(ttl=300)
 def get_consent():
     """Get medical consent breakdown"""
-    data = DashboardAnalytics.get_medical_consent_stats()
-    return jsonify(data)
+    return jsonify(consent_widget())
 
 @stats_bp.route('/districts/<path:state_name>')
+@stats_cache.cached(ttl=300)
 def get_districts(state_name):
     """Get district stats for a state"""
     data = DashboardAnalytics.get_district_wise_stats(state_name)
     return jsonify(data)
 
 @stats_bp.route('/states')
+@stats_cache.cached(ttl=300)
 def get_top_states():
     """Get top contributing states"""
-    # Assuming frontend wants simple list or detailed map data
-    data = DashboardAnalytics.get_geographic_distribution(top_n=5)
-    
-    # Format for the list view in stats.html
-    # The existing template expects a list of [state, count] tuples or objects
-    formatted_states = [[s['state'], s['count']] for s in data['top_states']]
-    return jsonify(formatted_states)
+    return jsonify(states_widget())
 
 @stats_bp.route('/demographics')
+@stats_cache.cached(ttl=300)
 def get_demographics():
     """Get age and gender distribution"""
-    data = DashboardAnalytics.get_demographic_insights()
-    
-    # Age chart data formatting
-    age_labels = [item['group'] for item in data['age_groups']]
-    age_counts = [item['count'] for item in data['age_groups']]
-    
-    # Gender chart data formatting
-    gender_labels = [item['gender'] for item in data['gender']]
-    gender_counts = [item['count'] for item in data['gender']]
-    
-    return jsonify({
-        'age': {'labels': age_labels, 'data': age_counts},
-        'gender': {'labels': gender_labels, 'data': gender_counts}
-    })
+    return jsonify(demographics_widget())
 
 @stats_bp.route('/hourly')
+@stats_cache.cached(ttl=300)
 def get_hourly_activity():
     """Get hourly activity pattern"""
-    data = DashboardAnalytics.get_peak_activity_analysis()
-    return jsonify(data['hourly'])
+    return jsonify(hourly_widget())
@@ -1,20 +1,37 @@
 from datetime import datetime, timedelta
+import json
 from functools import wraps
 import os
-import csv
-from io import StringIO
-from util import generate_eye_donor_card, fill_eye_donor_card_fields, images_to_pdf
 
 
-from flask import Flask, render_template, send_file, request, redirect, url_for, flash, session, make_response, send_from_directory, Response, has_request_context
+from flask import Flask, render_template, send_file, request, redirect, url_for, flash, session, make_response, send_from_directory, Response, has_request_context, stream_with_context, jsonify
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from werkzeug.security import generate_password_hash, check_password_hash
 
 from config import Config
-from models import EyeDonationPledge, AdminUser, AuditLog, SystemLog, db
+from models import EyeDonationPledge, AdminUser, AuditLog, ExportJob, SourceEnum, db
 from translations import TRANSLATIONS
 from api.stats_routes import stats_bp
+from api.cache import stats_cache
+from counters import pledge_counters
+from log_sink import log_sink
+from log_partitions import log_partitions
+from access_log import access_log_policy
+from pagination import paginate_keyset, paginate_ranked, approximate_count
+from search_index import filter_pledges, pledge_filters_from_args
+from reference import reference_numbers
+from validation import validate_pledge_data
+from time_buckets import bucket, series
+from dashboard_analytics import DashboardAnalytics
+from card_service import card_service, CARD_VARIANTS
+from card_verification import card_verifier
+from artifact_store import artifact_store
+from task_queue import task_queue
+from exports import export_rows, iter_csv, export_jobs, available_formats, EXPORT_FORMATS, RECORD_FIELDS
+from imports import pledge_importer, available_formats as import_formats, FIELD_COLUMNS as IMPORT_FIELDS
+import rollup  # registers the pledge_daily_rollup maintenance listeners
+import pledge_tasks  # registers the post-commit pledge task handlers
 
 import logging
 import sys
@@ -77,6 +94,18 @@ def create_app(config_name='development'):
     
     db.init_app(app)
     migrate.init_app(app, db)
+    stats_cache.init_app(app)
+    pledge_counters.init_app(app)
+    log_partitions.init_app(app)
+    export_jobs.init_app(app)
+    pledge_importer.init_app(app)
+    reference_numbers.init_app(app)
+    artifact_store.init_app(app)
+    card_service.init_app(app)
+    card_verifier.init_app(app)
+    task_queue.init_app(app)
+    log_sink.init_app(app)
+    access_log_policy.init_app(app)
     
     # Register Blueprints
     # Register Blueprints
@@ -85,6 +114,14 @@ def create_app(config_name='development'):
     # Register CLI Commands
     import commands
     app.cli.add_command(commands.create_admin_command)
+    app.cli.add_command(commands.rollup_backfill_command)
+    app.cli.add_command(commands.logs_partition_init_command)
+    app.cli.add_command(commands.logs_retention_command)
+    app.cli.add_command(commands.search_reindex_command)
+    app.cli.add_command(commands.generate_cards_command)
+    app.cli.add_command(commands.tasks_command)
+    app.cli.add_command(commands.import_pledges_command)
+    app.cli.add_command(commands.index_report_command)
 
     # Import models from external file if exists, otherwise define here
     
@@ -165,22 +202,19 @@ def create_app(config_name='development'):
         elif level == 'CRITICAL': target_logger.critical(log_msg)
         else: target_logger.info(log_msg)
         
-        # 3. Database Log (SystemLog)
+        # 3. Database Log (SystemLog) - queued and bulk-written off the request path
         try:
-            if db.session:
-                system_log = SystemLog(
-                    log_type=log_type,
-                    level=level,
-                    message=message,
-                    module=module,
-                    user_id=user_id,
-                    ip_address=request.remote_addr if has_request_context() else None,
-                    details=str(details) if details else None
-                )
-                db.session.add(system_log)
-                db.session.commit()
+            log_sink.emit(
+                log_type=log_type,
+                level=level,
+                message=message,
+                module=module,
+                user_id=user_id,
+                ip_address=request.remote_addr if has_request_context() else None,
+                details=str(details) if details else None
+            )
         except Exception as e:
-            error_logger.error(f"Failed to write to SystemLog DB: {e}")
+            error_logger.error(f"Failed to queue SystemLog entry: {e}")
 
     def log_security_event(event_type, message, level='INFO', user_id=None, pledge_id=None):
         """Backward compatibility wrapper for existing code"""
@@ -192,7 +226,12 @@ def create_app(config_name='development'):
     # ========================
     @app.after_request
     def log_request_info(response):
-        if request.path.startswith('/static') or request.path.endswith('favicon.ico'):
+        # Sampling / exclusion / summary policy (see access_log.py)
+        decision = access_log_policy.decide(request.path, request.endpoint, response.status_code)
+        if decision == 'skip':
+            return response
+        if decision == 'count':
+            access_log_policy.count(request.method, request.endpoint, response.status_code)
             return response
         
         # Build comprehensive details
@@ -228,14 +267,8 @@ def create_app(config_name='development'):
     # Utility Functions
     # ========================
     def generate_reference_number():
-        """Generate unique reference number: NEB-YYYY-XXXXXX"""
-        year = datetime.now().year
-        last_pledge = EyeDonationPledge.query.filter_by(is_active=True).order_by(
-            EyeDonationPledge.id.desc()
-        ).first()
-        
-        sequence = 1 if not last_pledge else last_pledge.id + 1
-        return f"NEB-{year}-{sequence:06d}"
+        """Generate unique reference number: NEB-YYYY-XXXXXX (see reference.py)"""
+        return reference_numbers.next()
 
     def parse_date(date_str):
         """Parse date string to date object"""
@@ -256,37 +289,8 @@ def create_app(config_name='development'):
             return None
 
     def validate_pledge(form_data):
-        """Server-side validation of pledge form"""
-        errors = []
-        
-        # Required fields
-        if not form_data.get('donor_name'):
-            errors.append('Donor name is required')
-        if not form_data.get('address_line1'):
-            errors.append('Address is required')
-        if not form_data.get('city'):
-            errors.append('City is required')
-        if not form_data.get('state'):
-            errors.append('State is required')
-        if not form_data.get('pincode'):
-            errors.append('Pincode is required')
-        if not form_data.get('donor_mobile'):
-            errors.append('Mobile number is required')
-        # Email is optional in UI, so removing required check
-        # if not form_data.get('donor_email'):
-        #     errors.append('Email is required')
-        if not form_data.get('witness1_name'):
-            errors.append('Witness 1 name is required')
-        if not form_data.get('donor_consent'):
-            errors.append('Consent must be given')
-        
-        # Email validation
-        if form_data.get('donor_email') and '@' not in form_data.get('donor_email', ''):
-            errors.append('Invalid email address')
-        
-        # Mobile validation
-        if form_data.get('donor_mobile') and not form_data.get('donor_mobile').isdigit():
-            errors.append('Mobile number must contain only digits')
+        """Server-side validation of pledge form (rules live in validation.py)"""
+        errors = validate_pledge_data(form_data)
         
         # Log validation errors
         if errors:
@@ -315,7 +319,7 @@ def create_app(config_name='development'):
     @app.route("/neb/")
     def index():
         """Home page"""
-        pledge_count = EyeDonationPledge.query.filter_by(is_active=True).count()
+        pledge_count = pledge_counters.active_pledges()
         return safe_render('index.html', 
                 address = app.config.get('INSTITUTION_ADDRESS', 'Eye Bank'),
                 
@@ -345,120 +349,29 @@ def create_app(config_name='development'):
         """Render the educational guide page"""
         return render_template('guide.html', active_page='guide')
 
+    def personalised_page():
+        """Pages showing the admin menu or flash messages must not be served from the shared cache"""
+        return bool(session.get('admin_user_id') or session.get('_flashes'))
+
     @app.route('/neb/stats')
+    @stats_cache.cached(
+        ttl=app.config.get('STATS_PAGE_CACHE_TTL', 60),
+        # The host is part of the page (og:url), so it is part of the key
+        vary=lambda: f"{request.host}:{session.get('lang', 'English')}",
+        unless=personalised_page,
+        max_age=0
+    )
     def stats():
-        """Public Live Dashboard"""
-        from sqlalchemy import func, extract
-
-        # 1. Total Count
-        total_pledges = EyeDonationPledge.query.filter_by(is_active=True).count()
-        
-        # 2. Today's Count
-        today = datetime.now().date()
-        today_pledges = EyeDonationPledge.query.filter_by(is_active=True).filter(
-            func.date(EyeDonationPledge.created_at) == today
-        ).count()
-        
-        # 3. Top States
-        top_states = db.session.query(
-            EyeDonationPledge.state,
-            func.count(EyeDonationPledge.id).label('count')
-        ).filter_by(is_active=True).group_by(EyeDonationPledge.state).order_by(
-            func.count(EyeDonationPledge.id).desc()
-        ).limit(5).all()
-
-        # 4. Recent Heroes (Anonymized)
-        recent_raw = EyeDonationPledge.query.filter_by(is_active=True).order_by(
-            EyeDonationPledge.created_at.desc()
-        ).limit(10).all()
-
-        recent_pledges = []
-        for p in recent_raw:
-            # Anonymize Name: "Ravinder Singh" -> "Ravinder S."
-            name_parts = p.donor_name.split()
-            display_name = name_parts[0]
-            if len(name_parts) > 1:
-                display_name += f" {name_parts[-1][0]}."
-            
-            # Simple "Time Ago" logic
-            delta = datetime.now() - p.created_at
-            if delta.days > 0:
-                time_ago = f"{delta.days}d ago"
-            elif delta.seconds > 3600:
-                time_ago = f"{delta.seconds // 3600}h ago"
-            else:
-                time_ago = f"{delta.seconds // 60}m ago"
-
-            recent_pledges.append({
-                'initials': f"{name_parts[0][0]}{name_parts[-1][0] if len(name_parts)>1 else ''}",
-                'name': display_name,
-                'city': p.city,
-                'state': p.state,
-                'time_ago': time_ago
-            })
-
-        # --- Advanced Graphs Data ---
-
-        # 5. Monthly Stats for Current Year
-        current_year = datetime.now().year
-        monthly_raw = db.session.query(
-            extract('month', EyeDonationPledge.created_at).label('month'),
-            func.count(EyeDonationPledge.id).label('count')
-        ).filter_by(is_active=True).filter(
-            extract('year', EyeDonationPledge.created_at) == current_year
-        ).group_by('month').all()
-
-        # Ensure all 12 months present
-        monthly_data = [0] * 12
-        for m_num, count in monthly_raw:
-            monthly_data[int(m_num) - 1] = count
-
-        # 6. Yearly Stats (All Time)
-        yearly_raw = db.session.query(
-            extract('year', EyeDonationPledge.created_at).label('year'),
-            func.count(EyeDonationPledge.id).label('count')
-        ).filter_by(is_active=True).group_by('year').order_by('year').all()
-        
-        yearly_labels = [int(r[0]) for r in yearly_raw]
-        yearly_data = [r[1] for r in yearly_raw]
-
-        # 7. Last 7 Days Trend
-        seven_days_ago = today - timedelta(days=6) # 7 days inclusive
-        daily_raw = db.session.query(
-            func.date(EyeDonationPledge.created_at).label('date'),
-            func.count(EyeDonationPledge.id).label('count')
-        ).filter_by(is_active=True).filter(
-            func.date(EyeDonationPledge.created_at) >= seven_days_ago
-        ).group_by('date').all()
-        
-        # Fill gaps
-        last_7_dates = [(today - timedelta(days=i)).strftime('%d %b') for i in range(6, -1, -1)]
-        last_7_counts = [0] * 7
-        
-        # Map DB results to array
-        daily_dict = {str(r[0]): r[1] for r in daily_raw} # r[0] is date object or string depending on dialect
-        
-        for i in range(7):
-            d_obj = today - timedelta(days=6-i)
-            d_str = str(d_obj) # YYYY-MM-DD
-            if d_str in daily_dict:
-                last_7_counts[i] = daily_dict[d_str]
-
-
+        """Public Live Dashboard (charts load from /neb/api/stats/bundle)"""
+        summary = DashboardAnalytics.get_summary_stats()
+        geography = DashboardAnalytics.get_geographic_distribution()
 
         return render_template('stats.html', 
                              active_page='stats',
-                             total_pledges=total_pledges,
-                             today_pledges=today_pledges,
-                             top_states=top_states,
-                             recent_pledges=recent_pledges,
-                             # Chart Data
-                             monthly_data=monthly_data,
-                             yearly_labels=yearly_labels,
-                             yearly_data=yearly_data,
-                             last_7_dates=last_7_dates,
-                             last_7_counts=last_7_counts,
-                             current_year=current_year)
+                             total_pledges=summary['total_pledges'],
+                             today_pledges=summary['today_pledges'],
+                             active_states=sum(1 for state in geography['all_states'] if state),
+                             current_year=datetime.now().year)
 
     @app.route("/neb/pledge", methods=["GET", "POST"])
     def pledge_form():
@@ -543,8 +456,28 @@ def create_app(config_name='development'):
                 )
                 
                 db.session.add(pledge)
+
+                # Side effects run on the task queue once the pledge is committed
+                if app.config.get('PRERENDER_CARDS', True):
+                    task_queue.enqueue_after_commit(
+                        db.session, 'prerender_card',
+                        reference_number=ref_num,
+                        qr_data=card_verifier.qr_payload(ref_num)
+                    )
+                if pledge.donor_email and app.config.get('MAIL_SERVER'):
+                    task_queue.enqueue_after_commit(
+                        db.session, 'send_pledge_confirmation',
+                        reference_number=ref_num,
+                        verify_url=card_verifier.qr_payload(ref_num),
+                        card_url=url_for('pledge_pdf', ref_num=ref_num, _external=True)
+                    )
+
                 db.session.commit()
                 
+                # Public stats now include this pledge
+                stats_cache.invalidate()
+                pledge_counters.invalidate()
+                
                 app_logger.info(f"Pledge saved successfully. Reference: {ref_num}")
                 flash('Pledge submitted successfully!', 'success')
                 app_logger.info("Redirecting to success page")
@@ -578,80 +511,55 @@ def create_app(config_name='development'):
                 
                 active_page='pledge', current_year=datetime.now().year,  pledge=pledge)
 
+    @app.route("/neb/verify/<token>")
+    def verify_card(token):
+        """Verify a scanned donor card QR code (public, lightweight)"""
+        # The signature is checked before any database work
+        reference_number = card_verifier.verify(token)
+        entry = card_verifier.lookup(reference_number) if reference_number else None
+        wants_json = request.args.get('format') == 'json' or \
+            request.accept_mimetypes.best == 'application/json'
+
+        if entry is None:
+            if reference_number is None:
+                log_security_event('CARD_VERIFY_FAILED', f"Invalid card token: {token[:64]}", level='warning')
+            if wants_json:
+                return jsonify({'valid': False}), 404
+            return safe_render('verify.html', result=None), 404
+
+        if wants_json:
+            response = Response(entry.body, mimetype=entry.mimetype)
+            response.set_etag(entry.etag)
+        else:
+            response = make_response(safe_render('verify.html', result=json.loads(entry.body)))
+        response.cache_control.private = True
+        response.cache_control.max_age = 60
+        response.headers['X-Robots-Tag'] = 'noindex'
+        return response.make_conditional(request)
+
     @app.route("/neb/pledge/<ref_num>/pdf")
     def pledge_pdf(ref_num):
         """Download pledge PDF"""
-        pdf_path = f"static/image/temp/eye_donor_card_{ref_num}.pdf"
-        
-        if os.path.exists(pdf_path):
-            return send_file(pdf_path, as_attachment=True,download_name=f"eye_donor_card_{ref_num}.pdf"),200
-
         pledge = EyeDonationPledge.query.filter_by(reference_number=ref_num).first_or_404()
 
-
-        path = generate_eye_donor_card(
-            qr_data="http://127.0.0.1:5000/success/NEB-2025-000003",
-            template_image="static/image/donor_front.png",
-            output_dir="static/image/temp"
+        # ?variant=screen gives a lightweight low-resolution card for viewing on a device
+        variant = request.args.get('variant', 'print')
+        if variant not in CARD_VARIANTS:
+            variant = 'print'
+
+        # Rendered in the card worker pool on first request, then served from the
+        # artifact store (by the front proxy when ARTIFACT_SENDFILE is set)
+        pdf_path = card_service.get_pdf(
+            pledge,
+            qr_data=card_verifier.qr_payload(pledge.reference_number),
+            variant=variant
         )
 
-        print("Generated:", path)
-
-        def _safe(v, default=""):
-            return (str(v).strip().upper() if v is not None else default)
-
-        def _format_dob(d):
-            # pledge.donor_dob is likely a date (or None). Your serializer used isoformat().
-            return d.strftime("%d-%m-%Y") if d else ""
-
-        def _build_address(p):
-            parts = [
-                _safe(p.address_line1.upper()),
-                _safe(p.address_line2.upper()),
-                _safe(p.city.upper()),
-                _safe(p.district.upper()),
-                _safe(p.state.upper()),
-                _safe(p.pincode.upper()),
-                _safe(p.country.upper()),
-            ]
-            # keep only non-empty parts and join nicely
-            return ", ".join([x for x in parts if x])
-        
-        out = fill_eye_donor_card_fields(
-            template_path="static/image/donor_back.png",
-            output_dir="static/image/temp",
-            
-            # Donor fields
-            name=_safe(pledge.donor_name.upper()),
-            dob=_format_dob(pledge.donor_dob),
-            address=_build_address(pledge),
-            ref_no=_safe(pledge.reference_number),   # <-- uses your reference_number
-            phone=_safe(pledge.donor_mobile),
-
-            # Witness fields (using witness1)
-            witness_name=_safe(pledge.witness1_name.upper()),
-            witness_relation=_safe(pledge.witness1_relationship.upper()),
-            witness_phone1=_safe(pledge.witness1_mobile),
-        )
-
-        print("Saved:", out)
-
-
-        pdf_path = images_to_pdf(
-            image_path_1=path,
-            image_path_2=out,
-            output_path=f"static/image/temp/eye_donor_card_{pledge.reference_number}.pdf",
-        )
-
-        os.remove(path)
-        os.remove(out)
-
-        print("PDF created:", pdf_path)
-
-        return send_file(
+        suffix = '' if variant == 'print' else f'_{variant}'
+        return artifact_store.send(
             pdf_path,
-            as_attachment=True,
-            download_name=f"eye_donor_card_{pledge.reference_number}.pdf"
+            download_name=f"eye_donor_card_{pledge.reference_number}{suffix}.pdf",
+            mimetype='application/pdf'
             ),200
 
     # ========================
@@ -696,23 +604,25 @@ def create_app(config_name='development'):
     @login_required
     def admin_dashboard():
         """Admin dashboard with statistics"""
-        total_pledges = EyeDonationPledge.query.filter_by(is_active=True).count()
+        total_pledges = pledge_counters.active_pledges()
         # Get pledges by state (top 5)
         pledges_by_state = db.session.query(
             EyeDonationPledge.state,
             db.func.count(EyeDonationPledge.id).label('count')
-        ).filter_by(is_active=True).group_by(EyeDonationPledge.state).order_by(
+        ).filter(EyeDonationPledge.is_active == True).group_by(EyeDonationPledge.state).order_by(
             db.func.count(EyeDonationPledge.id).desc()
         ).limit(5).all()
         
-        # Get monthly statistics
-        from sqlalchemy import extract
+        # Get monthly statistics (last 12 calendar months, including the current one)
+        first_month = series('month', 12)[0]
+        month = bucket('month', EyeDonationPledge.created_at)
         monthly_stats = db.session.query(
-            extract('month', EyeDonationPledge.created_at).label('month'),
+            month.label('month'),
             db.func.count(EyeDonationPledge.id).label('count')
-        ).filter_by(is_active=True).filter(
-            EyeDonationPledge.created_at >= datetime.now() - timedelta(days=365)
-        ).group_by('month').all()
+        ).filter(
+            EyeDonationPledge.is_active == True,
+            EyeDonationPledge.created_at >= first_month
+        ).group_by(month).order_by(month).all()
         
         return safe_render('admin/dashboard.html',
                         address = app.config.get('INSTITUTION_ADDRESS', 'Eye Bank'),
@@ -722,34 +632,46 @@ def create_app(config_name='development'):
                         pledges_by_state=pledges_by_state,
                         monthly_stats=monthly_stats)
 
+    def filtered_pledges_query(ranked=False):
+        """
+        Active pledges matching the admin list / export filters in request.args
+        (q or search, state, date_from, date_to).
+        
+        Args:
+            ranked: Order search matches by relevance (newest first otherwise)
+            
+        Returns:
+            tuple: (query, filters dict for the templates)
+        """
+        filters = pledge_filters_from_args(request.args)
+        return filter_pledges(filters, ranked=ranked), filters
+
     @app.route("/neb/admin/pledges", methods=["GET"])
     @login_required
     def admin_pledges():
         """Admin pledges list with search and filter"""
-        page = request.args.get('page', 1, type=int)
-        search = request.args.get('search', '')
-        state = request.args.get('state', '')
-        
-        query = EyeDonationPledge.query.filter_by(is_active=True)
+        query, filters = filtered_pledges_query(ranked=True)
+        search = filters['search']
         
-        # Search
         if search:
-            query = query.filter(
-                (EyeDonationPledge.donor_name.ilike(f'%{search}%')) |
-                (EyeDonationPledge.donor_mobile.ilike(f'%{search}%')) |
-                (EyeDonationPledge.donor_email.ilike(f'%{search}%')) |
-                (EyeDonationPledge.reference_number.ilike(f'%{search}%'))
+            # Ranked results, most relevant first: paged by offset
+            pledges = paginate_ranked(
+                query,
+                per_page=app.config.get('PLEDGES_PER_PAGE', 20),
+                after=request.args.get('after'),
+                before=request.args.get('before')
             )
-        
-        # Filter by state
-        if state:
-            query = query.filter_by(state=state)
-        
-        # Pagination
-        pledges = query.order_by(EyeDonationPledge.created_at.desc()).paginate(
-            page=page,
-            per_page=app.config.get('PLEDGES_PER_PAGE', 20)
-        )
+        else:
+            # Keyset pagination on (created_at, id): no OFFSET
+            pledges = paginate_keyset(
+                query.order_by(None),
+                EyeDonationPledge.created_at,
+                EyeDonationPledge.id,
+                per_page=app.config.get('PLEDGES_PER_PAGE', 20),
+                after=request.args.get('after'),
+                before=request.args.get('before')
+            )
+        pledges.total = approximate_count(query)
         
         return safe_render('admin/pledges_list.html',
                         address = app.config.get('INSTITUTION_ADDRESS', 'Eye Bank'),
@@ -758,7 +680,11 @@ def create_app(config_name='development'):
                      pledges=pledges,
                      pagination=pledges,
                      search=search,
-                     state=state)
+                     state=filters['state'],
+                     search_query=search,
+                     filter_state=filters['state'],
+                     filter_date_from=filters['date_from'],
+                     filter_date_to=filters['date_to'])
 
     @app.route("/neb/admin/pledge/<int:pledge_id>")
     @login_required
@@ -782,52 +708,147 @@ def create_app(config_name='development'):
     @login_required
     def admin_export():
         """Export pledges as CSV"""
-        search = request.args.get('search', '')
-        state = request.args.get('state', '')
-        
-        query = EyeDonationPledge.query.filter_by(is_active=True)
-        
-        if search:
-            query = query.filter(
-                (EyeDonationPledge.donor_name.ilike(f'%{search}%')) |
-                (EyeDonationPledge.donor_mobile.ilike(f'%{search}%'))
-            )
-        
-        if state:
-            query = query.filter_by(state=state)
-        
-        pledges = query.all()
-        
-        # Create CSV
-        output = StringIO()
-        writer = csv.writer(output)
-        writer.writerow([
-            'Reference Number', 'Donor Name', 'Mobile', 'Email', 'State', 
-            'Created Date'
-        ])
-        
-        for pledge in pledges:
-            writer.writerow([
-                pledge.reference_number,
-                pledge.donor_name,
-                pledge.donor_mobile,
-                pledge.donor_email,
-                pledge.state,
-                pledge.created_at.strftime('%Y-%m-%d')
-            ])
+        # Same filters and ranking as the admin pledge list
+        query, filters = filtered_pledges_query(ranked=True)
         
-        # Log security event
         admin_id = session.get('admin_user_id')
-        log_security_event('DATA_EXPORT', f"Exported {len(pledges)} pledges to CSV", user_id=admin_id)
+        
+        def generate():
+            # Rows are streamed from the database and written out in chunks
+            counter = {}
+            yield from iter_csv(export_rows(query), counter)
+            
+            # Log security event once the whole file has been sent
+            log_security_event('DATA_EXPORT', f"Exported {counter.get('rows', 0)} pledges to CSV", user_id=admin_id)
         
         return Response(
-            output.getvalue(),
+            stream_with_context(generate()),
             mimetype='text/csv',
             headers={
                 'Content-Disposition': 'attachment; filename=pledges_export.csv'
             }
         )
 
+    @app.route("/neb/admin/exports", methods=["GET", "POST"])
+    @login_required
+    def admin_exports():
+        """Background export jobs: create (POST) and list recent jobs"""
+        admin_id = session.get('admin_user_id')
+        
+        if request.method == "POST":
+            filters = pledge_filters_from_args(request.form)
+            try:
+                job = export_jobs.create(
+                    request.form.get('format', 'csv'),
+                    request.form.getlist('fields'),
+                    filters,
+                    user_id=admin_id
+                )
+            except ValueError as e:
+                flash(str(e), 'danger')
+                return redirect(url_for('admin_exports'))
+            
+            log_security_event('DATA_EXPORT', f"Queued {job.format} export {job.id}", user_id=admin_id)
+            flash('Export started. It will be ready to download here shortly.', 'success')
+            return redirect(url_for('admin_exports'))
+        
+        export_jobs.mark_stale()
+        jobs = ExportJob.query.order_by(ExportJob.created_at.desc()).limit(20).all()
+        
+        return safe_render('admin/exports.html',
+                        active_page='admin',
+                        current_year=datetime.now().year,
+                        jobs=jobs,
+                        formats=available_formats(),
+                        fields=RECORD_FIELDS,
+                        filters=pledge_filters_from_args(request.args))
+
+    @app.route("/neb/admin/exports/<job_id>/status")
+    @login_required
+    def admin_export_status(job_id):
+        """Progress of one export job (polled by the exports page)"""
+        job = db.session.get(ExportJob, job_id)
+        if job is None:
+            return jsonify({'error': 'Export not found'}), 404
+        data = job.to_dict()
+        if job.status == 'done':
+            data['download_url'] = url_for('admin_export_download', job_id=job.id)
+        return jsonify(data)
+
+    @app.route("/neb/admin/exports/<job_id>/download")
+    @login_required
+    def admin_export_download(job_id):
+        """Download a finished export file"""
+        job = db.session.get(ExportJob, job_id)
+        if job is None or job.status != 'done' or not job.file_path or not os.path.exists(job.file_path):
+            flash('Export file is not available.', 'danger')
+            return redirect(url_for('admin_exports'))
+        
+        log_security_event('DATA_EXPORT', f"Downloaded {job.format} export {job.id} ({job.rows_written} pledges)",
+                           user_id=session.get('admin_user_id'))
+        return send_file(
+            job.file_path,
+            mimetype=EXPORT_FORMATS[job.format].mimetype,
+            as_attachment=True,
+            download_name=os.path.basename(job.file_path)
+        )
+
+    @app.route("/neb/admin/import", methods=["GET", "POST"])
+    @login_required
+    def admin_import():
+        """Bulk pledge import from CSV/XLSX (offline forms, camps, hospitals)"""
+        admin_id = session.get('admin_user_id')
+        sources = [s.value for s in SourceEnum if s is not SourceEnum.ONLINE]
+        result = None
+        
+        if request.method == "POST":
+            upload = request.files.get('file')
+            if not upload or not upload.filename:
+                flash('Choose a CSV or XLSX file to import.', 'danger')
+                return redirect(url_for('admin_import'))
+            
+            report_id, report_path = pledge_importer.new_report()
+            try:
+                result = pledge_importer.run(
+                    upload.stream, upload.filename,
+                    source=request.form.get('source') or None,
+                    error_path=report_path,
+                    dry_run=bool(request.form.get('dry_run')),
+                    allow_duplicates=bool(request.form.get('allow_duplicates'))
+                )
+            except ValueError as e:
+                flash(str(e), 'danger')
+                return redirect(url_for('admin_import'))
+            
+            if result['error_report']:
+                result['error_report_url'] = url_for('admin_import_errors', report_id=report_id)
+            result['dry_run'] = bool(request.form.get('dry_run'))
+            if result['imported'] and not result['dry_run']:
+                log_security_event('DATA_IMPORT',
+                                   f"Imported {result['imported']} of {result['rows']} pledges from {upload.filename}",
+                                   user_id=admin_id)
+            if result['error']:
+                flash(f"Import stopped early: {result['error']}", 'danger')
+        
+        return safe_render('admin/import.html',
+                        active_page='admin',
+                        current_year=datetime.now().year,
+                        result=result,
+                        sources=sources,
+                        default_source=pledge_importer.default_source,
+                        formats=import_formats(),
+                        columns=list(IMPORT_FIELDS) + ['donor_consent'])
+
+    @app.route("/neb/admin/import/<report_id>/errors")
+    @login_required
+    def admin_import_errors(report_id):
+        """Download the error report of an import"""
+        path = pledge_importer.report_path(report_id)
+        if path is None or not os.path.exists(path):
+            flash('Error report is not available.', 'danger')
+            return redirect(url_for('admin_import'))
+        return send_file(path, mimetype='text/csv', as_attachment=True, download_name='import_errors.csv')
+
     @app.route("/neb/admin/pledge/<int:pledge_id>/print")
     @login_required
     def admin_print_pledge(pledge_id):
@@ -901,40 +922,51 @@ def create_app(config_name='development'):
         user_id = request.args.get('user_id')
         start_date_str = request.args.get('start_date')
         end_date_str = request.args.get('end_date')
-        page = request.args.get('page', 1, type=int)
         
-        # Base query
-        query = SystemLog.query.order_by(SystemLog.timestamp.desc())
+        # Make sure queued log rows (and the running access summary) are visible before querying
+        access_log_policy.flush_summaries()
+        log_sink.flush(timeout=1.0)
         
-        # Apply filters
-        if log_type:
-            query = query.filter_by(log_type=log_type)
-        if level:
-            query = query.filter_by(level=level)
-        if user_id:
-            query = query.filter_by(user_id=user_id)
-        if search:
-            query = query.filter(SystemLog.message.ilike(f'%{search}%'))
-            
         # Date Filters
+        start_date = end_date = None
         if start_date_str:
             try:
                 start_date = datetime.strptime(start_date_str, '%Y-%m-%d')
-                query = query.filter(SystemLog.timestamp >= start_date)
             except ValueError:
                 pass # Ignore invalid dates
         
         if end_date_str:
             try:
                 # Include the entire end date (up to 23:59:59)
-                end_date_dt = datetime.strptime(end_date_str, '%Y-%m-%d')
-                end_date = end_date_dt + timedelta(days=1)
-                query = query.filter(SystemLog.timestamp < end_date)
+                end_date = datetime.strptime(end_date_str, '%Y-%m-%d') + timedelta(days=1)
             except ValueError:
                 pass
+        
+        # Base query, reading only the monthly partitions the date filter overlaps
+        Log = log_partitions.log_entity(start_date, end_date)
+        query = db.session.query(Log)
+        
+        # Apply filters
+        if log_type:
+            query = query.filter(Log.log_type == log_type)
+        if level:
+            query = query.filter(Log.level == level)
+        if user_id:
+            query = query.filter(Log.user_id == user_id)
+        if search:
+            query = query.filter(Log.message.ilike(f'%{search}%'))
+        if start_date:
+            query = query.filter(Log.timestamp >= start_date)
+        if end_date:
+            query = query.filter(Log.timestamp < end_date)
             
-        # Pagination
-        logs = query.paginate(page=page, per_page=20, error_out=False)
+        # Keyset pagination on (timestamp, id): no OFFSET, approximate total
+        logs = paginate_keyset(
+            query, Log.timestamp, Log.id, per_page=20,
+            after=request.args.get('after'),
+            before=request.args.get('before')
+        )
+        logs.total = approximate_count(query)
         
         # Get users for dropdown
         users = AdminUser.query.with_entities(AdminUser.id, AdminUser.username).all()
@@ -955,8 +987,9 @@ def create_app(config_name='development'):
     def admin_clear_logs():
         """Clear all system logs"""
         try:
-            # Delete all logs
-            num_deleted = db.session.query(SystemLog).delete()
+            # Delete all logs (including any still queued for writing)
+            log_sink.flush()
+            num_deleted = log_partitions.clear_all()
             db.session.commit()
             
             # Log this action
@@ -974,8 +1007,6 @@ def create_app(config_name='development'):
     # ========================
     # DASHBOARD ROUTES
     # ========================
-    from dashboard_analytics import DashboardAnalytics
-    
     @app.route("/neb/dashboard")
     @login_required
     def admin_dashboard_modern():
@@ -1000,8 +1031,8 @@ def create_app(config_name='development'):
         demographics = analytics.get_demographic_insights()
         
         # Get all states for filter dropdown
-        all_states = db.session.query(EyeDonationPledge.state).filter_by(
-            is_active=True
+        all_states = db.session.query(EyeDonationPledge.state).filter(
+            EyeDonationPledge.is_active == True
         ).distinct().order_by(EyeDonationPledge.state).all()
         states_list = [s[0] for s in all_states if s[0]]
         
@@ -1110,6 +1141,52 @@ def create_app(config_name='development'):
         
         return jsonify(language)
 
+    # Widgets available to the admin dashboard bundle endpoint
+    DASHBOARD_WIDGETS = {
+        'summary': lambda start_date=None, end_date=None, state_filter=None, **_:
+            DashboardAnalytics.get_summary_stats(start_date, end_date, state_filter),
+        'trends_daily': lambda state_filter=None, **_:
+            DashboardAnalytics.get_temporal_trends('daily', 30, state_filter),
+        'trends_monthly': lambda state_filter=None, **_:
+            DashboardAnalytics.get_temporal_trends('monthly', 12, state_filter),
+        'geography': lambda **_: DashboardAnalytics.get_geographic_distribution(10),
+        'demographics': lambda **_: DashboardAnalytics.get_demographic_insights(),
+        'growth': lambda **_: DashboardAnalytics.get_growth_metrics(),
+        'activity': lambda **_: DashboardAnalytics.get_peak_activity_analysis(),
+        'language': lambda **_: DashboardAnalytics.get_language_preference_distribution(),
+    }
+
+    @app.route("/neb/api/dashboard/bundle")
+    @login_required
+    def api_dashboard_bundle():
+        """API endpoint returning several dashboard widgets in one response"""
+        from flask import jsonify
+        from api.stats_routes import parse_widget_names
+        
+        names, unknown = parse_widget_names(DASHBOARD_WIDGETS)
+        if unknown:
+            return jsonify({
+                'error': f"Unknown widgets: {', '.join(unknown)}",
+                'available': list(DASHBOARD_WIDGETS)
+            }), 400
+        
+        date_range = request.args.get('range', '30')
+        state_filter = request.args.get('state') or None
+        
+        if date_range == 'all':
+            start_date = None
+            end_date = None
+        else:
+            days = int(date_range)
+            end_date = datetime.now()
+            start_date = end_date - timedelta(days=days)
+        
+        bundle = DashboardAnalytics.compute_bundle(
+            DASHBOARD_WIDGETS, names,
+            start_date=start_date, end_date=end_date, state_filter=state_filter
+        )
+        return jsonify(bundle)
+
 
     return app
 
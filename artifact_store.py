@@ -0,0 +1,216 @@
+"""
+Artifact Store
+Content-addressed, size-bounded disk cache for generated files (donor card PDFs).
+
+- Addressing: an artifact's address is the SHA-256 of everything that
+  determines its bytes (for a card: the printed fields, QR payload, variant
+  and template versions). Editing a pledge therefore yields a new address, and
+  a stale file can never be served.
+- Layout: files are sharded by the first two hex digits of the address
+  (ab/abcdef....pdf), git-style, to keep directories small.
+- Writes: bytes go to a temporary file in the same directory and are renamed
+  into place, so readers never see a partial file. Concurrent writers of the
+  same address write identical bytes, so the last rename simply wins.
+- Eviction: hits refresh the file's mtime. When the store grows past
+  ARTIFACT_MAX_MB (or files pass ARTIFACT_MAX_AGE_DAYS), the least recently
+  used files are removed until it is back under 90% of the limit.
+- Serving: with ARTIFACT_SENDFILE set to 'x-accel-redirect' (nginx) or
+  'x-sendfile' (Apache / lighttpd), responses carry only a header and the
+  front proxy sends the bytes.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+from flask import Response, send_file
+from werkzeug.http import quote_header_value
+
+
+SHARD_WIDTH = 2
+TOUCH_INTERVAL = 60     # seconds between mtime refreshes of a hot file
+RESCAN_INTERVAL = 300   # seconds between full size scans (other processes write too)
+
+
+class ArtifactStore:
+    """Sharded, LRU-evicted store addressed by content hash"""
+
+    def __init__(self, app=None):
+        self.root = None
+        self.max_bytes = 512 * 1024 * 1024
+        self.max_age = 30 * 86400
+        self.sendfile = ''
+        self.accel_prefix = '/protected-artifacts/'
+
+        self._size = None
+        self._scanned_at = 0
+        self._lock = threading.Lock()
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.root = app.config.get('ARTIFACT_DIR') or os.path.join(app.instance_path, 'artifacts')
+        self.max_bytes = app.config.get('ARTIFACT_MAX_MB', 512) * 1024 * 1024
+        self.max_age = app.config.get('ARTIFACT_MAX_AGE_DAYS', 30) * 86400
+        self.sendfile = (app.config.get('ARTIFACT_SENDFILE') or '').lower()
+        self.accel_prefix = '/' + app.config.get('ARTIFACT_ACCEL_PREFIX', self.accel_prefix).strip('/') + '/'
+        app.extensions['artifact_store'] = self
+
+    # ========================
+    # Addressing
+    # ========================
+    @staticmethod
+    def address(*parts):
+        """
+        Content address for an artifact.
+
+        Args:
+            *parts: JSON-serialisable values that fully determine the artifact's bytes
+
+        Returns:
+            str: 64-character hex digest
+        """
+        canonical = json.dumps(parts, sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def path_for(self, address, suffix=''):
+        return os.path.join(self.root, address[:SHARD_WIDTH], f"{address}{suffix}")
+
+    # ========================
+    # Read / write
+    # ========================
+    def get(self, address, suffix=''):
+        """
+        Path of a stored artifact, refreshing its LRU position.
+
+        Returns:
+            str: Path, or None when the artifact is not stored
+        """
+        path = self.path_for(address, suffix)
+        try:
+            mtime = os.stat(path).st_mtime
+        except FileNotFoundError:
+            return None
+        now = time.time()
+        if now - mtime > TOUCH_INTERVAL:
+            try:
+                os.utime(path, (now, now))
+            except OSError:
+                pass
+        return path
+
+    def put(self, address, data, suffix=''):
+        """
+        Store bytes atomically under an address.
+
+        Returns:
+            str: Path of the stored artifact
+        """
+        path = self.path_for(address, suffix)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as fh:
+            fh.write(data)
+        os.replace(tmp_path, path)
+
+        self._account(len(data), keep=path)
+        return path
+
+    def get_or_create(self, address, factory, suffix=''):
+        """
+        Path of an artifact, calling factory() for its bytes when it is not stored yet.
+        """
+        return self.get(address, suffix) or self.put(address, factory(), suffix)
+
+    # ========================
+    # Eviction
+    # ========================
+    def _scan(self):
+        """All stored files as (mtime, size, path)."""
+        entries = []
+        if not self.root or not os.path.isdir(self.root):
+            return entries
+        for shard in os.scandir(self.root):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith('.tmp'):
+                    continue
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, entry.path))
+        return entries
+
+    def _account(self, added, keep=None):
+        """Track the store size and evict when it is over budget or the estimate is stale."""
+        with self._lock:
+            if self._size is not None:
+                self._size += added
+            due = (self._size is None or self._size > self.max_bytes
+                   or time.monotonic() - self._scanned_at > RESCAN_INTERVAL)
+        if due:
+            self.evict(keep=keep)
+
+    def evict(self, keep=None):
+        """
+        Remove expired files, then least recently used ones until the store is
+        under 90% of ARTIFACT_MAX_MB.
+
+        Args:
+            keep: Path never to remove (the artifact about to be served)
+
+        Returns:
+            tuple: (files removed, bytes freed)
+        """
+        entries = sorted(self._scan())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9 if total > self.max_bytes else total
+        expire_before = time.time() - self.max_age if self.max_age else None
+
+        removed = freed = 0
+        for mtime, size, path in entries:
+            if total <= target and (expire_before is None or mtime >= expire_before):
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+            freed += size
+
+        with self._lock:
+            self._size = total
+            self._scanned_at = time.monotonic()
+        return removed, freed
+
+    # ========================
+    # Serving
+    # ========================
+    def send(self, path, download_name, mimetype='application/octet-stream'):
+        """
+        Download response for a stored artifact, handed to the front proxy when
+        ARTIFACT_SENDFILE is configured.
+        """
+        if self.sendfile not in ('x-accel-redirect', 'x-sendfile'):
+            return send_file(path, mimetype=mimetype, as_attachment=True, download_name=download_name)
+
+        response = Response(mimetype=mimetype)
+        if self.sendfile == 'x-accel-redirect':
+            relative = os.path.relpath(path, self.root).replace(os.sep, '/')
+            response.headers['X-Accel-Redirect'] = self.accel_prefix + relative
+        else:
+            response.headers['X-Sendfile'] = os.path.abspath(path)
+        response.headers['Content-Disposition'] = f"attachment; filename={quote_header_value(download_name)}"
+        return response
+
+
+artifact_store = ArtifactStore()
@@ -0,0 +1,295 @@
+"""
+Donor Card Service
+Renders the two-page donor card PDF off the request thread, and caches it.
+
+- Templates and the font come from util.card_templates, which decodes them
+  once per process (optionally memory-mapped) and hands out copies to draw on.
+- Cards come in two variants: 'print' at CARD_DPI (the template's own
+  resolution) and a lightweight 'screen' one at CARD_SCREEN_DPI.
+- Both pages are composed in memory and written straight into a PDF buffer,
+  with no temporary PNG files.
+- Rendering runs in a process pool (CARD_RENDER_WORKERS), so Pillow work does
+  not hold up web workers. With 0 workers it renders inline.
+- Finished PDFs are kept in the artifact store, addressed by a hash of the
+  printed fields, QR payload, variant and template versions, so an edited
+  pledge gets a new card and stale ones are never served (see artifact_store).
+"""
+
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from artifact_store import artifact_store
+from qr_codes import render_qr_batch
+from util import (CARD_QR_BOX, card_templates, compose_card_back, compose_card_front,
+                  images_to_pdf_bytes, image_to_jpeg)
+
+
+CARD_VARIANTS = ('print', 'screen')
+
+
+# ========================
+# Card content
+# ========================
+def _safe(v, default=""):
+    return (str(v).strip().upper() if v is not None else default)
+
+
+def card_fields(pledge):
+    """Text printed on the back of the card, as plain strings (picklable)."""
+    address = ", ".join(x for x in (
+        _safe(pledge.address_line1),
+        _safe(pledge.address_line2),
+        _safe(pledge.city),
+        _safe(pledge.district),
+        _safe(pledge.state),
+        _safe(pledge.pincode),
+        _safe(pledge.country),
+    ) if x)
+
+    return {
+        # Donor fields
+        'name': _safe(pledge.donor_name),
+        'dob': pledge.donor_dob.strftime("%d-%m-%Y") if pledge.donor_dob else "",
+        'address': address,
+        'ref_no': _safe(pledge.reference_number),
+        'phone': _safe(pledge.donor_mobile),
+
+        # Witness fields (using witness1)
+        'witness_name': _safe(pledge.witness1_name),
+        'witness_relation': _safe(pledge.witness1_relationship),
+        'witness_phone1': _safe(pledge.witness1_mobile),
+    }
+
+
+# ========================
+# Worker side
+# ========================
+def _init_worker(mmap_dir, front_path, back_path, font_path, font_size, scales):
+    """Pool initializer: load the templates and fonts before the first card."""
+    card_templates.configure(mmap_dir)
+    for scale in scales:
+        card_templates.template(front_path, scale)
+        card_templates.template(back_path, scale)
+        card_templates.font(font_path, max(1, round(font_size * scale)))
+
+
+def render_card_pdf(job):
+    """
+    Render one donor card to PDF bytes. Runs inside pool workers, so it only
+    takes plain data.
+
+    Args:
+        job: dict with qr_data, fields (see card_fields), assets
+             (front, back, font, font_size), scale and dpi
+
+    Returns:
+        bytes: Two-page PDF (front, back)
+    """
+    front_path, back_path, font_path, font_size = job['assets']
+    scale = job['scale']
+    font = card_templates.font(font_path, max(1, round(font_size * scale)))
+
+    front = compose_card_front(card_templates.template(front_path, scale), job['qr_data'], scale=scale)
+    back = compose_card_back(card_templates.template(back_path, scale), font, job['fields'], scale=scale)
+    return images_to_pdf_bytes([front, back], dpi=job['dpi'])
+
+
+def render_card_pages(job, qr_image=None):
+    """
+    Render one donor card as JPEG pages, for bulk runs that assemble their own
+    PDFs (see util.JpegPdfWriter).
+
+    Returns:
+        tuple: (reference number, [(jpeg bytes, width, height), ...]) front first
+    """
+    front_path, back_path, font_path, font_size = job['assets']
+    scale = job['scale']
+    font = card_templates.font(font_path, max(1, round(font_size * scale)))
+
+    pages = []
+    for img in (
+        compose_card_front(card_templates.template(front_path, scale), job['qr_data'],
+                           scale=scale, qr_image=qr_image),
+        compose_card_back(card_templates.template(back_path, scale), font, job['fields'], scale=scale),
+    ):
+        pages.append((image_to_jpeg(img), img.width, img.height))
+    return job['fields']['ref_no'], pages
+
+
+def render_card_batch(jobs):
+    """
+    Render a chunk of cards (same variant), generating all their QR codes in
+    one batch first.
+
+    Returns:
+        list: render_card_pages() results, in order
+    """
+    box = tuple(round(v * jobs[0]['scale']) for v in CARD_QR_BOX)
+    qr_images = render_qr_batch([job['qr_data'] for job in jobs], *box)
+    return [render_card_pages(job, qr_image) for job, qr_image in zip(jobs, qr_images)]
+
+
+# ========================
+# Service
+# ========================
+class CardService:
+    """Resident-template, pooled, cached donor card renderer"""
+
+    def __init__(self, app=None):
+        self.front_template = 'static/image/donor_front.png'
+        self.back_template = 'static/image/donor_back.png'
+        self.font_path = '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+        self.font_size = 105
+        self.dpi = 300
+        self.screen_dpi = 96
+        self.workers = 2
+        self.mmap_dir = None
+
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.front_template = app.config.get('CARD_FRONT_TEMPLATE', self.front_template)
+        self.back_template = app.config.get('CARD_BACK_TEMPLATE', self.back_template)
+        self.font_path = app.config.get('CARD_FONT_PATH', self.font_path)
+        self.font_size = app.config.get('CARD_FONT_SIZE', self.font_size)
+        self.dpi = app.config.get('CARD_DPI', self.dpi)
+        self.screen_dpi = app.config.get('CARD_SCREEN_DPI', self.screen_dpi)
+        self.workers = app.config.get('CARD_RENDER_WORKERS', self.workers)
+        self.mmap_dir = app.config.get('CARD_TEMPLATE_MMAP_DIR')
+        card_templates.configure(self.mmap_dir)
+        app.extensions['card_service'] = self
+
+    @property
+    def assets(self):
+        return (self.front_template, self.back_template, self.font_path, self.font_size)
+
+    def variant_dpi(self, variant):
+        return self.screen_dpi if variant == 'screen' else self.dpi
+
+    def make_job(self, pledge, qr_data, variant='print'):
+        dpi = self.variant_dpi(variant)
+        return {
+            'qr_data': qr_data,
+            'fields': card_fields(pledge),
+            'assets': self.assets,
+            # Templates are designed at CARD_DPI; other variants are resized from them
+            'scale': dpi / self.dpi,
+            'dpi': dpi,
+        }
+
+    def executor(self):
+        """Process pool for this worker process (None when rendering inline)."""
+        if not self.workers:
+            return None
+        # Pools do not survive fork(): create one per web worker process on first use
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    initializer=_init_worker,
+                    initargs=(self.mmap_dir, *self.assets,
+                              tuple(self.variant_dpi(v) / self.dpi for v in CARD_VARIANTS))
+                )
+                self._pid = os.getpid()
+            return self._executor
+
+    def render(self, pledge, qr_data, variant='print'):
+        """Render a card to PDF bytes (in the pool when configured)."""
+        job = self.make_job(pledge, qr_data, variant)
+        executor = self.executor()
+        if executor is None:
+            return render_card_pdf(job)
+        return executor.submit(render_card_pdf, job).result()
+
+    def render_many(self, pledges, qr_for, variant='print', workers=None, chunksize=16):
+        """
+        Render many cards in parallel, in the order given.
+
+        Args:
+            pledges: Iterable of EyeDonationPledge
+            qr_for: Callable returning the QR payload for a pledge
+            variant: 'print' or 'screen'
+            workers: Processes to use (defaults to every CPU core)
+            chunksize: Cards handed to a worker at a time (their QR codes are
+                       rendered as one batch)
+
+        Yields:
+            tuple: (reference number, [(jpeg bytes, width, height), ...])
+        """
+        def chunks():
+            chunk = []
+            for pledge in pledges:
+                chunk.append(self.make_job(pledge, qr_for(pledge), variant))
+                if len(chunk) == chunksize:
+                    yield chunk
+                    chunk = []
+            if chunk:
+                yield chunk
+
+        workers = workers or os.cpu_count() or 1
+
+        if workers == 1:
+            card_templates.configure(self.mmap_dir)
+            for chunk in chunks():
+                yield from render_card_batch(chunk)
+            return
+
+        scale = self.variant_dpi(variant) / self.dpi
+        # A dedicated pool sized for the batch, separate from the request-path pool
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(self.mmap_dir, *self.assets, (scale,))
+        ) as executor:
+            for results in executor.map(render_card_batch, chunks()):
+                yield from results
+
+    # ========================
+    # Cache
+    # ========================
+    def _asset_versions(self):
+        versions = []
+        for path in (self.front_template, self.back_template, self.font_path):
+            try:
+                st = os.stat(path)
+                versions.append((path, st.st_mtime, st.st_size))
+            except OSError:
+                versions.append((path, None, None))
+        return versions
+
+    def card_address(self, pledge, qr_data, variant='print'):
+        """Artifact address of a card: changes whenever anything printed on it would."""
+        return artifact_store.address(
+            'donor-card', variant, self.variant_dpi(variant), self.font_size,
+            card_fields(pledge), qr_data, self._asset_versions()
+        )
+
+    def get_pdf(self, pledge, qr_data, variant='print'):
+        """
+        Path of the stored PDF for the pledge as it is now, rendering it if needed.
+
+        Args:
+            pledge: EyeDonationPledge
+            qr_data: Text / URL encoded in the front QR code
+            variant: 'print' (full resolution) or 'screen' (CARD_SCREEN_DPI)
+
+        Returns:
+            str: Path to the PDF
+        """
+        if variant not in CARD_VARIANTS:
+            raise ValueError(f"Unknown card variant: {variant}")
+
+        return artifact_store.get_or_create(
+            self.card_address(pledge, qr_data, variant),
+            lambda: self.render(pledge, qr_data, variant),
+            suffix='.pdf'
+        )
+
+
+card_service = CardService()
@@ -0,0 +1,157 @@
+"""
+Donor Card Verification
+Signed QR payloads for donor cards and the lookup behind /neb/verify/<token>.
+
+A card's QR code encodes PUBLIC_BASE_URL + /neb/verify/<reference>.<mac>,
+where mac is a truncated HMAC-SHA256 of the reference number. The signature is
+checked without touching the database, so forged or mistyped tokens are
+rejected straight away. Valid tokens are answered from a small cache of the
+pledge's verification details, filled on first scan and dropped when the
+pledge is edited. The cache uses the same kind of store as the stats cache:
+with STATS_CACHE_BACKEND=sqlite it is a file shared by every worker, so an
+edit (e.g. deactivation) in one worker is seen by all. A per-worker memory
+cache cannot be invalidated from other workers, so its entries live at most
+LOCAL_CACHE_TTL seconds.
+
+The HMAC key comes from CARD_QR_SECRET, falling back to SECRET_KEY. Cards are
+printed once and kept for years, so set CARD_QR_SECRET explicitly if
+SECRET_KEY may ever be rotated.
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+
+from flask import has_request_context, request
+from sqlalchemy import event
+
+from api.cache import CacheEntry, MemoryBackend, SQLiteBackend
+from models import EyeDonationPledge
+
+
+VERIFY_PATH = '/neb/verify/'
+MAC_BYTES = 12  # 96-bit signature, 16 characters in the token
+LOCAL_CACHE_TTL = 30  # cap for per-worker caches, which other workers' edits cannot invalidate
+
+
+class CardVerifier:
+    """Signs and verifies donor card QR tokens"""
+
+    def __init__(self, app=None):
+        self._key = None
+        self.base_url = ''
+        self.cache_ttl = 300
+        self.cache = MemoryBackend(4096)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        secret = app.config.get('CARD_QR_SECRET') or app.config.get('SECRET_KEY') or ''
+        # Derive a key for this purpose only, rather than signing with SECRET_KEY directly
+        self._key = hmac.new(secret.encode(), b'eye-donor-card-qr', hashlib.sha256).digest()
+        self.base_url = (app.config.get('PUBLIC_BASE_URL') or '').rstrip('/')
+        self.cache_ttl = app.config.get('CARD_VERIFY_CACHE_TTL', self.cache_ttl)
+        max_entries = app.config.get('CARD_VERIFY_CACHE_SIZE', 4096)
+        if app.config.get('STATS_CACHE_BACKEND', 'memory') == 'sqlite':
+            self.cache = SQLiteBackend(os.path.join(app.instance_path, 'card_verify_cache.db'), max_entries)
+        else:
+            self.cache = MemoryBackend(max_entries)
+            self.cache_ttl = min(self.cache_ttl, LOCAL_CACHE_TTL)
+        app.extensions['card_verifier'] = self
+
+    # ========================
+    # Tokens
+    # ========================
+    def _mac(self, reference_number):
+        digest = hmac.new(self._key, reference_number.encode(), hashlib.sha256).digest()
+        return base64.urlsafe_b64encode(digest[:MAC_BYTES]).decode().rstrip('=')
+
+    def sign(self, reference_number):
+        """
+        Token for a reference number.
+
+        Returns:
+            str: '<reference>.<mac>'
+        """
+        return f"{reference_number}.{self._mac(reference_number)}"
+
+    def verify(self, token):
+        """
+        Check a token's signature.
+
+        Returns:
+            str: The reference number, or None when the token is invalid
+        """
+        reference_number, sep, mac = (token or '').rpartition('.')
+        if not sep or not reference_number:
+            return None
+        if not hmac.compare_digest(mac, self._mac(reference_number)):
+            return None
+        return reference_number
+
+    def qr_payload(self, reference_number, base_url=None):
+        """
+        URL encoded in a card's QR code.
+
+        Args:
+            reference_number: Pledge reference number
+            base_url: Site URL to use instead of PUBLIC_BASE_URL
+
+        Returns:
+            str: Absolute verification URL
+        """
+        base = (base_url or self.base_url).rstrip('/')
+        if not base and has_request_context():
+            base = request.host_url.rstrip('/')
+        return f"{base}{VERIFY_PATH}{self.sign(reference_number)}"
+
+    # ========================
+    # Lookup
+    # ========================
+    def lookup(self, reference_number):
+        """
+        Verification details for a pledge, cached for CARD_VERIFY_CACHE_TTL seconds
+        (LOCAL_CACHE_TTL with a per-worker cache).
+
+        Returns:
+            CacheEntry: JSON body (see details()), or None when there is no such pledge
+        """
+        entry = self.cache.get(reference_number)
+        if entry is not None:
+            return entry
+
+        pledge = EyeDonationPledge.query.filter_by(reference_number=reference_number).first()
+        if pledge is None:
+            return None
+
+        body = json.dumps(self.details(pledge), separators=(',', ':')).encode()
+        entry = CacheEntry(body, 'application/json', hashlib.sha1(body).hexdigest(), time.time() + self.cache_ttl)
+        self.cache.set(reference_number, entry)
+        return entry
+
+    @staticmethod
+    def details(pledge):
+        """What staff need at the point of donation: who pledged what, and whether it stands."""
+        return {
+            'valid': True,
+            'reference_number': pledge.reference_number,
+            'donor_name': pledge.donor_name,
+            'donor_age': pledge.donor_age,
+            'organs_consented': pledge.organs_consented,
+            'date_of_pledge': pledge.date_of_pledge.isoformat() if pledge.date_of_pledge else None,
+            'is_active': bool(pledge.is_active),
+        }
+
+    def invalidate(self, reference_number):
+        self.cache.delete(reference_number)
+
+
+card_verifier = CardVerifier()
+
+
+@event.listens_for(EyeDonationPledge, 'after_update')
+def _pledge_updated(mapper, connection, target):
+    card_verifier.invalidate(target.reference_number)
@@ -2,7 +2,7 @@
 import click
 from flask.cli import with_appcontext
 from werkzeug.security import generate_password_hash
-from models import db, AdminUser, SystemLog
+from models import db, AdminUser, SystemLog, SourceEnum
 import getpass
 
 @click.command('create-admin')
@@ -44,3 +44,260 @@ def create_admin_command(username, email, fullname, password):
     except Exception as e:
         db.session.rollback()
         click.echo(f"Error creating user: {e}")
+
+
+@click.command('rollup-backfill')
+@with_appcontext
+def rollup_backfill_command():
+    """Rebuild the pledge_daily_rollup table (and its time bucket indexes) and the pledge counters."""
+    from rollup import PledgeRollup
+    from time_buckets import create_indexes
+    from counters import pledge_counters
+
+    db.create_all()
+    try:
+        create_indexes(db.engine)
+        rows = PledgeRollup.backfill()
+        click.echo(f"Rebuilt pledge_daily_rollup: {rows} rows")
+        for name, value in pledge_counters.rebuild().items():
+            click.echo(f"Counter {name}: {value}")
+    except Exception as e:
+        db.session.rollback()
+        click.echo(f"Error rebuilding rollup: {e}")
+
+
+@click.command('logs-partition-init')
+@with_appcontext
+def logs_partition_init_command():
+    """Move existing system logs into monthly partitions."""
+    from log_partitions import log_partitions
+
+    db.create_all()
+    try:
+        moved = log_partitions.init_partitioning()
+        click.echo(f"Moved {moved} system logs into monthly partitions")
+    except Exception as e:
+        click.echo(f"Error partitioning system logs: {e}")
+
+
+@click.command('logs-retention')
+@click.option('--months', type=int, default=None, help='Months to keep (defaults to SYSTEM_LOG_RETENTION_MONTHS).')
+@with_appcontext
+def logs_retention_command(months):
+    """Archive and drop system log partitions older than the retention window."""
+    from log_partitions import log_partitions
+
+    if not (months or log_partitions.retention_months):
+        click.echo("No retention window set (use --months or SYSTEM_LOG_RETENTION_MONTHS)")
+        return
+    try:
+        archived = log_partitions.apply_retention(months)
+        for path, count in archived:
+            click.echo(f"Archived {count} logs to {path}")
+        click.echo(f"Archived {len(archived)} month(s)")
+    except Exception as e:
+        click.echo(f"Error applying log retention: {e}")
+
+
+@click.command('search-reindex')
+@with_appcontext
+def search_reindex_command():
+    """Create the pledge search indexes and rebuild the full-text table."""
+    from search_index import PledgeSearch
+
+    try:
+        dialect = PledgeSearch.reindex()
+        click.echo(f"Rebuilt pledge search index ({dialect})")
+    except Exception as e:
+        click.echo(f"Error rebuilding search index: {e}")
+
+
+@click.command('generate-cards')
+@click.option('--from', 'date_from', type=click.DateTime(formats=['%Y-%m-%d']), help='Pledges created on or after this date (YYYY-MM-DD).')
+@click.option('--to', 'date_to', type=click.DateTime(formats=['%Y-%m-%d']), help='Pledges created on or before this date (YYYY-MM-DD).')
+@click.option('--source', help='Only pledges from this source.')
+@click.option('--state', help='Only donors from this state.')
+@click.option('--ref', 'refs', multiple=True, help='Reference number (repeatable).')
+@click.option('--refs-file', type=click.File('r'), help='File with one reference number per line.')
+@click.option('--format', 'fmt', type=click.Choice(['pdf', 'zip']), default='pdf', show_default=True,
+              help='One multi-page PDF, or a zip of per-donor PDFs.')
+@click.option('--output', '-o', required=True, type=click.Path(dir_okay=False), help='File to write.')
+@click.option('--variant', type=click.Choice(['print', 'screen']), default='print', show_default=True)
+@click.option('--workers', type=int, default=None, help='Render processes (defaults to the CPU count).')
+@click.option('--base-url', default=None, help='Site URL used in the QR codes (defaults to PUBLIC_BASE_URL).')
+@with_appcontext
+def generate_cards_command(date_from, date_to, source, state, refs, refs_file, fmt, output, variant, workers, base_url):
+    """Render donor cards in bulk (e.g. for camps and mailings)."""
+    import io
+    import os
+    import time
+    import zipfile
+
+    from card_service import card_service
+    from card_verification import card_verifier
+    from models import EyeDonationPledge
+    from search_index import filter_pledges
+    from util import JpegPdfWriter
+
+    if not (base_url or card_verifier.base_url):
+        click.echo("Error: set PUBLIC_BASE_URL or pass --base-url for the QR codes")
+        return
+
+    refs = list(refs)
+    if refs_file:
+        refs += [line.strip() for line in refs_file if line.strip()]
+
+    query = filter_pledges({
+        'state': state,
+        'date_from': date_from.strftime('%Y-%m-%d') if date_from else '',
+        'date_to': date_to.strftime('%Y-%m-%d') if date_to else '',
+    })
+    if source:
+        query = query.filter(EyeDonationPledge.source == source)
+    if refs:
+        query = query.filter(EyeDonationPledge.reference_number.in_(refs))
+
+    total = query.count()
+    if not total:
+        click.echo("No pledges match the given filters")
+        return
+
+    dpi = card_service.variant_dpi(variant)
+    pledges = query.order_by(EyeDonationPledge.created_at, EyeDonationPledge.id).yield_per(500)
+
+    def qr_for(pledge):
+        return card_verifier.qr_payload(pledge.reference_number, base_url=base_url)
+
+    tmp_path = f"{output}.{os.getpid()}.tmp"
+    started = time.monotonic()
+    done = 0
+    try:
+        with open(tmp_path, 'wb') as fh:
+            if fmt == 'pdf':
+                writer = JpegPdfWriter(fh)
+            else:
+                # Card pages are already JPEG-compressed; deflating them again gains nothing
+                archive = zipfile.ZipFile(fh, 'w', compression=zipfile.ZIP_STORED)
+
+            for ref, pages in card_service.render_many(pledges, qr_for, variant=variant, workers=workers):
+                if fmt == 'pdf':
+                    for jpeg, width, height in pages:
+                        writer.add_page(jpeg, width, height, dpi=dpi)
+                else:
+                    buffer = io.BytesIO()
+                    card = JpegPdfWriter(buffer)
+                    for jpeg, width, height in pages:
+                        card.add_page(jpeg, width, height, dpi=dpi)
+                    card.close()
+                    archive.writestr(f"eye_donor_card_{ref}.pdf", buffer.getvalue())
+
+                done += 1
+                if done % 50 == 0 or done == total:
+                    rate = done / max(time.monotonic() - started, 1e-6)
+                    click.echo(f"  {done}/{total} cards ({rate:.1f} cards/sec)", err=True)
+
+            if fmt == 'pdf':
+                writer.close()
+            else:
+                archive.close()
+        os.replace(tmp_path, output)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    elapsed = time.monotonic() - started
+    click.echo(f"Rendered {done} cards in {elapsed:.1f}s ({done / max(elapsed, 1e-6):.1f} cards/sec) -> {output}")
+
+
+@click.command('tasks')
+@click.option('--run', 'run_now', is_flag=True, help='Run every due task now, in this process.')
+@click.option('--retry-failed', is_flag=True, help='Re-queue tasks that used up their attempts.')
+@with_appcontext
+def tasks_command(run_now, retry_failed):
+    """Show (and optionally run) the post-commit task queue."""
+    from task_queue import task_queue
+
+    if retry_failed:
+        click.echo(f"Re-queued {task_queue.retry_failed()} failed task(s)")
+    if run_now:
+        click.echo(f"Ran {task_queue.run_pending()} task(s)")
+    stats = task_queue.stats()
+    click.echo(", ".join(f"{status}: {count}" for status, count in sorted(stats.items())) or "Queue is empty")
+
+
+@click.command('import-pledges')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--source', type=click.Choice([s.value for s in SourceEnum]), default=None,
+              help='Source for rows without a source column (defaults to IMPORT_DEFAULT_SOURCE).')
+@click.option('--errors', 'error_path', type=click.Path(dir_okay=False), default=None,
+              help='Error report to write (defaults to <file>.errors.csv).')
+@click.option('--dry-run', is_flag=True, help='Validate only; nothing is written.')
+@click.option('--allow-duplicates', is_flag=True, help='Also import rows matching an existing pledge (mobile and name).')
+@with_appcontext
+def import_pledges_command(path, source, error_path, dry_run, allow_duplicates):
+    """Bulk-import pledges from a CSV or XLSX file (offline forms, camps, hospitals)."""
+    import os
+    from imports import pledge_importer
+
+    db.create_all()
+    error_path = error_path or f"{os.path.splitext(path)[0]}.errors.csv"
+
+    def progress(summary):
+        click.echo(f"  {summary['rows']} rows: {summary['imported']} ok, {summary['failed']} rejected", err=True)
+
+    with open(path, 'rb') as fh:
+        try:
+            summary = pledge_importer.run(fh, path, source=source, error_path=error_path, dry_run=dry_run,
+                                          allow_duplicates=allow_duplicates, progress=progress)
+        except ValueError as e:
+            click.echo(f"Error: {e}")
+            return
+
+    if summary['ignored_columns']:
+        click.echo(f"Ignored columns: {', '.join(summary['ignored_columns'])}")
+    verb = 'Validated' if dry_run else 'Imported'
+    elapsed = summary['elapsed']
+    click.echo(f"{verb} {summary['imported']} of {summary['rows']} rows in {elapsed:.1f}s "
+               f"({summary['rows'] / max(elapsed, 1e-6):.0f} rows/sec)")
+    if summary['error_report']:
+        click.echo(f"{summary['failed']} rows rejected, see {summary['error_report']}")
+    if summary['error']:
+        click.echo(f"Error: import stopped early: {summary['error']}")
+
+
+@click.command('index-report')
+@click.option('--analyze', is_flag=True, help='Use EXPLAIN ANALYZE on PostgreSQL (runs the queries).')
+@click.option('--verbose', '-v', is_flag=True, help='Print every statement and its full plan.')
+@with_appcontext
+def index_report_command(analyze, verbose):
+    """Explain the hot analytics and admin queries and flag sequential scans."""
+    from index_advisor import run_report
+
+    results = run_report(analyze=analyze)
+    click.echo(f"Index report ({db.engine.dialect.name}, {len(results)} hot paths)")
+    for result in results:
+        if result['error']:
+            status = 'ERROR'
+        elif result['flagged']:
+            status = 'SCAN'
+        else:
+            status = 'ok'
+        notes = []
+        if result['flagged']:
+            notes.append(f"sequential scan of {', '.join(result['flagged'])}")
+        if result['expected']:
+            notes.append(f"full {', '.join(result['expected'])} scan (expected)")
+        if result['error']:
+            notes.append(result['error'])
+        click.echo(f"  {status:<6}{result['label']}" + (f": {'; '.join(notes)}" if notes else ''))
+
+        for statement, lines, scans in result['queries']:
+            if verbose or scans and result['flagged']:
+                click.echo(f"\n        {' '.join(statement.split())}")
+                for line in lines:
+                    click.echo(f"          {line}")
+                click.echo('')
+
+    flagged = sum(1 for result in results if result['flagged'])
+    click.echo(f"{flagged} of {len(results)} hot paths read a table by sequential scan")
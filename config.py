@@ -1,3 +1,4 @@
+import json
 import os
 from datetime import timedelta
 
@@ -58,11 +59,129 @@ class Config:
     AUDIT_LOGS_PER_PAGE = int(os.environ.get("AUDIT_LOGS_PER_PAGE", 50))
     
     # =====================
-    # Email Settings (for future use)
+    # Reference Numbers
+    # =====================
+    REFERENCE_PREFIX = os.environ.get("REFERENCE_PREFIX", "NEB")
+    # Numbers reserved per worker per database round trip (1 = strictly sequential)
+    REFERENCE_BLOCK_SIZE = int(os.environ.get("REFERENCE_BLOCK_SIZE", 1))
+    # Use a native sequence per year on PostgreSQL
+    REFERENCE_USE_DB_SEQUENCE = os.environ.get("REFERENCE_USE_DB_SEQUENCE", "True") == "True"
+    
+    # =====================
+    # Background Exports
+    # =====================
+    # Parquet needs pyarrow and XLSX needs openpyxl (both optional)
+    EXPORT_DIR = os.environ.get("EXPORT_DIR")  # defaults to <instance>/exports
+    EXPORT_WORKERS = int(os.environ.get("EXPORT_WORKERS", 2))
+    EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", 2000))
+    EXPORT_RETENTION_HOURS = int(os.environ.get("EXPORT_RETENTION_HOURS", 24))
+    
+    # =====================
+    # Bulk Import
+    # =====================
+    # XLSX import needs openpyxl (optional)
+    IMPORT_DIR = os.environ.get("IMPORT_DIR")  # error reports, defaults to <instance>/imports
+    IMPORT_BATCH_SIZE = int(os.environ.get("IMPORT_BATCH_SIZE", 2000))  # rows validated and inserted per statement
+    IMPORT_DEFAULT_SOURCE = os.environ.get("IMPORT_DEFAULT_SOURCE", "Offline Form")  # for rows without a source column
+    
+    # =====================
+    # Donor Cards
+    # =====================
+    CARD_FRONT_TEMPLATE = os.environ.get("CARD_FRONT_TEMPLATE", "static/image/donor_front.png")
+    CARD_BACK_TEMPLATE = os.environ.get("CARD_BACK_TEMPLATE", "static/image/donor_back.png")
+    CARD_FONT_PATH = os.environ.get("CARD_FONT_PATH", "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf")
+    CARD_FONT_SIZE = int(os.environ.get("CARD_FONT_SIZE", 105))
+    CARD_DPI = int(os.environ.get("CARD_DPI", 300))  # resolution the templates are designed at
+    CARD_SCREEN_DPI = int(os.environ.get("CARD_SCREEN_DPI", 96))  # ?variant=screen cards
+    # Keep decoded templates as memory-mapped raw files here, shared by all processes
+    CARD_TEMPLATE_MMAP_DIR = os.environ.get("CARD_TEMPLATE_MMAP_DIR")
+    # Render processes per web worker (0 = render in the request thread)
+    CARD_RENDER_WORKERS = int(os.environ.get("CARD_RENDER_WORKERS", 2))
+    # Site URL printed in card QR codes, e.g. https://pledge.example.org (defaults to the request host)
+    PUBLIC_BASE_URL = os.environ.get("PUBLIC_BASE_URL", "")
+    # Signs card QR tokens; falls back to SECRET_KEY. Printed cards stop verifying if it changes.
+    CARD_QR_SECRET = os.environ.get("CARD_QR_SECRET")
+    # Cache of /neb/verify lookups: shared file with STATS_CACHE_BACKEND=sqlite, else per worker (max 30s)
+    CARD_VERIFY_CACHE_TTL = int(os.environ.get("CARD_VERIFY_CACHE_TTL", 300))
+    CARD_VERIFY_CACHE_SIZE = int(os.environ.get("CARD_VERIFY_CACHE_SIZE", 4096))  # cached lookups kept
+    
+    # =====================
+    # Post-Commit Task Queue
+    # =====================
+    TASK_QUEUE_PATH = os.environ.get("TASK_QUEUE_PATH")  # sqlite file, defaults to <instance>/tasks.db
+    TASK_WORKERS = int(os.environ.get("TASK_WORKERS", 2))  # threads per web worker (0 = only `flask tasks --run`)
+    TASK_MAX_ATTEMPTS = int(os.environ.get("TASK_MAX_ATTEMPTS", 5))
+    TASK_LEASE_SECONDS = int(os.environ.get("TASK_LEASE_SECONDS", 300))  # then a running task is retried
+    PRERENDER_CARDS = os.environ.get("PRERENDER_CARDS", "True") == "True"
+    
+    # =====================
+    # Artifact Store (generated card PDFs)
+    # =====================
+    ARTIFACT_DIR = os.environ.get("ARTIFACT_DIR")  # defaults to <instance>/artifacts
+    ARTIFACT_MAX_MB = int(os.environ.get("ARTIFACT_MAX_MB", 512))
+    ARTIFACT_MAX_AGE_DAYS = int(os.environ.get("ARTIFACT_MAX_AGE_DAYS", 30))
+    # '' (Flask sends the file), 'x-accel-redirect' (nginx) or 'x-sendfile' (Apache / lighttpd)
+    ARTIFACT_SENDFILE = os.environ.get("ARTIFACT_SENDFILE", "")
+    # nginx internal location mapped to ARTIFACT_DIR
+    ARTIFACT_ACCEL_PREFIX = os.environ.get("ARTIFACT_ACCEL_PREFIX", "/protected-artifacts/")
+    
+    # =====================
+    # System Log Writer
+    # =====================
+    # SystemLog rows are queued in memory and bulk-inserted by a background thread
+    SYSTEM_LOG_ASYNC = os.environ.get("SYSTEM_LOG_ASYNC", "True") == "True"
+    SYSTEM_LOG_QUEUE_SIZE = int(os.environ.get("SYSTEM_LOG_QUEUE_SIZE", 10000))
+    SYSTEM_LOG_BATCH_SIZE = int(os.environ.get("SYSTEM_LOG_BATCH_SIZE", 200))
+    SYSTEM_LOG_FLUSH_INTERVAL = float(os.environ.get("SYSTEM_LOG_FLUSH_INTERVAL", 2.0))  # seconds
+    SYSTEM_LOG_OVERFLOW = os.environ.get("SYSTEM_LOG_OVERFLOW", "drop_oldest")  # drop_oldest | block
+    SYSTEM_LOG_BLOCK_TIMEOUT = float(os.environ.get("SYSTEM_LOG_BLOCK_TIMEOUT", 1.0))  # seconds, for 'block'
+    
+    # Monthly partitions; months older than the retention window are archived then dropped
+    SYSTEM_LOG_PARTITIONING = os.environ.get("SYSTEM_LOG_PARTITIONING", "True") == "True"
+    SYSTEM_LOG_RETENTION_MONTHS = int(os.environ.get("SYSTEM_LOG_RETENTION_MONTHS", 0))  # 0 = keep forever
+    SYSTEM_LOG_RETENTION_INTERVAL = int(os.environ.get("SYSTEM_LOG_RETENTION_INTERVAL", 24))  # hours
+    SYSTEM_LOG_ARCHIVE_DIR = os.environ.get("SYSTEM_LOG_ARCHIVE_DIR", os.path.join("logs", "archive"))
+    
+    # =====================
+    # Access Logging Policy
+    # =====================
+    # full = one entry per (sampled) request; summary = per-minute hit counts
+    ACCESS_LOG_MODE = os.environ.get("ACCESS_LOG_MODE", "full")
+    # Never logged when successful (prefix match on the request path)
+    ACCESS_LOG_EXCLUDE_PATHS = [
+        p.strip() for p in os.environ.get(
+            "ACCESS_LOG_EXCLUDE_PATHS",
+            "/neb/static/,/neb/favicon.ico,/neb/healthz,/neb/api/stats/"
+        ).split(",") if p.strip()
+    ]
+    # Always logged individually, regardless of sampling or summary mode
+    ACCESS_LOG_ALWAYS_PATHS = [
+        p.strip() for p in os.environ.get(
+            "ACCESS_LOG_ALWAYS_PATHS",
+            "/neb/admin,/neb/dashboard,/neb/api/dashboard"
+        ).split(",") if p.strip()
+    ]
+    # Per-endpoint sample rates as JSON, e.g. {"index": 0.1, "guide": 0.25}
+    ACCESS_LOG_SAMPLE_RATES = json.loads(os.environ.get("ACCESS_LOG_SAMPLE_RATES", "{}"))
+    ACCESS_LOG_DEFAULT_SAMPLE_RATE = float(os.environ.get("ACCESS_LOG_DEFAULT_SAMPLE_RATE", 1.0))
+    
+    # =====================
+    # Public Stats API Cache
+    # =====================
+    STATS_CACHE_ENABLED = os.environ.get("STATS_CACHE_ENABLED", "True") == "True"
+    STATS_CACHE_BACKEND = os.environ.get("STATS_CACHE_BACKEND", "memory")  # memory | sqlite
+    STATS_CACHE_PATH = os.environ.get("STATS_CACHE_PATH")  # sqlite file, defaults to instance/stats_cache.db
+    STATS_CACHE_MAX_ENTRIES = int(os.environ.get("STATS_CACHE_MAX_ENTRIES", 512))
+    STATS_CACHE_DEFAULT_TTL = int(os.environ.get("STATS_CACHE_DEFAULT_TTL", 60))
+    STATS_PAGE_CACHE_TTL = int(os.environ.get("STATS_PAGE_CACHE_TTL", 60))  # rendered /neb/stats page, per language
+    PLEDGE_COUNTER_TTL = int(os.environ.get("PLEDGE_COUNTER_TTL", 5))  # per-worker cache of the maintained pledge total
+    
+    # =====================
+    # Email Settings (pledge confirmations are sent when MAIL_SERVER is set)
     # =====================
     MAIL_SERVER = os.environ.get("MAIL_SERVER")
     MAIL_PORT = int(os.environ.get("MAIL_PORT", 587))
-    MAIL_USE_TLS = os.environ.get("MAIL_USE_TLS", True)
+    MAIL_USE_TLS = os.environ.get("MAIL_USE_TLS", "True") == "True"
     MAIL_USERNAME = os.environ.get("MAIL_USERNAME")
     MAIL_PASSWORD = os.environ.get("MAIL_PASSWORD")
     MAIL_DEFAULT_SENDER = os.environ.get("MAIL_DEFAULT_SENDER", "noreply@eyebank.org")
@@ -107,6 +226,7 @@ class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = "sqlite:///:memory:"
     SESSION_COOKIE_SECURE = False
+    SYSTEM_LOG_ASYNC = False
 
 
 class ProductionConfig(Config):
@@ -0,0 +1,181 @@
+"""
+Pledge Counters
+Running totals in the pledge_counters table, for pages that only need "N pledges".
+
+- Each counter row is adjusted by the ORM listeners below in the same
+  transaction as the pledge insert / (de)activation / delete, and by the bulk
+  importer for the rows it writes, so it always agrees with the pledge table.
+- Reads go through a small per-process cache (PLEDGE_COUNTER_TTL seconds), so a
+  busy home page costs at most one primary-key lookup per worker per TTL.
+  Writers clear it with invalidate() alongside the stats cache, and readers
+  whose result is cached for longer (the stats summary) read with fresh=True.
+- A counter that has no row yet (new or upgraded database) is seeded from the
+  pledge table on first read; `flask rollup-backfill` recomputes every counter.
+  Seeding and recomputing count and store in one step that pledge writes
+  cannot interleave with (see _store()), so no concurrent pledge is lost.
+"""
+
+import time
+
+from sqlalchemy import event, func, inspect, insert, literal, select, text, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+
+from models import EyeDonationPledge, PledgeCounter, db
+
+
+ACTIVE_PLEDGES = 'active_pledges'
+
+# Counter name -> query computing its value from scratch
+COUNTER_QUERIES = {
+    ACTIVE_PLEDGES: lambda: select(func.count(EyeDonationPledge.id)).where(EyeDonationPledge.is_active == True),
+}
+
+
+class PledgeCounters:
+    """Maintained counters with a short-lived in-process read cache"""
+
+    def __init__(self, app=None):
+        self.ttl = 5
+        self._cache = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.ttl = app.config.get('PLEDGE_COUNTER_TTL', 5)
+        app.extensions['pledge_counters'] = self
+
+    def get(self, name=ACTIVE_PLEDGES, fresh=False):
+        """
+        Current value of a counter (at most `ttl` seconds old).
+
+        Args:
+            name: Counter name
+            fresh: Read the database instead of the per-process cache
+
+        Returns:
+            int: Counter value
+        """
+        cached = self._cache.get(name)
+        if not fresh and cached is not None and cached[1] > time.monotonic():
+            return cached[0]
+
+        value = db.session.execute(
+            select(PledgeCounter.value).where(PledgeCounter.name == name)
+        ).scalar()
+        if value is None:
+            value = self._seed(name)
+
+        self._cache[name] = (value, time.monotonic() + self.ttl)
+        return value
+
+    def active_pledges(self, fresh=False):
+        """Number of active pledges."""
+        return self.get(ACTIVE_PLEDGES, fresh)
+
+    def invalidate(self):
+        """Drop this process's cached values (called after pledge writes)."""
+        self._cache.clear()
+
+    def apply(self, connection, deltas):
+        """
+        Add deltas to counters on the caller's connection (inside its transaction).
+
+        Args:
+            connection: SQLAlchemy Connection of the pledge write
+            deltas: Mapping of counter name -> change
+        """
+        table = PledgeCounter.__table__
+        for name, delta in deltas.items():
+            if delta:
+                # A missing row is left alone: it is seeded with the full count on first read
+                connection.execute(
+                    update(table).where(table.c.name == name).values(value=table.c.value + delta)
+                )
+
+    def rebuild(self):
+        """
+        Recompute every counter from the pledge table.
+
+        Returns:
+            dict: Counter name -> value
+        """
+        with db.engine.begin() as conn:
+            values = {name: self._store(conn, name, replace=True) for name in COUNTER_QUERIES}
+        self._cache.clear()
+        return values
+
+    def _seed(self, name):
+        try:
+            with db.engine.begin() as conn:
+                return self._store(conn, name)
+        except IntegrityError:
+            # Another worker seeded it first (backends without ON CONFLICT)
+            table = PledgeCounter.__table__
+            return db.session.execute(select(table.c.value).where(table.c.name == name)).scalar()
+
+    @staticmethod
+    def _store(conn, name, replace=False):
+        """
+        Write a counter's value computed from scratch (kept if the row exists, unless `replace`).
+
+        apply() skips a missing row, so a pledge committed between the count and
+        the insert would be lost. On SQLite the single INSERT ... SELECT holds the
+        write lock throughout; on PostgreSQL a SHARE lock waits for pledge writes in
+        flight (so they are counted) and holds off new ones until the row exists.
+
+        Returns:
+            int: Stored value
+        """
+        table = PledgeCounter.__table__
+        dialect = conn.dialect.name
+
+        if dialect in ('sqlite', 'postgresql'):
+            if dialect == 'postgresql':
+                conn.execute(text("SET LOCAL lock_timeout = '10s'"))
+                conn.execute(text(f"LOCK TABLE {EyeDonationPledge.__tablename__} IN SHARE MODE"))
+            dialect_insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+            stmt = dialect_insert(table).from_select(
+                ['name', 'value'], select(literal(name), COUNTER_QUERIES[name]().scalar_subquery())
+            )
+            if replace:
+                stmt = stmt.on_conflict_do_update(index_elements=['name'], set_={'value': stmt.excluded.value})
+            else:
+                stmt = stmt.on_conflict_do_nothing(index_elements=['name'])
+            conn.execute(stmt)
+        else:
+            value = conn.execute(COUNTER_QUERIES[name]()).scalar()
+            updated = replace and conn.execute(
+                update(table).where(table.c.name == name).values(value=value)
+            ).rowcount
+            if not updated:
+                conn.execute(insert(table).values(name=name, value=value))
+
+        return conn.execute(select(table.c.value).where(table.c.name == name)).scalar()
+
+
+pledge_counters = PledgeCounters()
+
+
+# ========================
+# Maintenance listeners
+# ========================
+@event.listens_for(EyeDonationPledge, 'after_insert')
+def _pledge_inserted(mapper, connection, target):
+    if target.is_active:
+        pledge_counters.apply(connection, {ACTIVE_PLEDGES: 1})
+
+
+@event.listens_for(EyeDonationPledge, 'after_update')
+def _pledge_updated(mapper, connection, target):
+    history = inspect(target).attrs.is_active.history
+    if not history.has_changes():
+        return
+    was_active = bool(history.deleted[0]) if history.deleted else False
+    pledge_counters.apply(connection, {ACTIVE_PLEDGES: int(bool(target.is_active)) - int(was_active)})
+
+
+@event.listens_for(EyeDonationPledge, 'after_delete')
+def _pledge_deleted(mapper, connection, target):
+    if target.is_active:
+        pledge_counters.apply(connection, {ACTIVE_PLEDGES: -1})
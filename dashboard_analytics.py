@@ -3,12 +3,26 @@ Dashboard Analytics Module
 Provides optimized data aggregation and analytics functions for the dashboard.
 """
 
-from datetime import datetime, timedelta
-from sqlalchemy import func, extract, case
-from models import EyeDonationPledge, db
+from datetime import datetime, date, timedelta
+from sqlalchemy import func, case, and_
+from models import EyeDonationPledge, PledgeDailyRollup, db
+from rollup import PledgeRollup
+from time_buckets import bucket, in_range, series, shift
+from counters import pledge_counters
 from collections import defaultdict
 
 
+# Every aggregate below reads the pre-aggregated daily rollup rather than
+# scanning eye_donation_pledges; only inactive-free counts are stored there.
+Rollup = PledgeDailyRollup
+pledge_total = func.sum(Rollup.pledge_count)
+
+
+def _as_date(value):
+    """Normalise a date/datetime filter bound to a date."""
+    return value.date() if isinstance(value, datetime) else value
+
+
 class DashboardAnalytics:
     """Main analytics class for dashboard data"""
     
@@ -25,69 +39,66 @@ class DashboardAnalytics:
         Returns:
             dict: Summary statistics including totals, today, month, year
         """
-        # Base query
-        query = EyeDonationPledge.query.filter_by(is_active=True)
-        
-        # Apply filters
+        # Half-open [start, end) day ranges on the indexed rollup day column
+        today_start = datetime.now().date()
+        tomorrow_start = today_start + timedelta(days=1)
+        yesterday_start = today_start - timedelta(days=1)
+        thirty_days_start = today_start - timedelta(days=30)
+        
+        month_start = today_start.replace(day=1)
+        next_month_start = (month_start + timedelta(days=32)).replace(day=1)
+        last_month_start = (month_start - timedelta(days=1)).replace(day=1)
+        
+        year_start = month_start.replace(month=1)
+        next_year_start = year_start.replace(year=year_start.year + 1)
+        last_year_start = year_start.replace(year=year_start.year - 1)
+        
+        day = Rollup.day
+        filtered = bool(start_date or end_date or state_filter)
+        
+        def count_between(start, end):
+            return func.coalesce(func.sum(case(
+                (and_(day >= start, day < end), Rollup.pledge_count),
+                else_=0
+            )), 0)
+        
+        # One conditional-aggregation pass computes every counter at once
+        query = db.session.query(
+            func.coalesce(pledge_total, 0).label('total'),
+            count_between(today_start, tomorrow_start).label('today'),
+            count_between(yesterday_start, today_start).label('yesterday'),
+            count_between(month_start, next_month_start).label('this_month'),
+            count_between(last_month_start, month_start).label('last_month'),
+            count_between(year_start, next_year_start).label('this_year'),
+            count_between(last_year_start, year_start).label('last_year'),
+            count_between(thirty_days_start, tomorrow_start).label('last_30_days'),
+        )
+        
+        # Apply filters (the rollup is day-grained, so filters round to whole days)
         if start_date:
-            query = query.filter(EyeDonationPledge.created_at >= start_date)
+            query = query.filter(day >= _as_date(start_date))
         if end_date:
-            query = query.filter(EyeDonationPledge.created_at <= end_date)
+            query = query.filter(day <= _as_date(end_date))
         if state_filter:
-            query = query.filter(EyeDonationPledge.state == state_filter)
-        
-        # Calculate various metrics
-        total_pledges = query.count()
-        
-        # Today's pledges
-        today = datetime.now().date()
-        today_pledges = query.filter(
-            func.date(EyeDonationPledge.created_at) == today
-        ).count()
-        
-        # Yesterday's pledges (for % change)
-        yesterday = today - timedelta(days=1)
-        yesterday_pledges = query.filter(
-            func.date(EyeDonationPledge.created_at) == yesterday
-        ).count()
-        
-        # This month
-        current_year = datetime.now().year
-        current_month = datetime.now().month
-        this_month_pledges = query.filter(
-            extract('year', EyeDonationPledge.created_at) == current_year,
-            extract('month', EyeDonationPledge.created_at) == current_month
-        ).count()
-        
-        # Last month (for % change)
-        if current_month == 1:
-            last_month_year = current_year - 1
-            last_month = 12
-        else:
-            last_month_year = current_year
-            last_month = current_month - 1
-            
-        last_month_pledges = query.filter(
-            extract('year', EyeDonationPledge.created_at) == last_month_year,
-            extract('month', EyeDonationPledge.created_at) == last_month
-        ).count()
-        
-        # This year
-        this_year_pledges = query.filter(
-            extract('year', EyeDonationPledge.created_at) == current_year
-        ).count()
-        
-        # Last year (for % change)
-        last_year_pledges = query.filter(
-            extract('year', EyeDonationPledge.created_at) == current_year - 1
-        ).count()
+            query = query.filter(Rollup.state == state_filter)
+        if not filtered:
+            # The all-time total comes from the maintained counter, so only
+            # the days the windowed counters need are read
+            query = query.filter(day >= last_year_start)
+        
+        row = query.one()
+        # Read past the per-process counter cache: this result is itself cached
+        # (stats API, stats page) and must agree with today's count
+        total_pledges = row.total if filtered else pledge_counters.active_pledges(fresh=True)
+        today_pledges = row.today
+        yesterday_pledges = row.yesterday
+        this_month_pledges = row.this_month
+        last_month_pledges = row.last_month
+        this_year_pledges = row.this_year
+        last_year_pledges = row.last_year
         
         # Average per day (last 30 days)
-        thirty_days_ago = today - timedelta(days=30)
-        last_30_days_pledges = query.filter(
-            func.date(EyeDonationPledge.created_at) >= thirty_days_ago
-        ).count()
-        avg_per_day = round(last_30_days_pledges / 30, 1)
+        avg_per_day = round(row.last_30_days / 30, 1)
         
         # Calculate percentage changes
         def calc_percent_change(current, previous):
@@ -119,73 +130,50 @@ class DashboardAnalytics:
         Returns:
             dict: Labels and data arrays for charting
         """
-        query = EyeDonationPledge.query.filter_by(is_active=True)
-        
+        filters = []
         if state_filter:
-            query = query.filter(EyeDonationPledge.state == state_filter)
+            filters.append(Rollup.state == state_filter)
         
         if period == 'daily':
-            # Last N days
-            end_date = datetime.now().date()
-            start_date = end_date - timedelta(days=limit - 1)
+            # Last N days (the rollup day is already the day bucket)
+            days = series('day', limit)
             
             daily_data = db.session.query(
-                func.date(EyeDonationPledge.created_at).label('date'),
-                func.count(EyeDonationPledge.id).label('count')
+                Rollup.day.label('date'),
+                pledge_total.label('count')
             ).filter(
-                EyeDonationPledge.is_active == True,
-                func.date(EyeDonationPledge.created_at) >= start_date
-            ).group_by('date').order_by('date').all()
+                in_range(Rollup.day, days[0], shift('day', days[-1], 1)),
+                *filters
+            ).group_by(Rollup.day).all()
             
             # Fill gaps
-            date_dict = {str(row.date): row.count for row in daily_data}
-            labels = []
-            data = []
+            totals = {row.date: row.count for row in daily_data}
             
-            for i in range(limit):
-                current_date = end_date - timedelta(days=limit - 1 - i)
-                labels.append(current_date.strftime('%d %b'))
-                data.append(date_dict.get(str(current_date), 0))
-                
-            return {'labels': labels, 'data': data}
+            return {
+                'labels': [d.strftime('%d %b') for d in days],
+                'data': [totals.get(d, 0) for d in days]
+            }
         
         elif period == 'monthly':
-            # Last N months
-            current_year = datetime.now().year
-            monthly_data = db.session.query(
-                extract('year', EyeDonationPledge.created_at).label('year'),
-                extract('month', EyeDonationPledge.created_at).label('month'),
-                func.count(EyeDonationPledge.id).label('count')
-            ).filter(
-                EyeDonationPledge.is_active == True
-            ).group_by('year', 'month').order_by('year', 'month').all()
-            
-            # Create a dictionary for easy lookup
-            data_dict = {(int(row.year), int(row.month)): row.count for row in monthly_data}
-            
-            labels = []
-            data = []
+            # Last N calendar months, including the current one
+            months = series('month', limit)
+            totals = DashboardAnalytics.get_monthly_totals(months[0], months[-1], state_filter)
             
-            # Get last N months
-            end_date = datetime.now()
-            for i in range(limit - 1, -1, -1):
-                target_date = end_date - timedelta(days=i * 30)
-                year, month = target_date.year, target_date.month
-                labels.append(target_date.strftime('%b %Y'))
-                data.append(data_dict.get((year, month), 0))
-            
-            return {'labels': labels, 'data': data}
+            return {
+                'labels': [m.strftime('%b %Y') for m in months],
+                'data': [totals.get(m, 0) for m in months]
+            }
         
         elif period == 'yearly':
             # Yearly trend
             yearly_data = db.session.query(
-                extract('year', EyeDonationPledge.created_at).label('year'),
-                func.count(EyeDonationPledge.id).label('count')
+                bucket('year', Rollup.day).label('year'),
+                pledge_total.label('count')
             ).filter(
-                EyeDonationPledge.is_active == True
+                *filters
             ).group_by('year').order_by('year').all()
             
-            labels = [str(int(row.year)) for row in yearly_data]
+            labels = [str(row.year.year) for row in yearly_data]
             data = [row.count for row in yearly_data]
             
             return {'labels': labels, 'data': data}
@@ -203,31 +191,27 @@ class DashboardAnalytics:
         Returns:
             dict: State-wise and city-wise breakdowns
         """
+        state = PledgeRollup.dimension(Rollup.state).label('state')
+        city = PledgeRollup.dimension(Rollup.city).label('city')
+        
+        # All states for map
+        all_states = db.session.query(
+            state,
+            pledge_total.label('count')
+        ).group_by(Rollup.state).order_by(pledge_total.desc()).all()
+        
         # Top states
-        top_states = db.session.query(
-            EyeDonationPledge.state,
-            func.count(EyeDonationPledge.id).label('count')
-        ).filter_by(is_active=True).group_by(
-            EyeDonationPledge.state
-        ).order_by(func.count(EyeDonationPledge.id).desc()).limit(top_n).all()
+        top_states = all_states[:top_n]
         
         # Top cities
         top_cities = db.session.query(
-            EyeDonationPledge.city,
-            EyeDonationPledge.state,
-            func.count(EyeDonationPledge.id).label('count')
-        ).filter_by(is_active=True).group_by(
-            EyeDonationPledge.city,
-            EyeDonationPledge.state
-        ).order_by(func.count(EyeDonationPledge.id).desc()).limit(top_n).all()
-        
-        # All states for map
-        all_states = db.session.query(
-            EyeDonationPledge.state,
-            func.count(EyeDonationPledge.id).label('count')
-        ).filter_by(is_active=True).group_by(
-            EyeDonationPledge.state
-        ).all()
+            city,
+            state,
+            pledge_total.label('count')
+        ).group_by(
+            Rollup.city,
+            Rollup.state
+        ).order_by(pledge_total.desc()).limit(top_n).all()
         
         return {
             'top_states': [{'state': s.state, 'count': s.count} for s in top_states],
@@ -243,32 +227,25 @@ class DashboardAnalytics:
         Returns:
             dict: Age group and gender distribution
         """
-        # Age group distribution
+        # Age group distribution (buckets are computed when the rollup is written)
         age_groups = db.session.query(
-            case(
-                (EyeDonationPledge.donor_age < 18, '< 18'),
-                (EyeDonationPledge.donor_age.between(18, 25), '18-25'),
-                (EyeDonationPledge.donor_age.between(26, 35), '26-35'),
-                (EyeDonationPledge.donor_age.between(36, 45), '36-45'),
-                (EyeDonationPledge.donor_age.between(46, 60), '46-60'),
-                else_='60+'
-            ).label('age_group'),
-            func.count(EyeDonationPledge.id).label('count')
-        ).filter_by(is_active=True).filter(
-            EyeDonationPledge.donor_age.isnot(None)
-        ).group_by('age_group').all()
+            Rollup.age_bucket.label('age_group'),
+            pledge_total.label('count')
+        ).filter(
+            Rollup.age_bucket != ''
+        ).group_by(Rollup.age_bucket).order_by(Rollup.age_bucket).all()
         
         # Gender distribution
         gender_dist = db.session.query(
-            EyeDonationPledge.donor_gender,
-            func.count(EyeDonationPledge.id).label('count')
-        ).filter_by(is_active=True).filter(
-            EyeDonationPledge.donor_gender.isnot(None)
-        ).group_by(EyeDonationPledge.donor_gender).all()
+            Rollup.gender,
+            pledge_total.label('count')
+        ).filter(
+            Rollup.gender != ''
+        ).group_by(Rollup.gender).order_by(Rollup.gender).all()
         
         return {
             'age_groups': [{'group': ag[0], 'count': ag[1]} for ag in age_groups],
-            'gender': [{'gender': g.donor_gender, 'count': g.count} for g in gender_dist]
+            'gender': [{'gender': g.gender, 'count': g.count} for g in gender_dist]
         }
     
     @staticmethod
@@ -279,23 +256,10 @@ class DashboardAnalytics:
         Returns:
             dict: Growth rates and cumulative trends
         """
-        # Month-over-month growth for last 12 months
-        current_date = datetime.now()
-        monthly_counts = []
-        
-        for i in range(12, 0, -1):
-            target_date = current_date - timedelta(days=i * 30)
-            year, month = target_date.year, target_date.month
-            
-            count = EyeDonationPledge.query.filter_by(is_active=True).filter(
-                extract('year', EyeDonationPledge.created_at) == year,
-                extract('month', EyeDonationPledge.created_at) == month
-            ).count()
-            
-            monthly_counts.append({
-                'month': target_date.strftime('%b %Y'),
-                'count': count
-            })
+        # Month-over-month growth for the last 12 complete months
+        months = series('month', 12, shift('month', datetime.utcnow().date().replace(day=1), -1))
+        totals = DashboardAnalytics.get_monthly_totals(months[0], months[-1])
+        monthly_counts = [{'month': m.strftime('%b %Y'), 'count': totals.get(m, 0)} for m in months]
         
         # Calculate growth rates
         growth_rates = []
@@ -318,6 +282,31 @@ class DashboardAnalytics:
             'growth_rates': growth_rates
         }
     
+    @staticmethod
+    def get_monthly_totals(first_month, last_month, state_filter=None):
+        """
+        Pledge totals per calendar month, from one query grouped on the indexed month bucket.
+        
+        Args:
+            first_month: First day of the oldest month
+            last_month: Any day in the newest month
+            state_filter: Optional state filter
+            
+        Returns:
+            dict: First day of month -> count (months without pledges are absent)
+        """
+        month = bucket('month', Rollup.day)
+        
+        # Whole months, so the range can be taken on the bucket itself
+        query = db.session.query(month.label('month'), pledge_total.label('count')).filter(
+            in_range(month, first_month.replace(day=1), shift('month', last_month.replace(day=1), 1))
+        )
+        if state_filter:
+            query = query.filter(Rollup.state == state_filter)
+        
+        rows = query.group_by(month).all()
+        return {row.month: row.count for row in rows}
+    
     @staticmethod
     def get_peak_activity_analysis():
         """
@@ -326,17 +315,20 @@ class DashboardAnalytics:
         Returns:
             dict: Activity patterns by hour and day
         """
-        # Hour of day distribution
+        # Hour of day distribution (the rollup is day-grained, so this one
+        # still aggregates the pledge table itself)
+        hour = bucket('hour_of_day', EyeDonationPledge.created_at)
         hourly_dist = db.session.query(
-            extract('hour', EyeDonationPledge.created_at).label('hour'),
+            hour.label('hour'),
             func.count(EyeDonationPledge.id).label('count')
-        ).filter_by(is_active=True).group_by('hour').order_by('hour').all()
+        ).filter(EyeDonationPledge.is_active == True).group_by(hour).all()
         
-        # Day of week distribution (0 = Monday, 6 = Sunday)
+        # Day of week distribution (0 = Monday, 6 = Sunday on every backend)
+        dow = bucket('day_of_week', Rollup.day)
         daily_dist = db.session.query(
-            extract('dow', EyeDonationPledge.created_at).label('day'),
-            func.count(EyeDonationPledge.id).label('count')
-        ).filter_by(is_active=True).group_by('day').order_by('day').all()
+            dow.label('dow'),
+            pledge_total.label('count')
+        ).group_by(dow).all()
         
         # Day names
         day_names = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
@@ -344,16 +336,12 @@ class DashboardAnalytics:
         # Create 24-hour array
         hourly_data = [0] * 24
         for row in hourly_dist:
-            hourly_data[int(row.hour)] = row.count
+            hourly_data[row.hour] = row.count
         
         # Create 7-day array
-        daily_data_dict = {int(row.day): row.count for row in daily_dist}
-        daily_data = []
-        for i in range(7):
-            # PostgreSQL: 0 = Sunday, 1 = Monday, ..., 6 = Saturday
-            # Convert to: 0 = Monday, ..., 6 = Sunday
-            pg_day = (i + 1) % 7
-            daily_data.append(daily_data_dict.get(pg_day, 0))
+        daily_data = [0] * 7
+        for row in daily_dist:
+            daily_data[row.dow] = row.count
         
         return {
             'hourly': {
@@ -375,15 +363,17 @@ class DashboardAnalytics:
             dict: Language preference breakdown
         """
         lang_dist = db.session.query(
-            EyeDonationPledge.language_preference,
-            func.count(EyeDonationPledge.id).label('count')
-        ).filter_by(is_active=True).filter(
-            EyeDonationPledge.language_preference.isnot(None)
-        ).group_by(EyeDonationPledge.language_preference).all()
+            Rollup.language,
+            pledge_total.label('count')
+        ).filter(
+            Rollup.language != ''
+        ).group_by(Rollup.language).all()
         
         return {
-            'languages': [{'language': l.language_preference, 'count': l.count} for l in lang_dist]
-        }    @staticmethod
+            'languages': [{'language': l.language, 'count': l.count} for l in lang_dist]
+        }
+
+    @staticmethod
     def get_historical_comparison(years=5):
         """
         Get pledge comparisons for the last N years.
@@ -395,29 +385,16 @@ class DashboardAnalytics:
             dict: Year-wise labels and data
         """
         current_year = datetime.now().year
-        data_by_year = {}
-        
-        # Calculate start year
         start_year = current_year - years + 1
         
-        print(f"Adding historical comparison from {start_year}")
-        
-        # Query for yearly aggregation
-        yearly_counts = db.session.query(
-            extract('year', EyeDonationPledge.created_at).label('year'),
-            func.count(EyeDonationPledge.id).label('count')
-        ).filter(
-            EyeDonationPledge.is_active == True,
-            extract('year', EyeDonationPledge.created_at) >= start_year
-        ).group_by('year').order_by('year').all()
-        
-        # Format response
-        labels = []
-        data = []
+        # Month buckets from the shared grouped query, folded into years
+        totals = DashboardAnalytics.get_monthly_totals(date(start_year, 1, 1), date(current_year, 12, 1))
+        data_by_year = defaultdict(int)
+        for month, count in totals.items():
+            data_by_year[month.year] += count
         
-        for row in yearly_counts:
-            labels.append(str(int(row.year)))
-            data.append(row.count)
+        labels = [str(year) for year in sorted(data_by_year)]
+        data = [data_by_year[year] for year in sorted(data_by_year)]
             
         return {
             'labels': labels,
@@ -429,43 +406,23 @@ class DashboardAnalytics:
         """
         Get comparative indicators (MoM, YoY).
         """
-        now = datetime.now()
-        current_year = now.year
-        current_month = now.month
-        
-        # Query total count function
-        def get_count_for_period(year, month=None):
-            q = EyeDonationPledge.query.filter_by(is_active=True).filter(
-                extract('year', EyeDonationPledge.created_at) == year
-            )
-            if month:
-                q = q.filter(extract('month', EyeDonationPledge.created_at) == month)
-            return q.count()
-
-        # Month over Month
-        this_month_count = get_count_for_period(current_year, current_month)
+        this_month = datetime.now().date().replace(day=1)
+        current_year = this_month.year
+        
+        # Every month since January last year, in one grouped query
+        totals = DashboardAnalytics.get_monthly_totals(date(current_year - 1, 1, 1), this_month)
         
-        if current_month == 1:
-            last_month_count = get_count_for_period(current_year - 1, 12)
-        else:
-            last_month_count = get_count_for_period(current_year, current_month - 1)
+        # Month over Month
+        this_month_count = totals.get(this_month, 0)
+        last_month_count = totals.get(shift('month', this_month, -1), 0)
             
         mom_growth = 0
         if last_month_count > 0:
             mom_growth = round(((this_month_count - last_month_count) / last_month_count) * 100, 1)
 
-        # Year over Year (YTD) to compare fair progress
-        # Compare Jan-CurrentMonth of this year vs Jan-CurrentMonth of last year
-        # This is more accurate than comparing a partial 2024 to a full 2023
-        
-        # Logic for YTD
-        # Since standard SQL alchemy filtering for "month <= X" inside extract can be complex across DBs in YTD context, 
-        # we will fetch full year counts for simplicity in this version, 
-        # OR implement a rough YoY of total yearly volume.
-        # Let's stick to Total Year comparison for "YoY" card generally.
-        
-        this_year_count = get_count_for_period(current_year)
-        last_year_count = get_count_for_period(current_year - 1)
+        # Year over Year: total yearly volume (this year to date vs all of last year)
+        this_year_count = sum(count for month, count in totals.items() if month.year == current_year)
+        last_year_count = sum(count for month, count in totals.items() if month.year == current_year - 1)
         
         yoy_growth = 0
         if last_year_count > 0:
@@ -480,9 +437,9 @@ class DashboardAnalytics:
     def get_source_distribution():
         """Get breakdown of pledges by source."""
         results = db.session.query(
-            EyeDonationPledge.source,
-            func.count(EyeDonationPledge.id)
-        ).filter_by(is_active=True).group_by(EyeDonationPledge.source).all()
+            PledgeRollup.dimension(Rollup.source),
+            pledge_total
+        ).group_by(Rollup.source).all()
         
         labels = [r[0] for r in results]
         data = [r[1] for r in results]
@@ -493,22 +450,47 @@ class DashboardAnalytics:
     def get_medical_consent_stats():
         """Get stats on consent types (Cornea vs Whole Eye)."""
         results = db.session.query(
-            EyeDonationPledge.organs_consented,
-            func.count(EyeDonationPledge.id)
-        ).filter_by(is_active=True).group_by(EyeDonationPledge.organs_consented).all()
+            PledgeRollup.dimension(Rollup.organs_consented),
+            pledge_total
+        ).group_by(Rollup.organs_consented).all()
         
         return [{'label': r[0], 'value': r[1]} for r in results]
 
+    @staticmethod
+    def compute_bundle(builders, names, **params):
+        """
+        Compute several widgets against one consistent database snapshot.
+        
+        Args:
+            builders: Mapping of widget name -> callable returning JSON-able data
+            names: Widget names to compute, in response order
+            **params: Keyword arguments passed to every builder
+            
+        Returns:
+            dict: Widget name -> widget data
+        """
+        # Every builder runs on the request's session; on PostgreSQL pin that
+        # session to a REPEATABLE READ transaction so all widgets see one snapshot.
+        owns_transaction = not db.session().in_transaction()
+        if owns_transaction and db.engine.dialect.name == 'postgresql':
+            db.session.connection(execution_options={'isolation_level': 'REPEATABLE READ'})
+        
+        try:
+            return {name: builders[name](**params) for name in names}
+        finally:
+            # Read-only work: end the snapshot transaction straight away
+            if owns_transaction:
+                db.session.rollback()
+
     @staticmethod
     def get_district_wise_stats(state_name):
         """Get district-level stats for a specific state."""
         results = db.session.query(
-            EyeDonationPledge.district,
-            func.count(EyeDonationPledge.id)
+            Rollup.district,
+            pledge_total
         ).filter(
-            EyeDonationPledge.is_active == True,
-            EyeDonationPledge.state == state_name,
-            EyeDonationPledge.district.isnot(None)
-        ).group_by(EyeDonationPledge.district).order_by(func.count(EyeDonationPledge.id).desc()).all()
+            Rollup.state == state_name,
+            Rollup.district != ''
+        ).group_by(Rollup.district).order_by(pledge_total.desc()).all()
         
         return [{'district': r[0], 'count': r[1]} for r in results]
@@ -0,0 +1,435 @@
+"""
+Pledge Export Module
+Streams admin pledge exports without loading the result set into memory.
+
+Two paths share the same filters as the admin pledge list (search_index.py):
+
+- /neb/admin/export streams a six-column CSV straight to the browser. Only the
+  exported columns are selected (no ORM objects are built), and rows are
+  fetched in chunks of EXPORT_FETCH_SIZE through a server-side cursor where
+  the driver supports it.
+- Export jobs run in a background thread pool. They take any subset of the
+  EyeDonationPledge.to_dict() fields and write CSV, gzipped JSONL, Parquet
+  (needs pyarrow) or XLSX (needs openpyxl) files into EXPORT_DIR. Rows are
+  read in keyset batches of EXPORT_BATCH_SIZE, so at most one batch is ever
+  held in memory. Progress is committed after every batch for the polling UI.
+"""
+
+import csv
+import gzip
+import json
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time, timedelta
+from io import StringIO
+
+from sqlalchemy import Boolean, Date, DateTime, Integer, Time, tuple_
+
+from models import EyeDonationPledge, ExportJob, db
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is optional
+    pa = pq = None
+
+try:
+    from openpyxl import Workbook
+except ImportError:  # XLSX export is optional
+    Workbook = None
+
+
+error_logger = logging.getLogger('error_logger')
+
+EXPORT_FETCH_SIZE = 1000
+
+# (CSV header, column) in output order
+EXPORT_COLUMNS = [
+    ('Reference Number', EyeDonationPledge.reference_number),
+    ('Donor Name', EyeDonationPledge.donor_name),
+    ('Mobile', EyeDonationPledge.donor_mobile),
+    ('Email', EyeDonationPledge.donor_email),
+    ('State', EyeDonationPledge.state),
+    ('Created Date', EyeDonationPledge.created_at),
+]
+
+# Fields offered to export jobs: the names and order of EyeDonationPledge.to_dict()
+RECORD_FIELDS = [
+    'reference_number', 'donor_name', 'donor_email', 'donor_mobile', 'donor_dob',
+    'donor_blood_group', 'donor_gender', 'donor_marital_status', 'donor_occupation',
+    'address_line1', 'address_line2', 'city', 'district', 'state', 'pincode', 'country',
+    'place_of_pledge', 'date_of_pledge', 'time_of_pledge', 'organs_consented',
+    'language_preference', 'preferred_eye_bank', 'witness1_name', 'witness1_relationship',
+    'witness1_mobile', 'witness1_email', 'witness2_name', 'witness2_mobile',
+    'is_verified', 'verified_at', 'created_at',
+]
+
+
+# ========================
+# Streaming CSV download
+# ========================
+def export_rows(query):
+    """
+    Iterate the exported column values of a pledge query in streamed chunks.
+
+    Args:
+        query: Filtered (and ordered) EyeDonationPledge query
+
+    Yields:
+        tuple: One row of EXPORT_COLUMNS values
+    """
+    columns = [column for _, column in EXPORT_COLUMNS]
+    rows = (query.with_entities(*columns)
+            .execution_options(stream_results=True)
+            .yield_per(EXPORT_FETCH_SIZE))
+    for row in rows:
+        yield tuple(row)
+
+
+def format_row(row):
+    """Format one export row for CSV output (dates as YYYY-MM-DD)."""
+    *values, created_at = row
+    return values + [created_at.strftime('%Y-%m-%d') if created_at else '']
+
+
+def iter_csv(rows, counter=None, chunk_rows=500):
+    """
+    Encode rows as CSV text, yielding one chunk per `chunk_rows` rows.
+
+    Args:
+        rows: Iterable of export rows (see export_rows)
+        counter: Optional dict whose 'rows' key is kept up to date
+        chunk_rows: Rows per yielded chunk
+
+    Yields:
+        str: CSV text, header first
+    """
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([header for header, _ in EXPORT_COLUMNS])
+
+    count = 0
+    for row in rows:
+        writer.writerow(format_row(row))
+        count += 1
+        if count % chunk_rows == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if counter is not None:
+        counter['rows'] = count
+    yield buffer.getvalue()
+
+
+# ========================
+# Export job batches
+# ========================
+def field_columns(fields):
+    """Columns for a list of RECORD_FIELDS names (raises ValueError on unknown names)."""
+    unknown = [f for f in fields if f not in RECORD_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown export fields: {', '.join(unknown)}")
+    return [EyeDonationPledge.__table__.c[f] for f in fields]
+
+
+def keyset_batches(query, columns, batch_size):
+    """
+    Read a pledge query newest first in batches, one short indexed query per batch.
+
+    Args:
+        query: Filtered EyeDonationPledge query
+        columns: Columns to select
+        batch_size: Rows per batch
+
+    Yields:
+        list: Up to batch_size tuples of column values
+    """
+    key, pk = EyeDonationPledge.created_at, EyeDonationPledge.id
+    base = query.order_by(None).with_entities(*columns, key, pk)
+    last = None
+    while True:
+        batch_query = base
+        if last is not None:
+            batch_query = batch_query.filter(tuple_(key, pk) < tuple_(*last))
+        rows = batch_query.order_by(key.desc(), pk.desc()).limit(batch_size).all()
+        if not rows:
+            return
+        last = tuple(rows[-1][-2:])
+        yield [tuple(row[:-2]) for row in rows]
+        if len(rows) < batch_size:
+            return
+
+
+def _plain(value):
+    """JSON/CSV-friendly value (ISO strings for dates and times)."""
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    return value
+
+
+# ========================
+# Format writers
+# ========================
+class CsvExportWriter:
+    extension = 'csv'
+    mimetype = 'text/csv'
+
+    def __init__(self, path, fields, columns):
+        self._file = open(path, 'w', newline='', encoding='utf-8')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(fields)
+
+    def write(self, batch):
+        self._writer.writerows([_plain(v) for v in row] for row in batch)
+
+    def close(self):
+        self._file.close()
+
+
+class JsonlGzExportWriter:
+    extension = 'jsonl.gz'
+    mimetype = 'application/gzip'
+
+    def __init__(self, path, fields, columns):
+        self.fields = fields
+        self._file = gzip.open(path, 'wt', encoding='utf-8')
+
+    def write(self, batch):
+        for row in batch:
+            self._file.write(json.dumps({f: _plain(v) for f, v in zip(self.fields, row)}) + '\n')
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetExportWriter:
+    extension = 'parquet'
+    mimetype = 'application/vnd.apache.parquet'
+
+    def __init__(self, path, fields, columns):
+        self.schema = pa.schema([(f, self._arrow_type(c)) for f, c in zip(fields, columns)])
+        self._writer = pq.ParquetWriter(path, self.schema, compression='snappy')
+
+    @staticmethod
+    def _arrow_type(column):
+        if isinstance(column.type, DateTime):
+            return pa.timestamp('us')
+        if isinstance(column.type, Date):
+            return pa.date32()
+        if isinstance(column.type, Time):
+            return pa.time64('us')
+        if isinstance(column.type, Boolean):
+            return pa.bool_()
+        if isinstance(column.type, Integer):
+            return pa.int64()
+        return pa.string()
+
+    def write(self, batch):
+        # One row group per batch
+        arrays = [pa.array(values, type=field.type) for values, field in zip(zip(*batch), self.schema)]
+        self._writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self._writer.close()
+
+
+class XlsxExportWriter:
+    extension = 'xlsx'
+    mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    max_rows = 1048575  # per sheet, after the header row
+
+    def __init__(self, path, fields, columns):
+        self.path = path
+        self.fields = fields
+        # Write-only mode streams rows to disk instead of keeping the sheet in memory
+        self._workbook = Workbook(write_only=True)
+        self._sheet = None
+        self._sheet_rows = 0
+
+    def _new_sheet(self):
+        self._sheet = self._workbook.create_sheet(f"Pledges {len(self._workbook.worksheets) + 1}")
+        self._sheet.append(self.fields)
+        self._sheet_rows = 0
+
+    def write(self, batch):
+        for row in batch:
+            if self._sheet is None or self._sheet_rows >= self.max_rows:
+                self._new_sheet()
+            self._sheet.append(list(row))
+            self._sheet_rows += 1
+
+    def close(self):
+        if self._sheet is None:
+            self._new_sheet()
+        self._workbook.save(self.path)
+
+
+EXPORT_FORMATS = {
+    'csv': CsvExportWriter,
+    'jsonl.gz': JsonlGzExportWriter,
+    'parquet': ParquetExportWriter,
+    'xlsx': XlsxExportWriter,
+}
+
+
+def available_formats():
+    """Export formats whose optional dependency is installed."""
+    formats = ['csv', 'jsonl.gz']
+    if pq is not None:
+        formats.append('parquet')
+    if Workbook is not None:
+        formats.append('xlsx')
+    return formats
+
+
+# ========================
+# Job runner
+# ========================
+class ExportJobRunner:
+    """Runs ExportJob rows on a background thread pool"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.export_dir = None
+        self.max_workers = 2
+        self.batch_size = 2000
+        self.retention = timedelta(hours=24)
+        self.stale_after = timedelta(minutes=15)
+
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.export_dir = app.config.get('EXPORT_DIR') or os.path.join(app.instance_path, 'exports')
+        self.max_workers = app.config.get('EXPORT_WORKERS', 2)
+        self.batch_size = app.config.get('EXPORT_BATCH_SIZE', 2000)
+        self.retention = timedelta(hours=app.config.get('EXPORT_RETENTION_HOURS', 24))
+        app.extensions['export_jobs'] = self
+
+    def _get_executor(self):
+        # Pools do not survive fork(): create one per worker process on first use
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='export')
+                self._pid = os.getpid()
+            return self._executor
+
+    def create(self, fmt, fields, filters, user_id=None):
+        """
+        Queue a new export.
+
+        Args:
+            fmt: One of available_formats()
+            fields: RECORD_FIELDS names to include (all when empty)
+            filters: Admin list filters (see search_index.pledge_filters_from_args)
+            user_id: Requesting admin
+
+        Returns:
+            ExportJob: The queued job
+        """
+        if fmt not in available_formats():
+            raise ValueError(f"Unsupported export format: {fmt}")
+        fields = [f for f in RECORD_FIELDS if f in fields] if fields else list(RECORD_FIELDS)
+        field_columns(fields)
+
+        self.purge_expired()
+        job = ExportJob(
+            id=uuid.uuid4().hex,
+            format=fmt,
+            columns=json.dumps(fields),
+            filters=json.dumps(filters),
+            created_by=user_id,
+        )
+        db.session.add(job)
+        db.session.commit()
+
+        self._get_executor().submit(self._run, job.id)
+        return job
+
+    def path_for(self, job):
+        return os.path.join(self.export_dir, f"pledges_{job.id}.{EXPORT_FORMATS[job.format].extension}")
+
+    def _run(self, job_id):
+        from pagination import approximate_count
+        from search_index import filter_pledges
+
+        with self.app.app_context():
+            job = db.session.get(ExportJob, job_id)
+            if job is None:
+                return
+            path = self.path_for(job)
+            tmp_path = f"{path}.part"
+            try:
+                fields = json.loads(job.columns)
+                columns = field_columns(fields)
+                query = filter_pledges(json.loads(job.filters or '{}'))
+
+                job.status = 'running'
+                job.total_rows = approximate_count(query)
+                db.session.commit()
+
+                os.makedirs(self.export_dir, exist_ok=True)
+                writer = EXPORT_FORMATS[job.format](tmp_path, fields, columns)
+                try:
+                    for batch in keyset_batches(query, columns, self.batch_size):
+                        writer.write(batch)
+                        job.rows_written += len(batch)
+                        db.session.commit()
+                finally:
+                    writer.close()
+
+                os.replace(tmp_path, path)
+                job.file_path = path
+                job.file_size = os.path.getsize(path)
+                job.status = 'done'
+                job.finished_at = datetime.utcnow()
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                error_logger.error(f"Export job {job_id} failed: {e}")
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                job = db.session.get(ExportJob, job_id)
+                job.status = 'failed'
+                job.error = str(e)
+                job.finished_at = datetime.utcnow()
+                db.session.commit()
+
+    def mark_stale(self):
+        """Fail queued/running jobs that stopped making progress (e.g. the worker restarted)."""
+        cutoff = datetime.utcnow() - self.stale_after
+        stale = ExportJob.query.filter(
+            ExportJob.status.in_(('queued', 'running')),
+            ExportJob.updated_at < cutoff
+        ).all()
+        for job in stale:
+            job.status = 'failed'
+            job.error = 'Interrupted'
+        if stale:
+            db.session.commit()
+
+    def purge_expired(self):
+        """Delete finished jobs and their files once they are older than EXPORT_RETENTION_HOURS."""
+        cutoff = datetime.utcnow() - self.retention
+        expired = ExportJob.query.filter(
+            ExportJob.status.in_(('done', 'failed')),
+            ExportJob.created_at < cutoff
+        ).all()
+        for job in expired:
+            if job.file_path and os.path.exists(job.file_path):
+                os.remove(job.file_path)
+            db.session.delete(job)
+        if expired:
+            db.session.commit()
+
+
+export_jobs = ExportJobRunner()
@@ -0,0 +1,550 @@
+"""
+Pledge Import Module
+Bulk-loads pledges collected offline (paper forms, hospitals, camps, phone
+and mail) from CSV or XLSX files.
+
+- Reading: rows are streamed from the file (csv module, or openpyxl in
+  read-only mode) and handled IMPORT_BATCH_SIZE at a time, so memory stays
+  flat for any file size.
+- Validation: each batch goes through validation.validate_batch(), the same
+  rules as the web form, applied column by column over the batch. Dates,
+  times, ages, sources and column lengths are checked on the way in, and a
+  row matching an existing pledge (same mobile and name) is rejected as a
+  duplicate.
+- Writing: the valid rows of a batch get their reference numbers in one
+  allocation (reference_numbers.allocate) and are written with one bulk
+  statement: COPY on PostgreSQL, an executemany INSERT elsewhere. The
+  matching pledge_daily_rollup and pledge counter deltas are applied in the
+  same transaction, since bulk inserts bypass the ORM listeners in rollup.py
+  and counters.py. The SQLite search
+  triggers fire as usual. Each batch commits on its own.
+- Errors: rejected rows are written to a CSV error report with their row
+  number, the reasons and the original values. The report has the same
+  columns as the input, so it can be corrected and imported again.
+
+Headers may be the pledge form's field names (donor_name, gender, place ...)
+or the pledge column names used by exports (donor_gender, place_of_pledge ...),
+in any case and spacing. Unknown columns are ignored. A consent column
+(donor_consent or consent, e.g. "yes") is required, as on the web form.
+"""
+
+import csv
+import io
+import logging
+import os
+import re
+import time as _time
+import uuid
+from collections import Counter
+from functools import lru_cache
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import Date, Integer, Time, insert, select
+
+from api.cache import stats_cache
+from counters import pledge_counters, ACTIVE_PLEDGES
+from models import EyeDonationPledge, SourceEnum, db
+from reference import reference_numbers
+from rollup import PledgeRollup
+from validation import validate_batch
+
+try:
+    from openpyxl import load_workbook
+except ImportError:  # XLSX import is optional
+    load_workbook = None
+
+
+error_logger = logging.getLogger('error_logger')
+
+PLEDGE_TABLE = EyeDonationPledge.__table__
+
+# Pledge form field -> pledge column (the mapping used by the pledge form route)
+FIELD_COLUMNS = {
+    'donor_name': 'donor_name',
+    'gender': 'donor_gender',
+    'date_of_birth': 'donor_dob',
+    'age': 'donor_age',
+    'blood_group': 'donor_blood_group',
+    'donor_mobile': 'donor_mobile',
+    'donor_email': 'donor_email',
+    'marital_status': 'donor_marital_status',
+    'occupation': 'donor_occupation',
+    'id_proof_type': 'donor_id_proof_type',
+    'id_proof_number': 'donor_id_proof_number',
+    'address_line1': 'address_line1',
+    'address_line2': 'address_line2',
+    'city': 'city',
+    'district': 'district',
+    'state': 'state',
+    'pincode': 'pincode',
+    'country': 'country',
+    'date_of_pledge': 'date_of_pledge',
+    'time_of_pledge': 'time_of_pledge',
+    'organs_consented': 'organs_consented',
+    'language_preference': 'language_preference',
+    'place': 'place_of_pledge',
+    'additional_notes': 'pledge_additional_notes',
+    'preferred_eye_bank': 'preferred_eye_bank',
+    'source': 'source',
+    'witness1_name': 'witness1_name',
+    'witness1_relationship': 'witness1_relationship',
+    'witness1_mobile': 'witness1_mobile',
+    'witness1_email': 'witness1_email',
+    'witness1_telephone': 'witness1_telephone',
+    'witness1_address': 'witness1_address',
+    'witness2_name': 'witness2_name',
+    'witness2_relationship': 'witness2_relationship',
+    'witness2_mobile': 'witness2_mobile',
+    'witness2_email': 'witness2_email',
+    'witness2_telephone': 'witness2_telephone',
+    'witness2_address': 'witness2_address',
+}
+
+# Normalised header -> form field
+HEADER_ALIASES = {
+    **{field: field for field in FIELD_COLUMNS},
+    **{column: field for field, column in FIELD_COLUMNS.items()},
+    'donor_consent': 'donor_consent',
+    'consent': 'donor_consent',
+    'consent_given': 'donor_consent',
+    'name': 'donor_name',
+    'mobile': 'donor_mobile',
+    'email': 'donor_email',
+}
+
+SOURCES = {source.value.lower(): source.value for source in SourceEnum}
+CONSENT_VALUES = {'y', 'yes', 'true', '1', 'x', 'on', 'agreed'}
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%d.%m.%Y')
+TIME_FORMATS = ('%H:%M', '%H:%M:%S', '%I:%M %p')
+
+REPORT_COLUMNS = ('row', 'errors')  # added by the error report, ignored on re-import
+REPORT_RETENTION = timedelta(hours=24)
+DUPLICATE_LOOKUP_CHUNK = 500
+
+
+def normalise_header(header):
+    """'Address Line 1' -> 'address_line1', 'Date of Birth' -> 'date_of_birth'"""
+    name = re.sub(r'[^a-z0-9]+', '_', str(header or '').strip().lower()).strip('_')
+    return re.sub(r'_(?=\d)', '', name)
+
+
+# ========================
+# Readers
+# ========================
+def available_formats():
+    """Import file types whose optional dependency is installed."""
+    return ['csv', 'xlsx'] if load_workbook is not None else ['csv']
+
+
+def read_table(fileobj, filename):
+    """
+    Stream the rows of an uploaded sheet.
+
+    Args:
+        fileobj: Binary file object
+        filename: Original file name (its extension picks the reader)
+
+    Returns:
+        tuple: (header list, iterator of (row number, cell tuple))
+    """
+    extension = os.path.splitext(filename or '')[1].lower().lstrip('.')
+    if extension not in available_formats():
+        raise ValueError(f"Unsupported import file type: {extension or filename}")
+
+    if extension == 'csv':
+        reader = csv.reader(io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline=''))
+        rows = ((number, tuple(row)) for number, row in enumerate(reader, start=1))
+    else:
+        # Read-only mode streams the sheet instead of loading the whole workbook
+        workbook = load_workbook(fileobj, read_only=True, data_only=True)
+        rows = enumerate(workbook.worksheets[0].iter_rows(values_only=True), start=1)
+
+    _, header = next(rows, (None, ()))
+    return [str(cell) if cell is not None else '' for cell in header], rows
+
+
+# ========================
+# Cell parsers
+# ========================
+def _text(value):
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)  # mobile numbers and pincodes typed into Excel
+    value = str(value).strip()
+    return value or None
+
+
+def _cell(value):
+    """Stripped string cells (None when blank); dates and numbers from XLSX as they are."""
+    if isinstance(value, str):
+        return value.strip() or None
+    return value
+
+
+def _parse_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return _date_from_text(value)
+
+
+@lru_cache(maxsize=4096)
+def _date_from_text(value):
+    # A sheet from one camp repeats the same few dates, so parses are cached
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except (TypeError, ValueError):
+            pass
+    raise ValueError
+
+
+def _parse_time(value):
+    if isinstance(value, datetime):
+        return value.time()
+    if isinstance(value, time):
+        return value
+    return _time_from_text(value)
+
+
+@lru_cache(maxsize=4096)
+def _time_from_text(value):
+    for fmt in TIME_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).time()
+        except (TypeError, ValueError):
+            pass
+    raise ValueError
+
+
+def _parse_int(value):
+    if isinstance(value, float) and not value.is_integer():
+        raise ValueError
+    return int(value)
+
+
+def _parse_source(value):
+    try:
+        return SOURCES[value.lower()]
+    except KeyError:
+        raise ValueError
+
+
+def _parser(column):
+    """Cell parser for a pledge column (raises ValueError), or None for plain text."""
+    if isinstance(column.type, Date):
+        return _parse_date
+    if isinstance(column.type, Time):
+        return _parse_time
+    if isinstance(column.type, Integer):
+        return _parse_int
+    if column.name == 'source':
+        return _parse_source
+    return None
+
+
+# Form field -> (pledge column, parser, max length), worked out once
+FIELD_SPECS = {
+    field: (column, _parser(PLEDGE_TABLE.c[column]), getattr(PLEDGE_TABLE.c[column].type, 'length', None))
+    for field, column in FIELD_COLUMNS.items()
+}
+
+
+def _plain(value):
+    """Cell value as written back to the error report."""
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    return _text(value) or ''
+
+
+# ========================
+# Importer
+# ========================
+class PledgeImporter:
+    """Validates and bulk-inserts pledge rows from CSV/XLSX files"""
+
+    def __init__(self, app=None):
+        self.import_dir = None
+        self.batch_size = 2000
+        self.default_source = SourceEnum.OFFLINE.value
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.import_dir = app.config.get('IMPORT_DIR') or os.path.join(app.instance_path, 'imports')
+        self.batch_size = app.config.get('IMPORT_BATCH_SIZE', 2000)
+        self.default_source = app.config.get('IMPORT_DEFAULT_SOURCE', self.default_source)
+        app.extensions['pledge_importer'] = self
+
+    # ========================
+    # Error reports
+    # ========================
+    def new_report(self):
+        """
+        Allocate an error report file for an admin upload.
+
+        Returns:
+            tuple: (report id, path)
+        """
+        self.purge_reports()
+        report_id = uuid.uuid4().hex
+        return report_id, self.report_path(report_id)
+
+    def report_path(self, report_id):
+        """Path of an error report, or None for a malformed id."""
+        if not re.fullmatch(r'[0-9a-f]{32}', report_id or ''):
+            return None
+        return os.path.join(self.import_dir, f"import_errors_{report_id}.csv")
+
+    def purge_reports(self):
+        if not os.path.isdir(self.import_dir):
+            return
+        cutoff = _time.time() - REPORT_RETENTION.total_seconds()
+        for entry in os.scandir(self.import_dir):
+            if entry.name.startswith('import_errors_') and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+
+    # ========================
+    # Run
+    # ========================
+    def run(self, fileobj, filename, source=None, error_path=None, dry_run=False,
+            allow_duplicates=False, progress=None):
+        """
+        Import a CSV/XLSX file of pledges.
+
+        Args:
+            fileobj: Binary file object
+            filename: Original file name (.csv or .xlsx)
+            source: Source for rows without a source column (defaults to IMPORT_DEFAULT_SOURCE)
+            error_path: Where to write the error report (only created when rows are rejected)
+            dry_run: Validate only, write nothing
+            allow_duplicates: Import rows matching an existing pledge's mobile and name
+            progress: Optional callable, given the summary after every batch
+
+        Returns:
+            dict: rows, imported, failed, ignored_columns, error_report, elapsed, error
+        """
+        source = source or self.default_source
+        if source.lower() not in SOURCES:
+            raise ValueError(f"Unknown source: {source}")
+        source = SOURCES[source.lower()]
+
+        started = _time.monotonic()
+        header, rows = read_table(fileobj, filename)
+        fields = [HEADER_ALIASES.get(normalise_header(h)) for h in header]
+        summary = {
+            'rows': 0, 'imported': 0, 'failed': 0,
+            'ignored_columns': [h for h, f in zip(header, fields)
+                                if h and f is None and normalise_header(h) not in REPORT_COLUMNS],
+            'error_report': None, 'elapsed': 0.0, 'error': None,
+        }
+
+        report = _ErrorReport(error_path, header)
+        seen = {}
+        try:
+            batch = []
+            for number, cells in rows:
+                if not any(cell not in (None, '') for cell in cells):
+                    continue
+                batch.append((number, cells))
+                if len(batch) >= self.batch_size:
+                    self._run_batch(batch, fields, source, dry_run, allow_duplicates, seen, report, summary)
+                    batch = []
+                    if progress:
+                        progress(summary)
+            if batch:
+                self._run_batch(batch, fields, source, dry_run, allow_duplicates, seen, report, summary)
+                if progress:
+                    progress(summary)
+        except Exception as e:
+            error_logger.error(f"Pledge import of {filename} stopped after {summary['rows']} rows: {e}")
+            summary['error'] = str(e)
+        finally:
+            summary['error_report'] = report.close()
+            summary['elapsed'] = _time.monotonic() - started
+
+        if summary['imported']:
+            # Public stats now include the imported pledges
+            stats_cache.invalidate()
+            pledge_counters.invalidate()
+        return summary
+
+    def _run_batch(self, batch, fields, source, dry_run, allow_duplicates, seen, report, summary):
+        records, errors = self._prepare(batch, fields, source)
+
+        if not allow_duplicates:
+            self._check_duplicates(batch, records, errors, seen)
+
+        valid = [record for record, row_errors in zip(records, errors) if not row_errors]
+        for (number, cells), row_errors in zip(batch, errors):
+            if row_errors:
+                report.write(number, row_errors, cells)
+
+        if valid and not dry_run:
+            self._insert(valid)
+
+        summary['rows'] += len(batch)
+        summary['imported'] += len(valid)
+        summary['failed'] += len(batch) - len(valid)
+
+    def _prepare(self, batch, fields, source):
+        """
+        Turn a batch of raw rows into pledge column values, column by column.
+
+        Returns:
+            tuple: (list of column-value dicts, list of per-row error lists)
+        """
+        form_rows = []
+        for _, cells in batch:
+            row = {}
+            for field, cell in zip(fields, cells):
+                if field is not None and cell is not None:
+                    row[field] = cell
+            form_rows.append(row)
+
+        present = [field for field in FIELD_SPECS if field in fields]
+
+        # Clean up cells first: the validation rules work on form strings
+        for field in present + ['donor_consent']:
+            clean = _text if field not in FIELD_SPECS or FIELD_SPECS[field][1] is None else _cell
+            for row in form_rows:
+                value = row.get(field)
+                if value is not None:
+                    row[field] = clean(value)
+        for row in form_rows:
+            consent = row.get('donor_consent')
+            row['donor_consent'] = 'y' if consent and consent.lower() in CONSENT_VALUES else None
+
+        errors = validate_batch(form_rows)
+
+        records = [{'source': source} for _ in form_rows]
+        for field in present:
+            column, parse, length = FIELD_SPECS[field]
+            label = field.replace('_', ' ')
+            for record, row_errors, row in zip(records, errors, form_rows):
+                value = row.get(field)
+                if value is None:
+                    continue
+                if parse is not None:
+                    try:
+                        value = parse(value)
+                    except ValueError:
+                        row_errors.append(f"Invalid {label}: {_plain(value)}")
+                        continue
+                elif length and len(value) > length:
+                    row_errors.append(f"{label.capitalize()} is longer than {length} characters")
+                    continue
+                record[column] = value
+
+        return records, errors
+
+    @staticmethod
+    def _check_duplicates(batch, records, errors, seen):
+        """Reject rows whose mobile and name match an earlier row or an existing pledge."""
+        keys = [
+            (record.get('donor_mobile'), (record.get('donor_name') or '').casefold())
+            if not row_errors else None
+            for record, row_errors in zip(records, errors)
+        ]
+        mobiles = sorted({key[0] for key in keys if key})
+
+        existing = {}
+        P = EyeDonationPledge
+        with db.engine.connect() as conn:
+            for i in range(0, len(mobiles), DUPLICATE_LOOKUP_CHUNK):
+                chunk = mobiles[i:i + DUPLICATE_LOOKUP_CHUNK]
+                for ref, mobile, name in conn.execute(
+                    select(P.reference_number, P.donor_mobile, P.donor_name).where(P.donor_mobile.in_(chunk))
+                ):
+                    existing[(mobile, (name or '').casefold())] = ref
+
+        for (number, _), key, row_errors in zip(batch, keys, errors):
+            if key is None:
+                continue
+            if key in existing:
+                row_errors.append(f"Duplicate of pledge {existing[key]}")
+            elif key in seen:
+                row_errors.append(f"Duplicate of row {seen[key]}")
+            else:
+                seen[key] = number
+
+    def _insert(self, records):
+        """Give records reference numbers and write them, plus their rollup and counter deltas, in one transaction."""
+        now = datetime.utcnow()
+        defaults = {
+            column.name: column.default.arg if column.default is not None and column.default.is_scalar else None
+            for column in PLEDGE_TABLE.columns if column.name != 'id'
+        }
+        defaults.update(created_at=now, updated_at=now, consent_given=True)
+
+        references = reference_numbers.allocate(len(records))
+        rows = []
+        for record, reference in zip(records, references):
+            row = dict(defaults)
+            row.update(record)
+            row['reference_number'] = reference
+            rows.append(row)
+
+        with db.engine.begin() as conn:
+            if conn.dialect.name == 'postgresql':
+                _copy_rows(conn, rows)
+            else:
+                # executemany: one prepared statement for the whole batch
+                conn.execute(insert(PLEDGE_TABLE), rows)
+            PledgeRollup.apply(conn, Counter(PledgeRollup.key_for(row) for row in rows))
+            pledge_counters.apply(conn, {ACTIVE_PLEDGES: sum(1 for row in rows if row['is_active'])})
+
+
+def _copy_rows(conn, rows):
+    """COPY rows into the pledge table over the connection's own transaction."""
+    columns = list(rows[0])
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        # Unquoted empty fields load as NULL
+        writer.writerow(['' if row[c] is None else row[c] for c in columns])
+    sql = f"COPY {PLEDGE_TABLE.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+
+    cursor = conn.connection.cursor()
+    try:
+        if hasattr(cursor, 'copy_expert'):  # psycopg2
+            buffer.seek(0)
+            cursor.copy_expert(sql, buffer)
+        else:  # psycopg 3
+            with cursor.copy(sql) as copy:
+                copy.write(buffer.getvalue())
+    finally:
+        cursor.close()
+
+
+class _ErrorReport:
+    """CSV of rejected rows: row number, reasons, then the original cells"""
+
+    def __init__(self, path, header):
+        self.path = path
+        self.header = header
+        self._file = None
+        self._writer = None
+
+    def write(self, number, errors, cells):
+        if self.path is None:
+            return
+        if self._writer is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._file = open(self.path, 'w', newline='', encoding='utf-8')
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(['row', 'errors'] + list(self.header))
+        self._writer.writerow([number, '; '.join(errors)] + [_plain(cell) for cell in cells])
+
+    def close(self):
+        """Returns the report path, or None when no row was rejected."""
+        if self._file is None:
+            return None
+        self._file.close()
+        return self.path
+
+
+pledge_importer = PledgeImporter()
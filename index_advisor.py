@@ -0,0 +1,183 @@
+"""
+Index Advisor
+Runs the hot analytics and admin queries under EXPLAIN and flags sequential scans.
+
+Each hot path is the real code (DashboardAnalytics methods, admin views), run
+once against the configured database while its SELECT statements are
+captured; every captured statement is then explained with the same
+parameters. So the report always checks the SQL the app actually sends, on
+the data it is pointed at (`flask index-report` on a production replica).
+
+- SQLite: EXPLAIN QUERY PLAN; "SCAN <table>" without an index is a sequential scan
+- PostgreSQL: EXPLAIN (or EXPLAIN ANALYZE); "Seq Scan on <table>"
+- Other backends: plans are printed, scans are not detected
+
+Some paths aggregate a whole (small, pre-aggregated) table on purpose; their
+scans of those tables are reported as expected rather than flagged.
+"""
+
+import re
+from datetime import date, timedelta
+
+from flask import current_app, session
+from sqlalchemy import event, func
+
+from api.cache import stats_cache
+from counters import pledge_counters
+from dashboard_analytics import DashboardAnalytics
+from models import EyeDonationPledge, PledgeDailyRollup, db
+
+
+SQLITE_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$')
+POSTGRESQL_SCAN = re.compile(r'Seq Scan on (\w+)')
+
+# Catalog lookups (e.g. whether the FTS table exists) are not data scans
+CATALOG_PREFIXES = ('sqlite_', 'pg_')
+
+# Whole-rollup aggregates (all states, all time, every day of week ...)
+FULL_ROLLUP = ('pledge_daily_rollup',)
+
+
+def _view(endpoint, path):
+    """Run a view function as a logged-in admin, without request hooks (nothing is logged)."""
+    def run():
+        app = current_app._get_current_object()
+        with app.test_request_context(path):
+            session['admin_user_id'] = 0
+            app.view_functions[endpoint]()
+    return run
+
+
+def _samples():
+    """Filter values taken from the data, so filtered paths select real rows."""
+    state = db.session.query(PledgeDailyRollup.state).filter(PledgeDailyRollup.state != '').group_by(
+        PledgeDailyRollup.state
+    ).order_by(func.sum(PledgeDailyRollup.pledge_count).desc()).limit(1).scalar()
+    name = db.session.query(EyeDonationPledge.donor_name).filter(EyeDonationPledge.is_active == True).order_by(
+        EyeDonationPledge.created_at.desc()
+    ).limit(1).scalar()
+    return {
+        'state': state or 'Delhi',
+        'term': (name or 'a').split()[0],
+        'month_ago': (date.today() - timedelta(days=30)).isoformat(),
+    }
+
+
+def hot_paths(samples):
+    """
+    The queries worth indexing for.
+
+    Returns:
+        list: (label, callable, tables whose full scan is expected)
+    """
+    state, term, month_ago = samples['state'], samples['term'], samples['month_ago']
+    analytics = DashboardAnalytics
+    return [
+        ('Home page pledge total', pledge_counters.active_pledges, ()),
+        ('Public stats page', _view('stats', '/neb/stats'), FULL_ROLLUP),
+        ('Stats summary', analytics.get_summary_stats, ()),
+        ('Stats summary, one state', lambda: analytics.get_summary_stats(state_filter=state), ()),
+        ('Daily trend', lambda: analytics.get_temporal_trends('daily', 30), ()),
+        ('Monthly trend', lambda: analytics.get_temporal_trends('monthly', 12), ()),
+        ('Monthly trend, one state', lambda: analytics.get_temporal_trends('monthly', 12, state), ()),
+        ('Yearly trend', lambda: analytics.get_temporal_trends('yearly'), FULL_ROLLUP),
+        ('Growth', analytics.get_growth_metrics, ()),
+        ('Historical comparison', analytics.get_historical_comparison, ()),
+        ('Comparative metrics', analytics.get_comparative_metrics, ()),
+        ('Peak activity', analytics.get_peak_activity_analysis, FULL_ROLLUP),
+        ('Geography', analytics.get_geographic_distribution, FULL_ROLLUP),
+        ('Demographics', analytics.get_demographic_insights, FULL_ROLLUP),
+        ('Languages', analytics.get_language_preference_distribution, FULL_ROLLUP),
+        ('Sources', analytics.get_source_distribution, FULL_ROLLUP),
+        ('Consent types', analytics.get_medical_consent_stats, FULL_ROLLUP),
+        ('Districts of a state', lambda: analytics.get_district_wise_stats(state), ()),
+        ('Admin dashboard', _view('admin_dashboard', '/neb/admin/dashboard'), ()),
+        ('Analytics dashboard', _view('admin_dashboard_modern', '/neb/dashboard'), FULL_ROLLUP),
+        ('Admin pledge list', _view('admin_pledges', '/neb/admin/pledges'), ()),
+        ('Admin pledge list, one state', _view('admin_pledges', f'/neb/admin/pledges?state={state}'), ()),
+        ('Admin pledge list, last 30 days', _view('admin_pledges', f'/neb/admin/pledges?date_from={month_ago}'), ()),
+        ('Admin pledge search', _view('admin_pledges', f'/neb/admin/pledges?q={term}'), ()),
+    ]
+
+
+def capture_selects(fn):
+    """
+    Run fn and collect the SELECT statements it sends.
+
+    Returns:
+        list: (statement, parameters) in execution order, without duplicates
+    """
+    captured = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+            if (statement, parameters) not in captured:
+                captured.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        fn()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+        db.session.rollback()
+    return captured
+
+
+def explain(statement, parameters, analyze=False):
+    """
+    Plan of one statement.
+
+    Returns:
+        tuple: (plan lines, tables read by sequential scan)
+    """
+    connection = db.session.connection()
+    dialect = connection.dialect.name
+
+    if dialect == 'sqlite':
+        rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+        lines = [row[-1] for row in rows]
+        scans = [match.group(1) for match in map(SQLITE_SCAN.match, lines) if match]
+    elif dialect == 'postgresql':
+        prefix = 'EXPLAIN ANALYZE' if analyze else 'EXPLAIN'
+        lines = [row[0] for row in connection.exec_driver_sql(f"{prefix} {statement}", parameters)]
+        scans = [match.group(1) for match in map(POSTGRESQL_SCAN.search, lines) if match]
+    else:
+        rows = connection.exec_driver_sql(f"EXPLAIN {statement}", parameters).all()
+        lines = [' | '.join(str(value) for value in row) for row in rows]
+        scans = []
+    return lines, [table for table in scans if not table.startswith(CATALOG_PREFIXES)]
+
+
+def run_report(analyze=False):
+    """
+    Explain every hot path.
+
+    Args:
+        analyze: Use EXPLAIN ANALYZE on PostgreSQL (runs the queries)
+
+    Returns:
+        list: One dict per path: label, queries [(statement, plan lines, scans)],
+              flagged (unexpected seq scan tables), expected, error
+    """
+    results = []
+    cache_enabled = stats_cache.enabled
+    stats_cache.enabled = False  # the stats page must actually run its queries
+    try:
+        for label, fn, expected_tables in hot_paths(_samples()):
+            result = {'label': label, 'queries': [], 'flagged': [], 'expected': [], 'error': None}
+            try:
+                for statement, parameters in capture_selects(fn):
+                    lines, scans = explain(statement, parameters, analyze)
+                    result['queries'].append((statement, lines, scans))
+                    for table in scans:
+                        found = result['expected'] if table in expected_tables else result['flagged']
+                        if table not in found:
+                            found.append(table)
+            except Exception as e:
+                result['error'] = str(e).splitlines()[0]
+            finally:
+                db.session.rollback()
+            results.append(result)
+    finally:
+        stats_cache.enabled = cache_enabled
+    return results
@@ -0,0 +1,447 @@
+"""
+SystemLog Partitioning
+Monthly partitions for system_logs, with archive-then-drop retention.
+
+PostgreSQL: after `flask logs-partition-init`, system_logs is a native
+RANGE-partitioned table with one partition per month (system_logs_YYYY_MM).
+Inserts into the parent are routed by the database and date-filtered
+queries are pruned by the planner.
+
+SQLite: each month lives in its own table system_logs_YYYY_MM with the
+SystemLog columns. New rows are routed to the month table. The log viewer
+reads a UNION ALL of only the months overlapping its date filter, plus the
+legacy system_logs table. Month tables seed their AUTOINCREMENT counter at
+YYYYMM * 10**9, so ids stay unique and time-ordered across partitions.
+
+Retention: every partition older than SYSTEM_LOG_RETENTION_MONTHS is streamed
+to a gzipped JSONL file in SYSTEM_LOG_ARCHIVE_DIR and then dropped. Dropping is
+O(1) however many rows the month holds. Rows in an unpartitioned table are
+archived month by month and range-deleted instead.
+"""
+
+import gzip
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import (
+    Column, DateTime, Integer, MetaData, String, Table, Text,
+    delete, func, insert, select, text, union_all, inspect as sa_inspect
+)
+from sqlalchemy.orm import aliased
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from models import SystemLog, db
+
+
+error_logger = logging.getLogger('error_logger')
+
+PARENT_TABLE = SystemLog.__tablename__
+PARTITION_RE = re.compile(r'^system_logs_(\d{4})_(\d{2})$')
+SEQUENCE_SEED = 10 ** 9
+
+_partition_metadata = MetaData()
+
+
+def month_start(dt):
+    """First instant of the month containing dt."""
+    return datetime(dt.year, dt.month, 1)
+
+
+def add_months(dt, n):
+    """First instant of the month n months after the month containing dt."""
+    years, month_index = divmod(dt.month - 1 + n, 12)
+    return datetime(dt.year + years, month_index + 1, 1)
+
+
+def partition_name(month):
+    return f"{PARENT_TABLE}_{month:%Y_%m}"
+
+
+def _partition_table(name):
+    """SQLite month table with the SystemLog column layout."""
+    table = _partition_metadata.tables.get(name)
+    if table is None:
+        table = Table(
+            name, _partition_metadata,
+            Column('id', Integer, primary_key=True),
+            Column('timestamp', DateTime, nullable=False, index=True),
+            Column('log_type', String(50), nullable=False, index=True),
+            Column('level', String(20), nullable=False),
+            Column('message', Text, nullable=False),
+            Column('module', String(100), nullable=True),
+            Column('user_id', Integer, nullable=True),
+            Column('ip_address', String(50), nullable=True),
+            Column('details', Text, nullable=True),
+            sqlite_autoincrement=True,
+        )
+    return table
+
+
+class LogPartitions:
+    """Creates, reads across, archives and drops monthly SystemLog partitions"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = True
+        self.retention_months = 0
+        self.retention_interval = 24 * 3600
+        self.archive_dir = os.path.join('logs', 'archive')
+
+        self._known = set()
+        self._pg_partitioned = None
+        self._lock = threading.Lock()
+        self._next_retention_run = 0
+        self._retention_thread = None
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('SYSTEM_LOG_PARTITIONING', True)
+        self.retention_months = app.config.get('SYSTEM_LOG_RETENTION_MONTHS', 0)
+        self.retention_interval = app.config.get('SYSTEM_LOG_RETENTION_INTERVAL', 24) * 3600
+        self.archive_dir = app.config.get('SYSTEM_LOG_ARCHIVE_DIR') or self.archive_dir
+        app.extensions['log_partitions'] = self
+
+    # ========================
+    # Strategy detection
+    # ========================
+    def strategy(self, conn):
+        """'sqlite', 'postgresql' or None (single unpartitioned table)."""
+        if not self.enabled:
+            return None
+        dialect = conn.dialect.name
+        if dialect == 'sqlite':
+            return 'sqlite'
+        if dialect == 'postgresql' and self._is_pg_partitioned(conn):
+            return 'postgresql'
+        return None
+
+    def _is_pg_partitioned(self, conn):
+        if self._pg_partitioned is None:
+            self._pg_partitioned = bool(conn.scalar(text(
+                "SELECT 1 FROM pg_partitioned_table pt"
+                " JOIN pg_class c ON c.oid = pt.partrelid"
+                " WHERE c.relname = :name"
+            ), {'name': PARENT_TABLE}))
+        return self._pg_partitioned
+
+    def list_partitions(self, conn):
+        """
+        Existing month partitions, oldest first.
+
+        Returns:
+            list: (month_start datetime, table name) tuples
+        """
+        strategy = self.strategy(conn)
+        if strategy == 'sqlite':
+            names = sa_inspect(conn).get_table_names()
+        elif strategy == 'postgresql':
+            names = conn.scalars(text(
+                "SELECT c.relname FROM pg_inherits i"
+                " JOIN pg_class c ON c.oid = i.inhrelid"
+                " JOIN pg_class p ON p.oid = i.inhparent"
+                " WHERE p.relname = :name"
+            ), {'name': PARENT_TABLE}).all()
+        else:
+            return []
+
+        partitions = []
+        for name in names:
+            match = PARTITION_RE.match(name)
+            if match:
+                partitions.append((datetime(int(match.group(1)), int(match.group(2)), 1), name))
+        return sorted(partitions)
+
+    # ========================
+    # Write path
+    # ========================
+    def ensure_partition(self, conn, month, strategy=None):
+        """Create the partition for `month` if needed and return the table to insert into."""
+        strategy = strategy or self.strategy(conn)
+        name = partition_name(month)
+
+        if strategy == 'postgresql':
+            if name not in self._known:
+                conn.execute(text(
+                    f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF {PARENT_TABLE}'
+                    f" FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{add_months(month, 1):%Y-%m-%d}')"
+                ))
+                self._known.add(name)
+            return SystemLog.__table__
+
+        table = _partition_table(name)
+        if name not in self._known:
+            conn.execute(CreateTable(table, if_not_exists=True))
+            for index in table.indexes:
+                conn.execute(CreateIndex(index, if_not_exists=True))
+            conn.execute(text(
+                "INSERT INTO sqlite_sequence (name, seq)"
+                " SELECT :name, :seq WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = :name)"
+            ), {'name': name, 'seq': (month.year * 100 + month.month) * SEQUENCE_SEED})
+            self._known.add(name)
+        return table
+
+    def write(self, rows):
+        """
+        Bulk-insert SystemLog row dicts, routing each to its month partition.
+        Must be called inside an application context.
+        """
+        for attempt in range(2):
+            try:
+                with db.engine.begin() as conn:
+                    self._insert(conn, rows)
+                break
+            except Exception:
+                # A partition may have been dropped by another process: forget
+                # what we think exists and try once more
+                if attempt:
+                    raise
+                self._known.clear()
+                self._pg_partitioned = None
+
+        self._maybe_schedule_retention()
+
+    def _insert(self, conn, rows):
+        strategy = self.strategy(conn)
+        if strategy is None:
+            conn.execute(insert(SystemLog), rows)
+            return
+
+        by_month = defaultdict(list)
+        for row in rows:
+            by_month[month_start(row['timestamp'])].append(row)
+        for month, month_rows in by_month.items():
+            target = self.ensure_partition(conn, month, strategy)
+            conn.execute(insert(target), month_rows)
+
+    # ========================
+    # Read path
+    # ========================
+    def log_entity(self, start=None, end=None):
+        """
+        ORM entity for querying SystemLog rows in [start, end).
+
+        On SQLite this is SystemLog aliased over a UNION ALL of the legacy table
+        and only the month tables that overlap the range; elsewhere it is
+        SystemLog itself (PostgreSQL prunes partitions on its own).
+        """
+        conn = db.session.connection()
+        if self.strategy(conn) != 'sqlite':
+            return SystemLog
+
+        names = [
+            name for month, name in self.list_partitions(conn)
+            if (start is None or add_months(month, 1) > start) and (end is None or month < end)
+        ]
+        if not names:
+            return SystemLog
+
+        selects = [select(SystemLog.__table__)]
+        selects += [select(*_partition_table(name).c) for name in names]
+        return aliased(SystemLog, union_all(*selects).subquery(PARENT_TABLE))
+
+    # ========================
+    # Maintenance
+    # ========================
+    def clear_all(self):
+        """Delete every log row in every partition. Returns the number of rows removed."""
+        conn = db.session.connection()
+        strategy = self.strategy(conn)
+
+        if strategy == 'postgresql':
+            total = conn.scalar(select(func.count()).select_from(SystemLog.__table__))
+            conn.execute(text(f"TRUNCATE TABLE {PARENT_TABLE}"))
+            return total
+
+        total = db.session.query(SystemLog).delete()
+        if strategy == 'sqlite':
+            for month, name in self.list_partitions(conn):
+                total += conn.scalar(select(func.count()).select_from(_partition_table(name)))
+                conn.execute(text(f'DROP TABLE "{name}"'))
+            self._known.clear()
+        return total
+
+    def init_partitioning(self):
+        """
+        Move existing rows into monthly partitions (run once, idempotent).
+
+        Returns:
+            int: Number of rows moved
+        """
+        with db.engine.begin() as conn:
+            if conn.dialect.name == 'postgresql':
+                return self._init_postgresql(conn)
+            if self.strategy(conn) == 'sqlite':
+                return self._init_sqlite(conn)
+        return 0
+
+    def _legacy_months(self, conn, table):
+        oldest, newest = conn.execute(
+            select(func.min(table.c.timestamp), func.max(table.c.timestamp))
+        ).one()
+        if oldest is None:
+            return []
+        if isinstance(oldest, str):
+            oldest, newest = datetime.fromisoformat(oldest), datetime.fromisoformat(newest)
+        months, month = [], month_start(oldest)
+        while month <= newest:
+            months.append(month)
+            month = add_months(month, 1)
+        return months
+
+    def _init_sqlite(self, conn):
+        legacy = SystemLog.__table__
+        columns = [c.name for c in legacy.columns]
+        moved = 0
+        for month in self._legacy_months(conn, legacy):
+            target = self.ensure_partition(conn, month, 'sqlite')
+            in_month = (legacy.c.timestamp >= month) & (legacy.c.timestamp < add_months(month, 1))
+            conn.execute(insert(target).from_select(columns, select(legacy).where(in_month)))
+            moved += conn.execute(delete(legacy).where(in_month)).rowcount
+        return moved
+
+    def _init_postgresql(self, conn):
+        if self._is_pg_partitioned(conn):
+            return 0
+
+        legacy = f"{PARENT_TABLE}_legacy"
+        conn.execute(text(f"ALTER TABLE {PARENT_TABLE} RENAME TO {legacy}"))
+        conn.execute(text(f"ALTER TABLE {legacy} RENAME CONSTRAINT {PARENT_TABLE}_pkey TO {legacy}_pkey"))
+        conn.execute(text(f"DROP INDEX IF EXISTS ix_{PARENT_TABLE}_timestamp"))
+        conn.execute(text(f"DROP INDEX IF EXISTS ix_{PARENT_TABLE}_log_type"))
+
+        conn.execute(text(
+            f'CREATE TABLE {PARENT_TABLE} (LIKE {legacy} INCLUDING DEFAULTS)'
+            f' PARTITION BY RANGE ("timestamp")'
+        ))
+        conn.execute(text(f'ALTER TABLE {PARENT_TABLE} ADD CONSTRAINT {PARENT_TABLE}_pkey PRIMARY KEY (id, "timestamp")'))
+        conn.execute(text(
+            f"ALTER TABLE {PARENT_TABLE} ADD CONSTRAINT {PARENT_TABLE}_user_id_fkey"
+            f" FOREIGN KEY (user_id) REFERENCES admin_users (id)"
+        ))
+        conn.execute(text(f'CREATE INDEX ix_{PARENT_TABLE}_timestamp ON {PARENT_TABLE} ("timestamp")'))
+        conn.execute(text(f"CREATE INDEX ix_{PARENT_TABLE}_log_type ON {PARENT_TABLE} (log_type)"))
+
+        self._pg_partitioned = True
+        self._known.clear()
+        months = self._legacy_months(conn, Table(legacy, MetaData(), Column('timestamp', DateTime)))
+        current = month_start(datetime.utcnow())
+        for month in sorted(set(months) | {current, add_months(current, 1)}):
+            self.ensure_partition(conn, month, 'postgresql')
+
+        moved = conn.execute(text(f"INSERT INTO {PARENT_TABLE} SELECT * FROM {legacy}")).rowcount
+        conn.execute(text(f"ALTER SEQUENCE {PARENT_TABLE}_id_seq OWNED BY {PARENT_TABLE}.id"))
+        conn.execute(text(f"DROP TABLE {legacy}"))
+        return moved
+
+    def _archive_path(self, month):
+        os.makedirs(self.archive_dir, exist_ok=True)
+        base = os.path.join(self.archive_dir, f"{partition_name(month)}")
+        path, n = f"{base}.jsonl.gz", 1
+        while os.path.exists(path):
+            path, n = f"{base}-{n}.jsonl.gz", n + 1
+        return path
+
+    def _archive(self, conn, stmt, month):
+        """Stream the rows of `stmt` to a gzipped JSONL file; returns (path, rows)."""
+        path = self._archive_path(month)
+        tmp_path = f"{path}.tmp"
+        count = 0
+        result = conn.execution_options(yield_per=1000).execute(stmt)
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as fh:
+            for row in result:
+                record = {
+                    key: value.isoformat() if isinstance(value, datetime) else value
+                    for key, value in row._mapping.items()
+                }
+                fh.write(json.dumps(record) + '\n')
+                count += 1
+        os.replace(tmp_path, path)
+        return path, count
+
+    def apply_retention(self, months=None, now=None):
+        """
+        Archive and drop everything older than `months` whole months.
+
+        Args:
+            months: Months to keep (defaults to SYSTEM_LOG_RETENTION_MONTHS)
+            now: Reference time (defaults to utcnow)
+
+        Returns:
+            list: (archive path, row count) for each archived month
+        """
+        months = months or self.retention_months
+        if not months:
+            return []
+        cutoff = add_months(month_start(now or datetime.utcnow()), -months)
+        archived = []
+
+        with db.engine.connect() as conn:
+            strategy = self.strategy(conn)
+            if strategy == 'postgresql':
+                # Only one worker process runs retention at a time
+                if not conn.scalar(text("SELECT pg_try_advisory_lock(hashtext('system_logs_retention'))")):
+                    return []
+
+            try:
+                for month, name in self.list_partitions(conn):
+                    if month >= cutoff:
+                        continue
+                    table = _partition_table(name) if strategy == 'sqlite' else Table(name, MetaData(), autoload_with=conn)
+                    archived.append(self._archive(conn, select(table).order_by(table.c.id), month))
+                    if strategy == 'postgresql':
+                        conn.execute(text(f'ALTER TABLE {PARENT_TABLE} DETACH PARTITION "{name}"'))
+                    conn.execute(text(f'DROP TABLE "{name}"'))
+                    conn.commit()
+                    self._known.discard(name)
+
+                if strategy != 'postgresql':
+                    # Rows in the unpartitioned table: archive and delete month by month
+                    legacy = SystemLog.__table__
+                    for month in self._legacy_months(conn, legacy):
+                        if month >= cutoff:
+                            break
+                        in_month = (legacy.c.timestamp >= month) & (legacy.c.timestamp < add_months(month, 1))
+                        archived.append(self._archive(conn, select(legacy).where(in_month).order_by(legacy.c.id), month))
+                        conn.execute(delete(legacy).where(in_month))
+                        conn.commit()
+            finally:
+                if strategy == 'postgresql':
+                    conn.execute(text("SELECT pg_advisory_unlock(hashtext('system_logs_retention'))"))
+                    conn.commit()
+
+        return archived
+
+    def _maybe_schedule_retention(self):
+        """Kick off the retention job in the background at most once per interval."""
+        if not self.retention_months or time.time() < self._next_retention_run:
+            return
+        with self._lock:
+            if time.time() < self._next_retention_run:
+                return
+            if self._retention_thread is not None and self._retention_thread.is_alive():
+                return
+            self._next_retention_run = time.time() + self.retention_interval
+            self._retention_thread = threading.Thread(
+                target=self._run_retention, name='system-log-retention', daemon=True
+            )
+            self._retention_thread.start()
+
+    def _run_retention(self):
+        try:
+            with self.app.app_context():
+                for path, count in self.apply_retention():
+                    logging.getLogger('app_logger').info(f"Archived {count} system logs to {path}")
+        except Exception as e:
+            error_logger.error(f"SystemLog retention job failed: {e}")
+
+
+log_partitions = LogPartitions()
@@ -0,0 +1,183 @@
+"""
+System Log Sink
+Moves SystemLog database writes off the request path.
+
+log_system_event() hands rows to the sink, which buffers them in a bounded
+in-memory queue. A daemon worker thread writes them in bulk INSERTs on its own
+connection when a batch fills up or the flush interval passes, routing each
+row to its monthly partition (see log_partitions.py). Because it uses its own
+connection, logging never commits whatever is pending in the request session.
+The queue is drained when the process exits.
+"""
+
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from log_partitions import log_partitions
+
+
+error_logger = logging.getLogger('error_logger')
+
+OVERFLOW_POLICIES = ('drop_oldest', 'block')
+
+
+class SystemLogSink:
+    """Bounded, batching, background writer for SystemLog rows"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = True
+        self.max_size = 10000
+        self.batch_size = 200
+        self.flush_interval = 2.0
+        self.overflow = 'drop_oldest'
+        self.block_timeout = 1.0
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._pid = None
+        self._stopping = False
+        self._in_flight = 0
+        self._dropped = 0
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('SYSTEM_LOG_ASYNC', True)
+        self.max_size = app.config.get('SYSTEM_LOG_QUEUE_SIZE', 10000)
+        self.batch_size = app.config.get('SYSTEM_LOG_BATCH_SIZE', 200)
+        self.flush_interval = app.config.get('SYSTEM_LOG_FLUSH_INTERVAL', 2.0)
+        self.block_timeout = app.config.get('SYSTEM_LOG_BLOCK_TIMEOUT', 1.0)
+        self.overflow = app.config.get('SYSTEM_LOG_OVERFLOW', 'drop_oldest')
+        if self.overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"SYSTEM_LOG_OVERFLOW must be one of {OVERFLOW_POLICIES}")
+
+        app.extensions['system_log_sink'] = self
+        atexit.register(self.shutdown)
+
+    # ========================
+    # Producer side
+    # ========================
+    def emit(self, log_type, level, message, module=None, user_id=None, ip_address=None, details=None):
+        """Queue one SystemLog row (written synchronously when the sink is disabled)."""
+        row = {
+            'timestamp': datetime.utcnow(),
+            'log_type': log_type,
+            'level': level,
+            'message': message,
+            'module': module,
+            'user_id': user_id,
+            'ip_address': ip_address,
+            'details': details,
+        }
+
+        if not self.enabled:
+            self._write([row])
+            return
+
+        self._ensure_worker()
+        with self._cond:
+            if len(self._queue) >= self.max_size:
+                if self.overflow == 'block':
+                    deadline = time.monotonic() + self.block_timeout
+                    while len(self._queue) >= self.max_size:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._dropped += 1
+                            return
+                        self._cond.wait(remaining)
+                else:
+                    self._queue.popleft()
+                    self._dropped += 1
+
+            self._queue.append(row)
+            if len(self._queue) >= self.batch_size:
+                self._cond.notify_all()
+
+    def flush(self, timeout=5.0):
+        """Block until everything queued so far has been written (or timeout)."""
+        if not self.enabled or self._thread is None:
+            return
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._cond.notify_all()
+            while self._queue or self._in_flight:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+    def shutdown(self, timeout=5.0):
+        """Stop the worker after writing out the remaining queue."""
+        thread = self._thread
+        if thread is None or self._pid != os.getpid():
+            return
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        thread.join(timeout)
+        self._thread = None
+
+    # ========================
+    # Worker side
+    # ========================
+    def _ensure_worker(self):
+        # Threads do not survive fork(): start one per worker process on first use
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            if self._pid != os.getpid():
+                self._queue.clear()
+                self._in_flight = 0
+            self._pid = os.getpid()
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name='system-log-sink', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._queue and not self._stopping:
+                    self._cond.wait(self.flush_interval)
+                elif len(self._queue) < self.batch_size and not self._stopping:
+                    # Give a partial batch until the interval to fill up
+                    self._cond.wait(self.flush_interval)
+
+                batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+                self._in_flight = len(batch)
+                dropped, self._dropped = self._dropped, 0
+                stop = self._stopping and not self._queue
+                # Wake producers blocked on a full queue
+                self._cond.notify_all()
+
+            if dropped:
+                error_logger.warning(f"SystemLog queue full: dropped {dropped} log rows")
+            if batch:
+                self._write(batch)
+
+            with self._cond:
+                self._in_flight = 0
+                self._cond.notify_all()
+
+            if stop:
+                return
+
+    def _write(self, rows):
+        try:
+            with self.app.app_context():
+                log_partitions.write(rows)
+        except Exception as e:
+            error_logger.error(f"Failed to write {len(rows)} rows to SystemLog DB: {e}")
+
+
+log_sink = SystemLogSink()
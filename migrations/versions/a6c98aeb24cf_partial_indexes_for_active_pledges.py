@@ -0,0 +1,53 @@
+"""partial indexes for active pledges
+
+Revision ID: a6c98aeb24cf
+Revises:
+Create Date: 2026-10-17 02:50:47.527942
+
+Composite indexes over active pledges (and the rollup's state filter), matching
+__table_args__ in models.py. On PostgreSQL they are built with CREATE INDEX
+CONCURRENTLY outside the migration transaction, so the tables stay writable.
+IF NOT EXISTS makes this a no-op on databases created by `flask init-db`,
+which already has them. If a concurrent build fails it leaves an INVALID
+index: drop it and run the upgrade again.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6c98aeb24cf'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+# (name, table, columns, active rows only)
+INDEXES = [
+    ('ix_eye_donation_pledges_active_created', 'eye_donation_pledges', ['created_at', 'id'], True),
+    ('ix_eye_donation_pledges_active_state', 'eye_donation_pledges', ['state', 'created_at'], True),
+    ('ix_eye_donation_pledges_active_source', 'eye_donation_pledges', ['source', 'created_at'], True),
+    ('ix_pledge_daily_rollup_state_day', 'pledge_daily_rollup', ['state', 'day'], False),
+]
+
+# Rendered exactly like the queries' `EyeDonationPledge.is_active == True`, so planners match it
+ACTIVE = sa.column('is_active', sa.Boolean) == sa.true()
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns, active_only in INDEXES:
+            where = ACTIVE if active_only else None
+            op.create_index(
+                name, table, columns,
+                if_not_exists=True,
+                postgresql_concurrently=True,
+                postgresql_where=where,
+                sqlite_where=where,
+            )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns, active_only in reversed(INDEXES):
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=True)
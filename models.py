@@ -7,6 +7,8 @@ from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 from enum import Enum
 
+from time_buckets import bucket, bucket_index
+
 db = SQLAlchemy()
 
 
@@ -151,6 +153,21 @@ class EyeDonationPledge(db.Model):
     # Relationships
     audit_logs = db.relationship('AuditLog', backref='pledge', lazy=True, cascade='all, delete-orphan')
 
+    # Nearly every read is "active pledges, newest first / in a date range,
+    # optionally for one state or source": partial indexes on active rows only.
+    # Queries must filter with `EyeDonationPledge.is_active == True` (rendered as
+    # a literal) rather than filter_by(is_active=True) (a bound parameter, which
+    # SQLite cannot match to the index predicate).
+    # Existing databases get them from the migration in migrations/versions/.
+    __table_args__ = (
+        db.Index('ix_eye_donation_pledges_active_created', 'created_at', 'id',
+                 postgresql_where=is_active == True, sqlite_where=is_active == True),
+        db.Index('ix_eye_donation_pledges_active_state', 'state', 'created_at',
+                 postgresql_where=is_active == True, sqlite_where=is_active == True),
+        db.Index('ix_eye_donation_pledges_active_source', 'source', 'created_at',
+                 postgresql_where=is_active == True, sqlite_where=is_active == True),
+    )
+
     def __repr__(self):
         return f"<EyeDonationPledge {self.reference_number} - {self.donor_name}>"
 
@@ -191,7 +208,78 @@ class EyeDonationPledge(db.Model):
         }
 
 
+# Hour-of-day histogram of active pledges, answered from this index alone
+bucket_index('ix_eye_donation_pledges_active_hour',
+             EyeDonationPledge.is_active, bucket('hour_of_day', EyeDonationPledge.created_at))
+
+
+class PledgeDailyRollup(db.Model):
+    """
+    Pre-aggregated pledge counts per day and reporting dimension.
+    Maintained incrementally from pledge inserts/updates (see rollup.py)
+    so dashboard queries never have to scan the full pledge table.
+    Unknown dimension values are stored as '' to keep the unique key usable.
+    """
+    __tablename__ = 'pledge_daily_rollup'
+
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False, index=True)
+    state = db.Column(db.String(100), default='', nullable=False)
+    district = db.Column(db.String(100), default='', nullable=False)
+    city = db.Column(db.String(100), default='', nullable=False)
+    source = db.Column(db.String(50), default='', nullable=False)
+    gender = db.Column(db.String(20), default='', nullable=False)
+    age_bucket = db.Column(db.String(10), default='', nullable=False)
+    organs_consented = db.Column(db.String(255), default='', nullable=False)
+    language = db.Column(db.String(50), default='', nullable=False)
+    pledge_count = db.Column(db.Integer, default=0, nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint(
+            'day', 'state', 'district', 'city', 'source', 'gender',
+            'age_bucket', 'organs_consented', 'language',
+            name='uq_pledge_daily_rollup_key'
+        ),
+        # State-filtered series and district breakdowns
+        db.Index('ix_pledge_daily_rollup_state_day', 'state', 'day'),
+    )
+
+    def __repr__(self):
+        return f"<PledgeDailyRollup {self.day} x{self.pledge_count}>"
+
+
+# Monthly dashboard series group and filter on this bucket
+bucket_index('ix_pledge_daily_rollup_month', bucket('month', PledgeDailyRollup.day))
+
+
+class ReferenceSequence(db.Model):
+    """
+    Per-year counter behind pledge reference numbers (NEB-YYYY-XXXXXX).
+    Incremented atomically by reference.py; never read-then-written.
+    """
+    __tablename__ = 'reference_sequences'
+
+    prefix = db.Column(db.String(20), primary_key=True)
+    year = db.Column(db.Integer, primary_key=True)
+    last_value = db.Column(db.Integer, default=0, nullable=False)
+
+    def __repr__(self):
+        return f"<ReferenceSequence {self.prefix}-{self.year} at {self.last_value}>"
+
+
+class PledgeCounter(db.Model):
+    """
+    Named running totals (e.g. active pledges) maintained in the same
+    transaction as pledge writes by counters.py, so pages that only print
+    a total never count the pledge table.
+    """
+    __tablename__ = 'pledge_counters'
+
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.BigInteger, default=0, nullable=False)
 
+    def __repr__(self):
+        return f"<PledgeCounter {self.name}={self.value}>"
 
 
 class AdminUser(db.Model):
@@ -264,3 +352,53 @@ class SystemLog(db.Model):
         return f"<SystemLog {self.log_type} - {self.level}>"
 
 
+class ExportJob(db.Model):
+    """
+    Background pledge export (see exports.py).
+    Tracks format, columns, filters and progress; the finished file lives in EXPORT_DIR.
+    """
+    __tablename__ = 'export_jobs'
+
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex, also used in the file name
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    created_by = db.Column(db.Integer, db.ForeignKey('admin_users.id'), nullable=True)
+    status = db.Column(db.String(20), default='queued', nullable=False)  # queued, running, done, failed
+    format = db.Column(db.String(20), nullable=False)  # csv, jsonl.gz, parquet, xlsx
+    columns = db.Column(db.Text, nullable=False)  # JSON list of field names
+    filters = db.Column(db.Text, nullable=True)  # JSON dict of admin list filters
+    total_rows = db.Column(db.Integer, nullable=True)
+    rows_written = db.Column(db.Integer, default=0, nullable=False)
+    file_path = db.Column(db.String(500), nullable=True)
+    file_size = db.Column(db.Integer, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    # Relationship to user
+    user = db.relationship('AdminUser', backref='export_jobs')
+
+    @property
+    def progress(self):
+        """Percent complete (0-100)."""
+        if self.status == 'done':
+            return 100
+        if not self.total_rows:
+            return 0
+        return min(99, int(self.rows_written * 100 / self.total_rows))
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'format': self.format,
+            'rows_written': self.rows_written,
+            'total_rows': self.total_rows,
+            'progress': self.progress,
+            'file_size': self.file_size,
+            'error': self.error,
+            'created_at': self.created_at.isoformat(),
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+    def __repr__(self):
+        return f"<ExportJob {self.id} {self.format} {self.status}>"
@@ -0,0 +1,202 @@
+"""
+Keyset Pagination
+Seek-based paging for the admin pledge list and log viewer.
+
+Pages are addressed by an opaque cursor holding the (sort key, id) of the row
+at the page boundary, so every page costs one indexed range scan of
+per_page + 1 rows, however deep it is. There is no OFFSET and no COUNT(*)
+per page. The total shown next to the list comes from approximate_count().
+
+Search results ordered by relevance have no stable sort key to seek on;
+paginate_ranked() pages them by OFFSET instead, with the offset as cursor.
+The database ranks every match to order them anyway, so this costs little
+more than the first page.
+"""
+
+import base64
+import json
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+from models import db
+
+
+COUNT_CACHE_TTL = 60          # seconds an approximate total is reused
+EXACT_COUNT_THRESHOLD = 10000  # below this planner estimate, count exactly
+
+_count_cache = {}
+_count_lock = threading.Lock()
+
+
+# ========================
+# Cursors
+# ========================
+def encode_cursor(values):
+    """Encode a (sort key, id) tuple as a URL-safe opaque string."""
+    payload = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor produced by encode_cursor().
+
+    Returns:
+        tuple: (sort key datetime, id), or None for a missing/invalid cursor
+    """
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        key, row_id = json.loads(raw)
+        return datetime.fromisoformat(key), int(row_id)
+    except (ValueError, TypeError):
+        return None
+
+
+class KeysetPage:
+    """One page of keyset-paginated results"""
+
+    def __init__(self, items, per_page, next_cursor=None, prev_cursor=None, total=None):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def paginate_keyset(query, key_column, id_column, per_page=20, after=None, before=None):
+    """
+    Fetch one page of `query` ordered newest first by (key_column, id_column).
+
+    Args:
+        query: Filtered ORM query (without ORDER BY)
+        key_column: Sort column, e.g. EyeDonationPledge.created_at
+        id_column: Unique tie-breaker, e.g. EyeDonationPledge.id
+        per_page: Rows per page
+        after: Cursor of the last row of the previous page (go forward)
+        before: Cursor of the first row of the next page (go back)
+
+    Returns:
+        KeysetPage
+    """
+    after, before = decode_cursor(after), decode_cursor(before)
+    boundary = tuple_(key_column, id_column)
+
+    if before is not None:
+        rows = (query.filter(boundary > tuple_(*before))
+                .order_by(key_column.asc(), id_column.asc())
+                .limit(per_page + 1).all())
+        has_more = len(rows) > per_page
+        rows = list(reversed(rows[:per_page]))
+        has_prev, has_next = has_more, True
+    else:
+        if after is not None:
+            query = query.filter(boundary < tuple_(*after))
+        rows = (query.order_by(key_column.desc(), id_column.desc())
+                .limit(per_page + 1).all())
+        has_next = len(rows) > per_page
+        rows = rows[:per_page]
+        has_prev = after is not None
+
+    def cursor_for(row):
+        return encode_cursor((getattr(row, key_column.key), getattr(row, id_column.key)))
+
+    return KeysetPage(
+        rows,
+        per_page,
+        next_cursor=cursor_for(rows[-1]) if rows and has_next else None,
+        prev_cursor=cursor_for(rows[0]) if rows and has_prev else None,
+    )
+
+
+def paginate_ranked(query, per_page=20, after=None, before=None):
+    """
+    Fetch one page of an already ordered `query` (e.g. search results by rank).
+
+    Args:
+        query: Ordered ORM query
+        per_page: Rows per page
+        after: Cursor (offset) of the first row of this page
+        before: Cursor (offset) just past the last row of this page (go back)
+
+    Returns:
+        KeysetPage
+    """
+    def offset(cursor):
+        return int(cursor) if cursor and cursor.isdigit() else None
+
+    start = offset(after) or 0
+    if offset(before) is not None:
+        start = max(0, offset(before) - per_page)
+
+    rows = query.offset(start).limit(per_page + 1).all()
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+
+    return KeysetPage(
+        rows,
+        per_page,
+        next_cursor=str(start + len(rows)) if has_next else None,
+        prev_cursor=str(start) if start > 0 else None,
+    )
+
+
+# ========================
+# Approximate totals
+# ========================
+def approximate_count(query):
+    """
+    Total row count for `query`, allowed to be slightly stale or estimated.
+
+    On PostgreSQL the planner's row estimate is used for large results (exact
+    COUNT(*) below EXACT_COUNT_THRESHOLD). Either way the value is cached per
+    distinct query for COUNT_CACHE_TTL seconds.
+    """
+    statement = query.order_by(None).statement
+    compiled = statement.compile(dialect=db.engine.dialect)
+    cache_key = (str(compiled), repr(sorted(compiled.params.items())))
+
+    now = time.monotonic()
+    with _count_lock:
+        cached = _count_cache.get(cache_key)
+        if cached and cached[1] > now:
+            return cached[0]
+
+    total = None
+    if db.engine.dialect.name == 'postgresql':
+        plan = db.session.connection().exec_driver_sql(
+            f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params
+        ).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        estimate = int(plan[0]['Plan']['Plan Rows'])
+        if estimate >= EXACT_COUNT_THRESHOLD:
+            total = estimate
+    if total is None:
+        total = query.order_by(None).count()
+
+    with _count_lock:
+        # Keep the cache small: one entry per filter combination in use
+        if len(_count_cache) > 256:
+            _count_cache.clear()
+        _count_cache[cache_key] = (total, now + COUNT_CACHE_TTL)
+    return total
@@ -0,0 +1,61 @@
+"""
+Pledge Side Effects
+Post-commit tasks queued by a pledge submission (see task_queue.py).
+"""
+
+import smtplib
+from email.message import EmailMessage
+
+from flask import current_app
+
+from card_service import card_service
+from models import EyeDonationPledge
+from task_queue import task_queue
+
+
+@task_queue.task('prerender_card')
+def prerender_card(reference_number, qr_data):
+    """Render the print card into the artifact store so the first download is instant."""
+    pledge = EyeDonationPledge.query.filter_by(reference_number=reference_number).first()
+    if pledge is None:
+        return
+    card_service.get_pdf(pledge, qr_data)
+
+
+@task_queue.task('send_pledge_confirmation')
+def send_pledge_confirmation(reference_number, verify_url, card_url):
+    """
+    Email the donor their reference number and card link through MAIL_SERVER.
+
+    For local development any SMTP stand-in works, e.g.
+    `python -m aiosmtpd -n -l localhost:1025` with MAIL_PORT=1025 and MAIL_USE_TLS=False.
+    """
+    config = current_app.config
+    if not config.get('MAIL_SERVER'):
+        return
+
+    pledge = EyeDonationPledge.query.filter_by(reference_number=reference_number).first()
+    if pledge is None or not pledge.donor_email:
+        return
+
+    institution = config.get('INSTITUTION_NAME', 'Eye Bank')
+    message = EmailMessage()
+    message['Subject'] = f"Your eye donation pledge {reference_number}"
+    message['From'] = config.get('MAIL_DEFAULT_SENDER')
+    message['To'] = pledge.donor_email
+    message.set_content(
+        f"Dear {pledge.donor_name},\n\n"
+        f"Thank you for pledging to donate your eyes with {institution}.\n\n"
+        f"Reference number: {reference_number}\n"
+        f"Download your donor card: {card_url}\n"
+        f"Verify your pledge: {verify_url}\n\n"
+        f"Please share your decision with your family.\n\n"
+        f"{institution}\n"
+    )
+
+    with smtplib.SMTP(config['MAIL_SERVER'], config.get('MAIL_PORT', 587), timeout=30) as smtp:
+        if config.get('MAIL_USE_TLS'):
+            smtp.starttls()
+        if config.get('MAIL_USERNAME'):
+            smtp.login(config['MAIL_USERNAME'], config.get('MAIL_PASSWORD') or '')
+        smtp.send_message(message)
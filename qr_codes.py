@@ -0,0 +1,146 @@
+"""
+QR Code Rendering
+Draws donor card QR codes straight from the module matrix with NumPy.
+
+- Each payload is encoded once; module matrices are cached.
+- A matrix is scaled to the placeholder size by repeating each module row and
+  column to its pixel width, with no intermediate box_size=10 image and no
+  resize.
+- Bulk card runs scale all payloads with the same module count together, in
+  one array operation.
+"""
+
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Iterable, List
+
+import numpy as np
+import qrcode
+from PIL import Image
+
+
+QR_BORDER = 2               # quiet zone, in modules
+MATRIX_CACHE_SIZE = 4096    # encoded payloads kept (a few KB each)
+CANVAS_CACHE_SIZE = 32      # rendered placeholders kept (~1.5 MB each at print size)
+
+
+# ========================
+# Encoding
+# ========================
+@lru_cache(maxsize=MATRIX_CACHE_SIZE)
+def qr_matrix(qr_data: str) -> np.ndarray:
+    """
+    Module matrix for a payload, quiet zone included.
+
+    Args:
+        qr_data: Text / URL to encode
+
+    Returns:
+        ndarray: Read-only (n, n) bool array, True = dark module
+    """
+    qr = qrcode.QRCode(
+        version=None,
+        error_correction=qrcode.constants.ERROR_CORRECT_M,
+        border=QR_BORDER,
+    )
+    qr.add_data(qr_data)
+    qr.make(fit=True)
+    matrix = np.array(qr.get_matrix(), dtype=bool)
+    matrix.flags.writeable = False
+    return matrix
+
+
+def _module_widths(modules: int, size: int) -> np.ndarray:
+    """
+    Output pixels covered by each module when scaling to `size` pixels.
+
+    Each pixel takes the module under its center (as Image.NEAREST does), so
+    the widths differ by at most one pixel and sum to `size`.
+    """
+    source = ((2 * np.arange(size) + 1) * modules) // (2 * size)
+    return np.bincount(source, minlength=modules)
+
+
+def _scale(matrices: np.ndarray, size: int) -> np.ndarray:
+    """Scale (..., n, n) module matrices to (..., size, size) black/white pixels."""
+    widths = _module_widths(matrices.shape[-1], size)
+    pixels = np.where(matrices, 0, 255).astype(np.uint8)
+    return np.repeat(np.repeat(pixels, widths, axis=-2), widths, axis=-1)
+
+
+def _place(qr_pixels: np.ndarray, box_w: int, box_h: int) -> Image.Image:
+    """Center square QR pixels on a white placeholder of the exact box size."""
+    size = qr_pixels.shape[0]
+    canvas = np.full((box_h, box_w), 255, dtype=np.uint8)
+    top, left = (box_h - size) // 2, (box_w - size) // 2
+    canvas[top:top + size, left:left + size] = qr_pixels
+    return Image.fromarray(canvas).convert("RGB")
+
+
+# ========================
+# Rendering
+# ========================
+_canvas_cache = OrderedDict()
+_canvas_lock = threading.Lock()
+
+
+def render_qr_canvas(qr_data: str, box_w: int, box_h: int) -> Image.Image:
+    """
+    QR code for a payload, centered on a white box_w x box_h placeholder.
+
+    Recently rendered placeholders are cached; callers must not draw on the
+    returned image (pasting it is fine).
+
+    Returns:
+        Image: RGB image of exactly (box_w, box_h)
+    """
+    key = (qr_data, box_w, box_h)
+    with _canvas_lock:
+        canvas = _canvas_cache.get(key)
+        if canvas is not None:
+            _canvas_cache.move_to_end(key)
+            return canvas
+
+    canvas = _place(_scale(qr_matrix(qr_data), min(box_w, box_h)), box_w, box_h)
+
+    with _canvas_lock:
+        _canvas_cache[key] = canvas
+        while len(_canvas_cache) > CANVAS_CACHE_SIZE:
+            _canvas_cache.popitem(last=False)
+    return canvas
+
+
+def render_qr_batch(payloads: Iterable[str], box_w: int, box_h: int) -> List[Image.Image]:
+    """
+    Render many QR placeholders at once, in the order given.
+
+    Payloads are grouped by module count and each group is scaled in a single
+    pass over the stacked matrices. Results are not cached,
+    since bulk payloads are rarely repeated.
+
+    Returns:
+        list: RGB images of exactly (box_w, box_h)
+    """
+    payloads = list(payloads)
+    size = min(box_w, box_h)
+    results = [None] * len(payloads)
+
+    groups = {}
+    for position, qr_data in enumerate(payloads):
+        matrix = qr_matrix(qr_data)
+        groups.setdefault(matrix.shape[0], []).append((position, matrix))
+
+    for members in groups.values():
+        pixels = _scale(np.stack([matrix for _, matrix in members]), size)
+        for (position, _), qr_pixels in zip(members, pixels):
+            results[position] = _place(qr_pixels, box_w, box_h)
+
+    return results
+
+
+def clear_cache():
+    """Forget cached matrices and placeholders."""
+    qr_matrix.cache_clear()
+    with _canvas_lock:
+        _canvas_cache.clear()
@@ -0,0 +1,210 @@
+"""
+Reference Number Allocator
+Hands out pledge reference numbers (NEB-YYYY-XXXXXX) without collisions.
+
+Each year has its own counter. The next value comes from one atomic
+statement, so concurrent submissions never see the same number and never
+need to retry on the unique constraint:
+
+- PostgreSQL: a native sequence per year (pledge_ref_<prefix>_<year>).
+  nextval() never blocks and is not rolled back.
+- Elsewhere: an UPDATE ... RETURNING on the reference_sequences row,
+  committed in its own short transaction.
+
+A counter starts from the highest suffix already used that year, so existing
+numbers are never reissued. With REFERENCE_BLOCK_SIZE > 1 each worker process
+reserves a block of numbers at a time and hands them out from memory. This
+cuts database round trips, but numbers from different workers interleave.
+Numbers taken by a failed submission are skipped, not reused.
+
+A PostgreSQL sequence is created (and seeded) once, with the block size as its
+INCREMENT BY; after that its own increment is the block size, whatever
+REFERENCE_BLOCK_SIZE says. To change it, ALTER SEQUENCE ... INCREMENT BY and
+restart the workers. Each process looks a sequence up once and remembers it.
+
+Bulk imports call allocate() to reserve all the numbers for a batch in one
+round trip, bypassing the per-process block.
+"""
+
+import os
+import threading
+from datetime import datetime
+
+from sqlalchemy import Integer, cast, func, insert, select, text, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import EyeDonationPledge, ReferenceSequence, db
+
+
+class ReferenceAllocator:
+    """Per-year, concurrency-safe reference number sequence"""
+
+    def __init__(self, app=None):
+        self.prefix = 'NEB'
+        self.block_size = 1
+        self.use_db_sequence = True
+
+        self._blocks = {}
+        self._sequences = {}
+        self._lock = threading.Lock()
+        self._pid = None
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.prefix = app.config.get('REFERENCE_PREFIX', 'NEB')
+        self.block_size = max(1, app.config.get('REFERENCE_BLOCK_SIZE', 1))
+        self.use_db_sequence = app.config.get('REFERENCE_USE_DB_SEQUENCE', True)
+        app.extensions['reference_numbers'] = self
+
+    def format(self, year, value):
+        return f"{self.prefix}-{year}-{value:06d}"
+
+    def next(self, year=None):
+        """
+        Allocate the next reference number.
+
+        Args:
+            year: Year part of the number (defaults to the current year)
+
+        Returns:
+            str: e.g. NEB-2026-000123
+        """
+        year = year or datetime.now().year
+        return self.format(year, self._next_value(year))
+
+    def allocate(self, count, year=None):
+        """
+        Allocate `count` reference numbers at once (bulk import).
+
+        Args:
+            count: How many numbers to reserve
+            year: Year part of the numbers (defaults to the current year)
+
+        Returns:
+            list: Reference numbers in ascending order
+        """
+        year = year or datetime.now().year
+        if count <= 0:
+            return []
+        with db.engine.begin() as conn:
+            if conn.dialect.name == 'postgresql' and self.use_db_sequence:
+                values = self._reserve_many_from_sequence(conn, year, count)
+            else:
+                first = self._reserve_from_row(conn, year, count)
+                values = range(first, first + count)
+        return [self.format(year, value) for value in values]
+
+    def _next_value(self, year):
+        with self._lock:
+            # Blocks reserved before fork() belong to the parent process
+            if self._pid != os.getpid():
+                self._blocks.clear()
+                self._pid = os.getpid()
+
+            block = self._blocks.get(year)
+            if block is None or block[0] > block[1]:
+                block = self._blocks[year] = list(self._reserve(year, self.block_size))
+
+            value = block[0]
+            block[0] += 1
+            return value
+
+    # ========================
+    # Database side
+    # ========================
+    def _reserve(self, year, count):
+        """
+        Reserve a block of about `count` consecutive values.
+
+        Returns:
+            tuple: (first, last) value of the block
+        """
+        if db.engine.dialect.name == 'postgresql' and self.use_db_sequence:
+            name, increment = self._sequence(year)
+            with db.engine.begin() as conn:
+                # Each nextval() reserves a whole block of the sequence's increment
+                first = conn.scalar(text(f"SELECT nextval('{name}')"))
+            return first, first + increment - 1
+        with db.engine.begin() as conn:
+            first = self._reserve_from_row(conn, year, count)
+        return first, first + count - 1
+
+    def _max_used(self, conn, year):
+        """Highest numeric suffix already issued for `year`."""
+        stem = f"{self.prefix}-{year}-"
+        suffix = func.substr(EyeDonationPledge.reference_number, len(stem) + 1)
+        return conn.scalar(
+            select(func.max(cast(suffix, Integer)))
+            .where(EyeDonationPledge.reference_number.like(f"{stem}%"))
+        ) or 0
+
+    def _sequence(self, year):
+        """
+        Name and increment of the year's sequence, creating it on first use.
+
+        Returns:
+            tuple: (sequence name, INCREMENT BY)
+        """
+        name = f"pledge_ref_{self.prefix.lower()}_{year}"
+        increment = self._sequences.get(name)
+        if increment is not None:
+            return name, increment
+
+        lookup = text(
+            "SELECT increment_by FROM pg_sequences"
+            " WHERE schemaname = current_schema() AND sequencename = :name"
+        )
+        # Own transaction, so the sequence is committed before this process remembers it
+        with db.engine.begin() as conn:
+            increment = conn.scalar(lookup, {'name': name})
+            if increment is None:
+                # Only a missing sequence pays for the scan of the year's numbers
+                conn.execute(text(
+                    f"CREATE SEQUENCE IF NOT EXISTS {name}"
+                    f" INCREMENT BY {self.block_size} START WITH {self._max_used(conn, year) + 1}"
+                ))
+                # Another worker may have created it first, with its own block size
+                increment = conn.scalar(lookup, {'name': name})
+        self._sequences[name] = increment
+        return name, increment
+
+    def _reserve_many_from_sequence(self, conn, year, count):
+        """`count` values as whole sequence blocks; blocks from other callers may sit in between."""
+        name, increment = self._sequence(year)
+        starts = conn.scalars(
+            text(f"SELECT nextval('{name}') FROM generate_series(1, :calls)"),
+            {'calls': -(-count // increment)}
+        ).all()
+        values = [start + offset for start in sorted(starts) for offset in range(increment)]
+        return values[:count]
+
+    def _reserve_from_row(self, conn, year, count):
+        table = ReferenceSequence.__table__
+        key = (table.c.prefix == self.prefix) & (table.c.year == year)
+        bump = update(table).where(key).values(last_value=table.c.last_value + count)
+
+        def bump_counter():
+            if conn.dialect.update_returning:
+                return conn.scalar(bump.returning(table.c.last_value))
+            # The UPDATE holds the row (or database) lock until commit
+            if conn.execute(bump).rowcount == 0:
+                return None
+            return conn.scalar(select(table.c.last_value).where(key))
+
+        last = bump_counter()
+        if last is None:
+            # First number of the year: seed from what is already in use
+            values = {'prefix': self.prefix, 'year': year, 'last_value': self._max_used(conn, year)}
+            if conn.dialect.name == 'sqlite':
+                conn.execute(sqlite.insert(table).values(**values).on_conflict_do_nothing())
+            elif conn.dialect.name == 'postgresql':
+                conn.execute(postgresql.insert(table).values(**values).on_conflict_do_nothing())
+            else:
+                conn.execute(insert(table).values(**values))
+            last = bump_counter()
+        return last - count + 1
+
+
+reference_numbers = ReferenceAllocator()
@@ -0,0 +1,209 @@
+"""
+Pledge Rollup Module
+Keeps the pledge_daily_rollup table in step with eye_donation_pledges.
+
+Every insert, soft-delete (is_active flip), dimension edit or hard delete of a
+pledge is turned into +1/-1 deltas on the matching rollup rows, applied in the
+same transaction as the pledge change itself.
+"""
+
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import event, func, case, inspect, insert, update, delete, select, and_
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import EyeDonationPledge, PledgeDailyRollup, db
+from time_buckets import bucket
+
+
+# Rollup column -> pledge attribute it is derived from
+DIMENSION_ATTRS = {
+    'state': 'state',
+    'district': 'district',
+    'city': 'city',
+    'source': 'source',
+    'gender': 'donor_gender',
+    'age_bucket': 'donor_age',
+    'organs_consented': 'organs_consented',
+    'language': 'language_preference',
+}
+
+KEY_COLUMNS = ('day',) + tuple(DIMENSION_ATTRS)
+
+# Pledge attributes whose change moves a pledge to a different rollup row
+TRACKED_ATTRS = ('created_at', 'is_active') + tuple(DIMENSION_ATTRS.values())
+
+
+def age_bucket(age):
+    """
+    Map an age to the bucket label used by the demographic charts.
+
+    The age is donor_age as given on the pledge (age at pledge time), so a
+    pledge keeps its bucket as the donor grows older, as the charts always
+    did; editing donor_age moves it.
+    """
+    if age is None:
+        return ''
+    if age < 18:
+        return '< 18'
+    if age <= 25:
+        return '18-25'
+    if age <= 35:
+        return '26-35'
+    if age <= 45:
+        return '36-45'
+    if age <= 60:
+        return '46-60'
+    return '60+'
+
+
+def age_bucket_expr(column):
+    """SQL equivalent of age_bucket() for set-based backfills."""
+    return case(
+        (column.is_(None), ''),
+        (column < 18, '< 18'),
+        (column <= 25, '18-25'),
+        (column <= 35, '26-35'),
+        (column <= 45, '36-45'),
+        (column <= 60, '46-60'),
+        else_='60+'
+    )
+
+
+class PledgeRollup:
+    """Helpers for maintaining and reading the daily rollup table"""
+
+    @staticmethod
+    def dimension(column):
+        """Read a rollup dimension back, turning the '' sentinel into NULL."""
+        return func.nullif(column, '')
+
+    @staticmethod
+    def key_for(values):
+        """
+        Build the rollup key for a pledge.
+
+        Args:
+            values: Mapping of pledge attribute name -> value
+
+        Returns:
+            tuple: Values in KEY_COLUMNS order
+        """
+        created_at = values.get('created_at') or datetime.utcnow()
+        key = [created_at.date()]
+        for column, attr in DIMENSION_ATTRS.items():
+            value = values.get(attr)
+            if column == 'age_bucket':
+                key.append(age_bucket(value))
+            else:
+                key.append(value if value is not None else '')
+        return tuple(key)
+
+    @staticmethod
+    def apply(connection, deltas):
+        """
+        Add signed counts to rollup rows, creating rows as needed.
+
+        Args:
+            connection: Connection to execute on (same transaction as the pledge write)
+            deltas: Mapping of rollup key tuple -> signed count
+        """
+        table = PledgeDailyRollup.__table__
+        dialect = connection.dialect.name
+        rows = [dict(zip(KEY_COLUMNS, key), pledge_count=delta) for key, delta in deltas.items() if delta]
+        if not rows:
+            return
+
+        if dialect in ('sqlite', 'postgresql'):
+            # One upsert statement, executed for every key (a bulk import touches thousands)
+            dialect_insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+            stmt = dialect_insert(table)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=list(KEY_COLUMNS),
+                set_={'pledge_count': table.c.pledge_count + stmt.excluded.pledge_count}
+            )
+            connection.execute(stmt, rows)
+        else:
+            for row in rows:
+                match = and_(*[table.c[col] == row[col] for col in KEY_COLUMNS])
+                result = connection.execute(
+                    update(table).where(match).values(pledge_count=table.c.pledge_count + row['pledge_count'])
+                )
+                if result.rowcount == 0:
+                    connection.execute(insert(table).values(**row))
+
+        # Drop emptied rows so readers never see zero-count groups
+        for row in rows:
+            if row['pledge_count'] < 0:
+                match = and_(*[table.c[col] == row[col] for col in KEY_COLUMNS])
+                connection.execute(delete(table).where(match, table.c.pledge_count <= 0))
+
+    @staticmethod
+    def backfill():
+        """
+        Rebuild the whole rollup table from eye_donation_pledges.
+
+        Returns:
+            int: Number of rollup rows written
+        """
+        P = EyeDonationPledge
+        dims = [
+            func.coalesce(getattr(P, attr), '') if column != 'age_bucket' else age_bucket_expr(P.donor_age)
+            for column, attr in DIMENSION_ATTRS.items()
+        ]
+        day = bucket('day', P.created_at)
+
+        source_select = select(
+            day, *dims, func.count(P.id)
+        ).where(P.is_active == True).group_by(day, *dims)
+
+        db.session.execute(delete(PledgeDailyRollup))
+        db.session.execute(
+            insert(PledgeDailyRollup).from_select(list(KEY_COLUMNS) + ['pledge_count'], source_select)
+        )
+        db.session.commit()
+        return PledgeDailyRollup.query.count()
+
+
+# ========================
+# Incremental maintenance
+# ========================
+def _current_values(target):
+    return {attr: getattr(target, attr) for attr in TRACKED_ATTRS}
+
+
+@event.listens_for(EyeDonationPledge, 'after_insert')
+def _pledge_inserted(mapper, connection, target):
+    if target.is_active:
+        PledgeRollup.apply(connection, {PledgeRollup.key_for(_current_values(target)): 1})
+
+
+@event.listens_for(EyeDonationPledge, 'after_update')
+def _pledge_updated(mapper, connection, target):
+    state = inspect(target)
+    new_values = _current_values(target)
+    old_values = dict(new_values)
+    changed = False
+
+    for attr in TRACKED_ATTRS:
+        history = state.attrs[attr].history
+        if history.has_changes():
+            changed = True
+            old_values[attr] = history.deleted[0] if history.deleted else None
+
+    if not changed:
+        return
+
+    deltas = Counter()
+    if old_values['is_active']:
+        deltas[PledgeRollup.key_for(old_values)] -= 1
+    if new_values['is_active']:
+        deltas[PledgeRollup.key_for(new_values)] += 1
+    PledgeRollup.apply(connection, deltas)
+
+
+@event.listens_for(EyeDonationPledge, 'after_delete')
+def _pledge_deleted(mapper, connection, target):
+    if target.is_active:
+        PledgeRollup.apply(connection, {PledgeRollup.key_for(_current_values(target)): -1})
@@ -0,0 +1,276 @@
+"""
+Pledge Search Module
+Indexed donor search shared by the admin pledge list and CSV export.
+
+- PostgreSQL: pg_trgm GIN indexes on donor_name, donor_email and
+  reference_number serve the ILIKE '%term%' matches, and a text_pattern_ops
+  B-tree serves mobile-number prefixes. Results are ranked by exact or prefix
+  hits first, then by trigram similarity (exact/prefix only until pg_trgm is
+  installed).
+- SQLite: an FTS5 external-content table (pledge_search) is kept in sync by
+  triggers on eye_donation_pledges. Every search word is a prefix phrase
+  ("NEB-2026-00"* or "98110"*), and results are ranked with bm25().
+
+The indexes are created along with the pledge table. `flask search-reindex`
+creates them in existing databases and rebuilds the FTS content. Where no
+index is available the search falls back to plain ILIKE.
+"""
+
+import re
+from datetime import datetime, timedelta
+
+from sqlalchemy import DDL, case, event, func, literal_column, or_, select, text
+
+from models import EyeDonationPledge, db
+
+
+PLEDGE_TABLE = EyeDonationPledge.__tablename__
+FTS_TABLE = 'pledge_search'
+FTS_COLUMNS = ('reference_number', 'donor_name', 'donor_mobile', 'donor_email')
+# bm25 weights, in FTS_COLUMNS order: reference and mobile hits outrank names
+FTS_WEIGHTS = (10.0, 2.0, 8.0, 4.0)
+
+
+def _fts_values(prefix):
+    return ', '.join(f"{prefix}.{c}" for c in FTS_COLUMNS)
+
+
+SQLITE_DDL = [
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+    f"{', '.join(FTS_COLUMNS)}, content='{PLEDGE_TABLE}', content_rowid='id', prefix='2 3 4')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {PLEDGE_TABLE} BEGIN"
+    f" INSERT INTO {FTS_TABLE} (rowid, {', '.join(FTS_COLUMNS)}) VALUES (new.id, {_fts_values('new')}); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {PLEDGE_TABLE} BEGIN"
+    f" INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, {', '.join(FTS_COLUMNS)})"
+    f" VALUES ('delete', old.id, {_fts_values('old')}); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF {', '.join(FTS_COLUMNS)} ON {PLEDGE_TABLE} BEGIN"
+    f" INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, {', '.join(FTS_COLUMNS)})"
+    f" VALUES ('delete', old.id, {_fts_values('old')});"
+    f" INSERT INTO {FTS_TABLE} (rowid, {', '.join(FTS_COLUMNS)}) VALUES (new.id, {_fts_values('new')}); END",
+]
+
+POSTGRESQL_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"CREATE INDEX IF NOT EXISTS ix_pledges_donor_name_trgm ON {PLEDGE_TABLE} USING gin (donor_name gin_trgm_ops)",
+    f"CREATE INDEX IF NOT EXISTS ix_pledges_donor_email_trgm ON {PLEDGE_TABLE} USING gin (donor_email gin_trgm_ops)",
+    f"CREATE INDEX IF NOT EXISTS ix_pledges_reference_trgm ON {PLEDGE_TABLE} USING gin (reference_number gin_trgm_ops)",
+    f"CREATE INDEX IF NOT EXISTS ix_pledges_donor_mobile_prefix ON {PLEDGE_TABLE} (donor_mobile text_pattern_ops)",
+]
+
+# The FTS table and its triggers are (re)created whenever the pledge table is created
+for statement in SQLITE_DDL:
+    event.listen(EyeDonationPledge.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+for statement in POSTGRESQL_DDL:
+    event.listen(EyeDonationPledge.__table__, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+
+
+def _escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+class PledgeSearch:
+    """Index-backed, ranked search over pledges"""
+
+    _fts_ready = None
+    _trgm_ready = None
+
+    @staticmethod
+    def fts_query(term):
+        """
+        Turn free text into an FTS5 query: every word becomes a quoted prefix phrase.
+
+        Args:
+            term: Search text as typed by the admin
+
+        Returns:
+            str: FTS5 MATCH expression (empty when there is nothing to search)
+        """
+        words = [w for w in re.split(r'\s+', term.strip()) if w]
+        return ' '.join('"{}"*'.format(w.replace('"', '""')) for w in words)
+
+    @classmethod
+    def fts_available(cls):
+        """Whether the SQLite FTS table exists (checked once per process)."""
+        if cls._fts_ready is None:
+            cls._fts_ready = bool(db.session.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {'name': FTS_TABLE}
+            ).scalar())
+        return cls._fts_ready
+
+    @classmethod
+    def trgm_available(cls):
+        """Whether the PostgreSQL pg_trgm extension is installed (checked once per process)."""
+        if cls._trgm_ready is None:
+            cls._trgm_ready = bool(db.session.execute(
+                text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            ).scalar())
+        return cls._trgm_ready
+
+    @staticmethod
+    def _ilike_filter(query, term):
+        """Unindexed fallback: the original substring match on the four columns."""
+        return query.filter(
+            (EyeDonationPledge.donor_name.ilike(f'%{term}%')) |
+            (EyeDonationPledge.donor_mobile.ilike(f'%{term}%')) |
+            (EyeDonationPledge.donor_email.ilike(f'%{term}%')) |
+            (EyeDonationPledge.reference_number.ilike(f'%{term}%'))
+        ), None
+
+    @classmethod
+    def _match(cls, query, term):
+        """Filter `query` to matches; returns (query, rank expression or None)."""
+        dialect = db.engine.dialect.name
+
+        if dialect == 'sqlite' and cls.fts_available():
+            match = cls.fts_query(term)
+            if not match:
+                return query, None
+            weights = ', '.join(str(w) for w in FTS_WEIGHTS)
+            hits = (
+                select(
+                    literal_column('rowid').label('pledge_id'),
+                    literal_column(f'bm25({FTS_TABLE}, {weights})').label('rank')
+                )
+                .select_from(text(FTS_TABLE))
+                .where(text(f"{FTS_TABLE} MATCH :fts_match").bindparams(fts_match=match))
+                .subquery('search_hits')
+            )
+            query = query.join(hits, hits.c.pledge_id == EyeDonationPledge.id)
+            # bm25 is lower-is-better
+            return query, hits.c.rank.asc()
+
+        if dialect == 'postgresql':
+            escaped = _escape_like(term.strip())
+            contains, prefix = f'%{escaped}%', f'{escaped}%'
+            query = query.filter(or_(
+                EyeDonationPledge.donor_name.ilike(contains, escape='\\'),
+                EyeDonationPledge.donor_email.ilike(contains, escape='\\'),
+                EyeDonationPledge.reference_number.ilike(contains, escape='\\'),
+                EyeDonationPledge.donor_mobile.like(prefix, escape='\\'),
+            ))
+            # similarity() only exists once pg_trgm is installed (flask search-reindex)
+            similarity = func.greatest(
+                func.similarity(EyeDonationPledge.donor_name, term),
+                func.similarity(func.coalesce(EyeDonationPledge.donor_email, ''), term)
+            ) if cls.trgm_available() else 0.0
+            rank = case(
+                (func.lower(EyeDonationPledge.reference_number) == term.strip().lower(), 3.0),
+                (EyeDonationPledge.donor_mobile == term.strip(), 3.0),
+                (EyeDonationPledge.reference_number.ilike(prefix, escape='\\'), 2.0),
+                (EyeDonationPledge.donor_mobile.like(prefix, escape='\\'), 2.0),
+                else_=similarity
+            )
+            return query, rank.desc()
+
+        return cls._ilike_filter(query, term)
+
+    @classmethod
+    def filter(cls, query, term):
+        """
+        Restrict a pledge query to search matches, without ordering.
+
+        Args:
+            query: EyeDonationPledge query
+            term: Search text
+
+        Returns:
+            Query: Filtered query
+        """
+        if not term or not term.strip():
+            return query
+        return cls._match(query, term)[0]
+
+    @classmethod
+    def apply(cls, query, term):
+        """
+        Restrict a pledge query to search matches, best matches first.
+
+        Returns:
+            Query: Filtered query ordered by rank, then newest first
+        """
+        if not term or not term.strip():
+            return query.order_by(EyeDonationPledge.created_at.desc())
+        query, rank = cls._match(query, term)
+        if rank is not None:
+            query = query.order_by(rank)
+        return query.order_by(EyeDonationPledge.created_at.desc(), EyeDonationPledge.id.desc())
+
+    @classmethod
+    def reindex(cls):
+        """
+        Create the search indexes if missing and rebuild the SQLite FTS content.
+
+        Returns:
+            str: Dialect the indexes were built for
+        """
+        dialect = db.engine.dialect.name
+        with db.engine.begin() as conn:
+            if dialect == 'sqlite':
+                for statement in SQLITE_DDL:
+                    conn.execute(text(statement))
+                conn.execute(text(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('rebuild')"))
+            elif dialect == 'postgresql':
+                for statement in POSTGRESQL_DDL:
+                    conn.execute(text(statement))
+        cls._fts_ready = None
+        cls._trgm_ready = None
+        return dialect
+
+
+# ========================
+# Admin list filters
+# ========================
+PLEDGE_FILTER_KEYS = ('search', 'state', 'date_from', 'date_to')
+
+
+def pledge_filters_from_args(args):
+    """
+    Read the admin pledge list filters from request args.
+
+    Returns:
+        dict: search (from ?q= or ?search=), state, date_from, date_to
+    """
+    return {
+        'search': args.get('q') or args.get('search', ''),
+        'state': args.get('state', ''),
+        'date_from': args.get('date_from', ''),
+        'date_to': args.get('date_to', ''),
+    }
+
+
+def filter_pledges(filters, ranked=False):
+    """
+    Active pledges matching the admin list filters. Used by the pledge list,
+    the CSV export and background export jobs so all three agree.
+
+    Args:
+        filters: dict as returned by pledge_filters_from_args()
+        ranked: Order search matches by relevance (newest first otherwise)
+
+    Returns:
+        Query: EyeDonationPledge query
+    """
+    search = filters.get('search', '')
+    # A literal `is_active = true` (not a bound parameter), so the partial indexes apply
+    query = EyeDonationPledge.query.filter(EyeDonationPledge.is_active == True)
+
+    if ranked:
+        query = PledgeSearch.apply(query, search)
+    else:
+        query = PledgeSearch.filter(query, search)
+
+    if filters.get('state'):
+        query = query.filter(EyeDonationPledge.state == filters['state'])
+
+    # Date range (date_to is inclusive)
+    try:
+        if filters.get('date_from'):
+            query = query.filter(EyeDonationPledge.created_at >= datetime.strptime(filters['date_from'], '%Y-%m-%d'))
+        if filters.get('date_to'):
+            query = query.filter(EyeDonationPledge.created_at < datetime.strptime(filters['date_to'], '%Y-%m-%d') + timedelta(days=1))
+    except ValueError:
+        pass
+
+    return query
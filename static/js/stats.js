@@ -48,8 +48,7 @@ document.addEventListener('DOMContentLoaded', () => {
     }
 
     // 1. Load Summary Stats (Cards)
-    async function loadSummaryStats() {
-        const data = await fetchData('/neb/api/stats/summary');
+    function renderSummaryStats(data) {
         if (data) {
             const totalEl = document.getElementById('totalPledges');
             const todayEl = document.getElementById('todayPledges');
@@ -61,8 +60,7 @@ document.addEventListener('DOMContentLoaded', () => {
     }
 
     // 2. Load Monthly Chart
-    async function loadMonthlyChart() {
-        const data = await fetchData('/neb/api/stats/monthly');
+    function renderMonthlyChart(data) {
         const element = document.getElementById('monthlyChart');
         if (data && element) {
             const ctx = element.getContext('2d');
@@ -93,8 +91,7 @@ document.addEventListener('DOMContentLoaded', () => {
     }
 
     // 3. Load Weekly Chart
-    async function loadWeeklyChart() {
-        const data = await fetchData('/neb/api/stats/weekly');
+    function renderWeeklyChart(data) {
         const element = document.getElementById('weeklyChart');
         if (data && element) {
             const ctx = element.getContext('2d');
@@ -126,8 +123,7 @@ document.addEventListener('DOMContentLoaded', () => {
     }
 
     // 4. Load Yearly Chart
-    async function loadYearlyChart() {
-        const data = await fetchData('/neb/api/stats/yearly');
+    function renderYearlyChart(data) {
         const element = document.getElementById('yearlyChart');
         if (data && element) {
             const ctx = element.getContext('2d');
@@ -159,8 +155,7 @@ document.addEventListener('DOMContentLoaded', () => {
     }
 
     // 5. Load Top States
-    async function loadTopStates() {
-        const data = await fetchData('/neb/api/stats/states');
+    function renderTopStates(data) {
         const container = document.getElementById('topStatesList');
         if (data && container) {
             container.innerHTML = ''; // Clear loading state
@@ -210,8 +205,7 @@ document.addEventListener('DOMContentLoaded', () => {
     }
 
     // 6. Demographics
-    async function loadDemographics() {
-        const data = await fetchData('/neb/api/stats/demographics');
+    function renderDemographics(data) {
 
         // Age Chart
         const ageEl = document.getElementById('ageChart');
@@ -270,8 +264,7 @@ document.addEventListener('DOMContentLoaded', () => {
     }
 
     // 7. Hourly Activity
-    async function loadHourlyChart() {
-        const data = await fetchData('/neb/api/stats/hourly');
+    function renderHourlyChart(data) {
         const element = document.getElementById('hourlyChart');
         if (data && element) {
             new Chart(element.getContext('2d'), {
@@ -305,8 +298,7 @@ document.addEventListener('DOMContentLoaded', () => {
     }
 
     // 8. Historical Comparison
-    async function loadHistoricalChart() {
-        const data = await fetchData('/neb/api/stats/historical');
+    function renderHistoricalChart(data) {
         const element = document.getElementById('historicalChart');
         if (data && element) {
             const ctx = element.getContext('2d');
@@ -338,8 +330,7 @@ document.addEventListener('DOMContentLoaded', () => {
     }
 
     // 9. Comparative Metrics (MoM, YoY)
-    async function loadComparativeMetrics() {
-        const data = await fetchData('/neb/api/stats/comparative');
+    function renderComparativeMetrics(data) {
         if (data) {
             // MoM
             const momVal = document.getElementById('momGrowthValue');
@@ -362,8 +353,7 @@ document.addEventListener('DOMContentLoaded', () => {
     }
 
     // 10. Source Distribution
-    async function loadSourceChart() {
-        const data = await fetchData('/neb/api/stats/sources');
+    function renderSourceChart(data) {
         const element = document.getElementById('sourceChart');
         if (data && element) {
             new Chart(element.getContext('2d'), {
@@ -386,8 +376,7 @@ document.addEventListener('DOMContentLoaded', () => {
     }
 
     // 11. Consent Types
-    async function loadConsentChart() {
-        const data = await fetchData('/neb/api/stats/consent');
+    function renderConsentChart(data) {
         const element = document.getElementById('consentChart');
         if (data && element) {
             new Chart(element.getContext('2d'), {
@@ -413,18 +402,33 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
-    // Initialize all components
-    loadSummaryStats();
-    loadMonthlyChart();
-    loadWeeklyChart();
-    loadYearlyChart();
-    loadDemographics();
-    // loadHourlyChart();
-    loadHistoricalChart(); // New
-    loadComparativeMetrics(); // New
-    loadSourceChart(); // New
-    loadConsentChart(); // New
-    loadTopStates(); // Initial load only, complex list structure
+    async function loadSummaryStats() {
+        renderSummaryStats(await fetchData('/neb/api/stats/summary'));
+    }
+
+    // Initialize all components from a single bundle request
+    async function loadDashboard() {
+        const widgets = [
+            'summary', 'monthly', 'weekly', 'yearly', 'demographics',
+            'historical', 'comparative', 'sources', 'consent', 'states'
+        ];
+        const bundle = await fetchData(`/neb/api/stats/bundle?widgets=${widgets.join(',')}`);
+        if (!bundle) return;
+
+        renderSummaryStats(bundle.summary);
+        renderMonthlyChart(bundle.monthly);
+        renderWeeklyChart(bundle.weekly);
+        renderYearlyChart(bundle.yearly);
+        renderDemographics(bundle.demographics);
+        // renderHourlyChart(bundle.hourly);
+        renderHistoricalChart(bundle.historical);
+        renderComparativeMetrics(bundle.comparative);
+        renderSourceChart(bundle.sources);
+        renderConsentChart(bundle.consent);
+        renderTopStates(bundle.states); // Initial load only, complex list structure
+    }
+
+    loadDashboard();
 
     // Auto-refresh summary only every 30s to be light
     setInterval(loadSummaryStats, 30000);
@@ -0,0 +1,240 @@
+"""
+Post-Commit Task Queue
+Runs side effects of a request (card pre-rendering, notification emails)
+after the database commit, off the request thread.
+
+- Tasks are rows in a local SQLite file (TASK_QUEUE_PATH), so queued work
+  survives restarts and crashes; a task whose worker died mid-run is picked up
+  again once its lease (TASK_LEASE_SECONDS) expires.
+- enqueue_after_commit() only records the task on the SQLAlchemy session. It is
+  written to the queue when that session commits and dropped on rollback, so
+  nothing runs for a pledge that was never saved.
+- Each web worker process runs TASK_WORKERS threads that claim tasks one at a
+  time (an atomic UPDATE ... RETURNING), so several processes can share the
+  file. Failures are retried with exponential backoff up to TASK_MAX_ATTEMPTS.
+
+Handlers are registered with @task_queue.task('name') and run inside an app
+context; their payload must be JSON-serialisable.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import traceback
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+PENDING_KEY = 'post_commit_tasks'
+POLL_INTERVAL = 2        # seconds an idle worker waits before checking the file again
+DONE_RETENTION = 7 * 86400
+
+
+class TaskQueue:
+    """Durable SQLite-backed queue with an in-process worker pool"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.path = None
+        self.workers = 2
+        self.max_attempts = 5
+        self.lease = 300
+        self.handlers = {}
+
+        self._local = threading.local()
+        self._wakeup = threading.Event()
+        self._threads = []
+        self._pid = None
+        self._lock = threading.Lock()
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.path = app.config.get('TASK_QUEUE_PATH') or os.path.join(app.instance_path, 'tasks.db')
+        self.workers = app.config.get('TASK_WORKERS', 2)
+        self.max_attempts = app.config.get('TASK_MAX_ATTEMPTS', 5)
+        self.lease = app.config.get('TASK_LEASE_SECONDS', 300)
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._connect().execute(
+            "CREATE TABLE IF NOT EXISTS tasks ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, payload TEXT NOT NULL,"
+            " status TEXT NOT NULL DEFAULT 'queued', attempts INTEGER NOT NULL DEFAULT 0,"
+            " run_after REAL NOT NULL, created_at REAL NOT NULL, finished_at REAL,"
+            " locked_by TEXT, locked_at REAL, last_error TEXT)"
+        )
+        self._connect().execute(
+            "CREATE INDEX IF NOT EXISTS ix_tasks_status_run_after ON tasks (status, run_after)"
+        )
+
+        # Workers start with the first request of each process (threads do not survive fork)
+        app.before_request(self.start)
+        app.extensions['task_queue'] = self
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    # ========================
+    # Registration / enqueue
+    # ========================
+    def task(self, name):
+        """Register a handler: @task_queue.task('send_email')"""
+        def decorator(f):
+            self.handlers[name] = f
+            return f
+        return decorator
+
+    def enqueue(self, name, delay=0, **payload):
+        """
+        Write a task to the queue now.
+
+        Returns:
+            int: Task id
+        """
+        if name not in self.handlers:
+            raise ValueError(f"Unknown task: {name}")
+        now = time.time()
+        task_id = self._connect().execute(
+            "INSERT INTO tasks (name, payload, run_after, created_at) VALUES (?, ?, ?, ?)",
+            (name, json.dumps(payload), now + delay, now)
+        ).lastrowid
+        self._wakeup.set()
+        return task_id
+
+    def enqueue_after_commit(self, session, name, **payload):
+        """Queue a task once `session` commits (dropped if it rolls back)."""
+        if name not in self.handlers:
+            raise ValueError(f"Unknown task: {name}")
+        session.info.setdefault(PENDING_KEY, []).append((name, payload))
+
+    # ========================
+    # Workers
+    # ========================
+    def start(self):
+        """Start this process's worker threads if they are not running."""
+        if self._pid == os.getpid() or not self.workers:
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._threads = [
+                threading.Thread(target=self._work, name=f'task-worker-{i}', daemon=True)
+                for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def _claim(self):
+        now = time.time()
+        row = self._connect().execute(
+            "UPDATE tasks SET status = 'running', attempts = attempts + 1, locked_by = ?, locked_at = ?"
+            " WHERE id = (SELECT id FROM tasks"
+            "   WHERE (status = 'queued' AND run_after <= ?) OR (status = 'running' AND locked_at < ?)"
+            "   ORDER BY id LIMIT 1)"
+            " RETURNING id, name, payload, attempts",
+            (f"{os.getpid()}:{threading.get_ident()}", now, now, now - self.lease)
+        ).fetchone()
+        return row
+
+    def _work(self):
+        while True:
+            try:
+                claimed = self._claim()
+            except sqlite3.Error:
+                claimed = None
+            if claimed is None:
+                self._wakeup.wait(POLL_INTERVAL)
+                self._wakeup.clear()
+                continue
+            self.run(*claimed)
+
+    def run(self, task_id, name, payload, attempts):
+        """Run one claimed task and record the outcome."""
+        conn = self._connect()
+        try:
+            with self.app.app_context():
+                self.handlers[name](**json.loads(payload))
+        except Exception as e:
+            error = f"{e}\n{traceback.format_exc(limit=5)}"
+            if attempts >= self.max_attempts:
+                conn.execute(
+                    "UPDATE tasks SET status = 'failed', finished_at = ?, last_error = ? WHERE id = ?",
+                    (time.time(), error, task_id)
+                )
+                self.app.logger.error(f"Task {name} #{task_id} failed after {attempts} attempts: {e}")
+            else:
+                conn.execute(
+                    "UPDATE tasks SET status = 'queued', run_after = ?, last_error = ? WHERE id = ?",
+                    (time.time() + 5 * 2 ** (attempts - 1), error, task_id)
+                )
+                self.app.logger.warning(f"Task {name} #{task_id} failed (attempt {attempts}), will retry: {e}")
+            return False
+
+        conn.execute(
+            "UPDATE tasks SET status = 'done', finished_at = ?, last_error = NULL WHERE id = ?",
+            (time.time(), task_id)
+        )
+        conn.execute("DELETE FROM tasks WHERE status = 'done' AND finished_at < ?", (time.time() - DONE_RETENTION,))
+        return True
+
+    def run_pending(self):
+        """
+        Run every task that is due, in the calling thread (CLI / tests).
+
+        Returns:
+            int: Tasks run
+        """
+        count = 0
+        while True:
+            claimed = self._claim()
+            if claimed is None:
+                return count
+            self.run(*claimed)
+            count += 1
+
+    def stats(self):
+        """Task counts by status."""
+        return dict(self._connect().execute("SELECT status, COUNT(*) FROM tasks GROUP BY status").fetchall())
+
+    def retry_failed(self):
+        """Re-queue failed tasks with a fresh attempt budget; returns how many."""
+        return self._connect().execute(
+            "UPDATE tasks SET status = 'queued', attempts = 0, run_after = ? WHERE status = 'failed'",
+            (time.time(),)
+        ).rowcount
+
+
+task_queue = TaskQueue()
+
+
+# ========================
+# Session hooks
+# ========================
+@event.listens_for(Session, 'after_commit')
+def _flush_pending_tasks(session):
+    pending = session.info.pop(PENDING_KEY, None)
+    for name, payload in pending or ():
+        try:
+            task_queue.enqueue(name, **payload)
+        except Exception as e:
+            # The commit already happened; losing a side effect must not fail the request
+            if task_queue.app is not None:
+                task_queue.app.logger.error(f"Could not queue task {name}: {e}")
+
+
+@event.listens_for(Session, 'after_rollback')
+def _drop_pending_tasks(session):
+    session.info.pop(PENDING_KEY, None)
@@ -0,0 +1,197 @@
+"""
+Time Buckets
+Dialect-aware time bucketing for time-series queries.
+
+bucket(unit, column) groups a date/datetime column by:
+- 'hour', 'day', 'week' (ISO, starting Monday), 'month', 'year': the start of
+  the bucket, as a datetime ('hour') or a date
+- 'hour_of_day' (0-23) and 'day_of_week' (0 = Monday ... 6 = Sunday)
+
+and compiles to the native form for each backend:
+- PostgreSQL: date_trunc() / EXTRACT(isodow ...) on the value cast to
+  timestamp, which keeps the expression IMMUTABLE
+- SQLite: date() / strftime() with literal formats
+so results come back as the same Python types everywhere and bucket
+expressions can be indexed (bucket_index()): a query grouping by the same
+expression is then served from the index instead of computing it per row.
+
+Filters should not wrap the column in a function: in_range() / in_bucket()
+turn a bucket into a plain half-open range on the column so its B-tree index
+is used. truncate(), shift() and series() mirror the SQL in Python, for
+filling gaps with real calendar buckets.
+"""
+
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import Date, DateTime, Index, Integer, and_
+from sqlalchemy.exc import CompileError
+from sqlalchemy.schema import CreateIndex
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+from sqlalchemy.sql.visitors import InternalTraversal
+
+
+UNIT_TYPES = {
+    'hour': DateTime,
+    'day': Date,
+    'week': Date,
+    'month': Date,
+    'year': Date,
+    'hour_of_day': Integer,
+    'day_of_week': Integer,
+}
+
+SQLITE_FORMS = {
+    'hour': "strftime('%Y-%m-%d %H:00:00', {0})",
+    'day': "date({0})",
+    'week': "date({0}, 'weekday 0', '-6 days')",
+    'month': "strftime('%Y-%m-01', {0})",
+    'year': "strftime('%Y-01-01', {0})",
+    'hour_of_day': "CAST(strftime('%H', {0}) AS INTEGER)",
+    'day_of_week': "((CAST(strftime('%w', {0}) AS INTEGER) + 6) % 7)",
+}
+
+POSTGRESQL_FORMS = {
+    'hour': "date_trunc('hour', CAST({0} AS TIMESTAMP))",
+    'day': "CAST(date_trunc('day', CAST({0} AS TIMESTAMP)) AS DATE)",
+    'week': "CAST(date_trunc('week', CAST({0} AS TIMESTAMP)) AS DATE)",
+    'month': "CAST(date_trunc('month', CAST({0} AS TIMESTAMP)) AS DATE)",
+    'year': "CAST(date_trunc('year', CAST({0} AS TIMESTAMP)) AS DATE)",
+    'hour_of_day': "CAST(EXTRACT(hour FROM CAST({0} AS TIMESTAMP)) AS INTEGER)",
+    'day_of_week': "CAST(EXTRACT(isodow FROM CAST({0} AS TIMESTAMP)) AS INTEGER) - 1",
+}
+
+# Portable fallbacks for other backends
+GENERIC_FORMS = {
+    'day': "CAST({0} AS DATE)",
+    'hour_of_day': "CAST(EXTRACT(hour FROM {0}) AS INTEGER)",
+}
+
+# Indexes declared with bucket_index(), created for existing databases by create_indexes()
+BUCKET_INDEXES = []
+
+
+class bucket(FunctionElement):
+    """bucket('month', Model.created_at): the bucket a date/datetime value falls in"""
+
+    name = 'time_bucket'
+    inherit_cache = True
+    # The unit is part of the statement cache key (one compiled form per unit)
+    _traverse_internals = FunctionElement._traverse_internals + [('unit', InternalTraversal.dp_string)]
+
+    def __init__(self, unit, expr):
+        if unit not in UNIT_TYPES:
+            raise ValueError(f"Unknown time bucket: {unit}")
+        self.unit = unit
+        self.type = UNIT_TYPES[unit]()
+        super().__init__(expr)
+
+
+def _compile(forms, element, compiler, **kw):
+    if element.unit not in forms:
+        raise CompileError(f"Time bucket '{element.unit}' is not supported on {compiler.dialect.name}")
+    return forms[element.unit].format(compiler.process(element.clauses, **kw))
+
+
+@compiles(bucket)
+def _compile_generic(element, compiler, **kw):
+    return _compile(GENERIC_FORMS, element, compiler, **kw)
+
+
+@compiles(bucket, 'sqlite')
+def _compile_sqlite(element, compiler, **kw):
+    return _compile(SQLITE_FORMS, element, compiler, **kw)
+
+
+@compiles(bucket, 'postgresql')
+def _compile_postgresql(element, compiler, **kw):
+    # Parenthesised so the expression is also valid inside CREATE INDEX
+    return f"({_compile(POSTGRESQL_FORMS, element, compiler, **kw)})"
+
+
+def bucket_index(name, *expressions):
+    """
+    Declare an index over bucket expressions (and plain columns), like db.Index.
+
+    Call it after the model class; create_indexes() adds it to existing databases.
+    """
+    index = Index(name, *expressions)
+    BUCKET_INDEXES.append(index)
+    return index
+
+
+def create_indexes(engine):
+    """Create any declared bucket index missing from an existing database."""
+    # Expression indexes cannot be reflected (checkfirst), so let the database skip existing ones
+    with engine.begin() as conn:
+        for index in BUCKET_INDEXES:
+            conn.execute(CreateIndex(index, if_not_exists=True))
+
+
+# ========================
+# Ranges
+# ========================
+def in_range(column, start, end):
+    """start <= column < end: index-friendly, unlike filtering on a bucket of the column."""
+    return and_(column >= start, column < end)
+
+
+def in_bucket(unit, column, value):
+    """Rows of `column` falling in the same bucket as `value` (e.g. this month)."""
+    start = truncate(unit, value)
+    return in_range(column, start, shift(unit, start, 1))
+
+
+# ========================
+# Python mirrors of the SQL
+# ========================
+def truncate(unit, value):
+    """Start of the 'hour'/'day'/'week'/'month'/'year' bucket containing value."""
+    if unit == 'hour':
+        if not isinstance(value, datetime):
+            value = datetime.combine(value, datetime.min.time())
+        return value.replace(minute=0, second=0, microsecond=0)
+
+    day = value.date() if isinstance(value, datetime) else value
+    if unit == 'day':
+        return day
+    if unit == 'week':
+        return day - timedelta(days=day.weekday())
+    if unit == 'month':
+        return day.replace(day=1)
+    if unit == 'year':
+        return day.replace(month=1, day=1)
+    raise ValueError(f"Time bucket '{unit}' has no start")
+
+
+def shift(unit, start, count):
+    """The bucket start `count` buckets after (negative: before) the bucket starting at `start`."""
+    if unit == 'hour':
+        return start + timedelta(hours=count)
+    if unit == 'day':
+        return start + timedelta(days=count)
+    if unit == 'week':
+        return start + timedelta(weeks=count)
+    if unit == 'month':
+        index = start.year * 12 + start.month - 1 + count
+        return date(index // 12, index % 12 + 1, 1)
+    if unit == 'year':
+        return date(start.year + count, 1, 1)
+    raise ValueError(f"Time bucket '{unit}' has no start")
+
+
+def series(unit, count, end=None):
+    """
+    The last `count` buckets, oldest first.
+
+    Args:
+        unit: 'hour', 'day', 'week', 'month' or 'year'
+        count: Number of buckets
+        end: Any value in the newest bucket (defaults to now, in UTC like the
+            stored timestamps and the rollup days)
+
+    Returns:
+        list: Start of each bucket
+    """
+    last = truncate(unit, end or datetime.utcnow())
+    return [shift(unit, last, -i) for i in range(count - 1, -1, -1)]
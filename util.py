@@ -1,11 +1,146 @@
-import qrcode
 from PIL import Image, ImageDraw, ImageFont
-from typing import Optional, Tuple, Dict
+from typing import Optional, Tuple, Dict, List
+from io import BytesIO
+import hashlib
+import mmap
+import threading
 import uuid
 import os
 
 import math
 
+from qr_codes import render_qr_canvas
+
+DEFAULT_FONT_PATH = "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
+
+# QR placeholder on the front template (from the card design)
+CARD_QR_POSITION = (2635, 677)       # (x, y)
+CARD_QR_BOX = (1325, 1188)           # placeholder width, height
+
+# Text positions on the back template
+CARD_BACK_COORDS = {
+    "name": (1265,1392), # (150, 160),
+    "dob": (4109,1397), # (495, 160),
+    "address":(1392,1683),  # (170, 192),
+    "ref_no": (1392, 1925),
+    "phone": (4560, 1925),
+
+    "witness_name": (1320, 2459),
+    "witness_relation": (1441, 2662),
+    "witness_phone1": (1271, 2866),
+}
+
+CARD_TEXT_COLOR = (10, 70, 80)
+
+
+def _scaled(point: Tuple[int, int], scale: float) -> Tuple[int, int]:
+    return (round(point[0] * scale), round(point[1] * scale))
+
+
+class CardTemplateRegistry:
+    """
+    Per-process cache of decoded card templates and fonts.
+
+    Each (template, scale) is decoded and resized once; callers draw on a copy
+    from canvas(). With mmap_dir set, the decoded pixels are also written there
+    as a raw RGBX file and memory-mapped, so every process rendering cards
+    shares one copy of each template through the page cache instead of holding
+    its own. Entries are keyed on the file's mtime, so a replaced template is
+    picked up without a restart.
+    """
+
+    def __init__(self, mmap_dir: Optional[str] = None):
+        self.mmap_dir = mmap_dir
+        self._templates = {}
+        self._fonts = {}
+        self._lock = threading.Lock()
+
+    def configure(self, mmap_dir: Optional[str] = None):
+        """Set where raw template buffers are stored (None = process memory only)."""
+        with self._lock:
+            if mmap_dir != self.mmap_dir:
+                self.mmap_dir = mmap_dir
+                self._templates.clear()
+
+    def _decode(self, path: str, scale: float) -> Image.Image:
+        img = Image.open(path).convert("RGB")
+        if scale != 1.0:
+            img = img.resize(_scaled(img.size, scale), Image.LANCZOS)
+        return img
+
+    def _mapped(self, path: str, mtime: float, scale: float) -> Image.Image:
+        """Decode into a raw RGBX file under mmap_dir (once) and map it read-only."""
+        digest = hashlib.sha1(f"{os.path.abspath(path)}|{mtime}|{scale}".encode()).hexdigest()[:16]
+        raw_path = os.path.join(self.mmap_dir, f"card_template_{digest}.rgbx")
+
+        # Only the header is read here
+        with Image.open(path) as header:
+            size = header.size if scale == 1.0 else _scaled(header.size, scale)
+
+        if not os.path.exists(raw_path):
+            img = self._decode(path, scale).convert("RGBX")
+            tmp_path = f"{raw_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as fh:
+                fh.write(img.tobytes())
+            os.replace(tmp_path, raw_path)
+
+        with open(raw_path, "rb") as fh:
+            buffer = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        # RGBX is stored 4 bytes per pixel, so Pillow can use the mapping in place
+        return Image.frombuffer("RGBX", size, buffer, "raw", "RGBX", 0, 1)
+
+    def template(self, path: str, scale: float = 1.0) -> Image.Image:
+        """
+        Shared decoded template. Do not draw on it; use canvas() for that.
+
+        :param path: Template image path
+        :param scale: Resize factor (e.g. 0.32 for a 96 dpi copy of a 300 dpi card)
+        :return: RGB (or memory-mapped RGBX) image
+        """
+        mtime = os.stat(path).st_mtime
+        key = (os.path.abspath(path), mtime, scale)
+        img = self._templates.get(key)
+        if img is None:
+            with self._lock:
+                img = self._templates.get(key)
+                if img is None:
+                    if self.mmap_dir:
+                        os.makedirs(self.mmap_dir, exist_ok=True)
+                        img = self._mapped(path, mtime, scale)
+                    else:
+                        img = self._decode(path, scale)
+                    # Drop older versions of the same template
+                    for old in [k for k in self._templates if k[0] == key[0] and k[1] != mtime]:
+                        del self._templates[old]
+                    self._templates[key] = img
+        return img
+
+    def canvas(self, path: str, scale: float = 1.0) -> Image.Image:
+        """Writable RGB copy of a template."""
+        return card_canvas(self.template(path, scale))
+
+    def font(self, path: Optional[str] = None, size: int = 105) -> ImageFont.FreeTypeFont:
+        """Loaded TrueType font, cached per (path, size)."""
+        key = (path or DEFAULT_FONT_PATH, size)
+        font = self._fonts.get(key)
+        if font is None:
+            font = self._fonts[key] = ImageFont.truetype(key[0], size)
+        return font
+
+    def clear(self):
+        with self._lock:
+            self._templates.clear()
+            self._fonts.clear()
+
+
+card_templates = CardTemplateRegistry()
+
+
+def card_canvas(template: Image.Image) -> Image.Image:
+    """Writable RGB copy of a decoded template."""
+    return template.copy() if template.mode == "RGB" else template.convert("RGB")
+
+
 def get_image_dpi(img, fallback=300):
     """
     Returns DPI from image metadata if available,
@@ -49,6 +184,145 @@ def images_to_pdf(
     return output_path
 
 
+def images_to_pdf_bytes(images: List[Image.Image], dpi: int = 300) -> bytes:
+    """
+    Combine in-memory images into a multi-page PDF without touching disk.
+
+    Returns: PDF file content
+    """
+    first, *rest = [img if img.mode == "RGB" else img.convert("RGB") for img in images]
+    buffer = BytesIO()
+    first.save(buffer, format="PDF", save_all=True, append_images=rest, resolution=dpi)
+    return buffer.getvalue()
+
+
+def image_to_jpeg(img: Image.Image, quality: int = 90) -> bytes:
+    """Encode an image as baseline RGB JPEG bytes (for JpegPdfWriter)."""
+    buffer = BytesIO()
+    (img if img.mode == "RGB" else img.convert("RGB")).save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+class JpegPdfWriter:
+    """
+    Streams JPEG pages into a PDF file one at a time.
+
+    Each page is a single full-page image whose JPEG bytes are embedded as-is
+    (DCTDecode), so nothing is re-encoded and only the current page is held in
+    memory. Suitable for multi-thousand-page card runs.
+
+    Usage:
+        with open(path, "wb") as fh:
+            writer = JpegPdfWriter(fh)
+            writer.add_page(jpeg_bytes, width, height, dpi=300)
+            writer.close()
+    """
+
+    def __init__(self, fileobj):
+        self._fh = fileobj
+        self._offsets = {}
+        self._page_ids = []
+        # 1 = catalog, 2 = page tree (written at close, once all pages are known)
+        self._next_id = 3
+        self._pos = 0
+        self._write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    @property
+    def page_count(self) -> int:
+        return len(self._page_ids)
+
+    def _write(self, data: bytes):
+        self._fh.write(data)
+        self._pos += len(data)
+
+    def _object(self, obj_id: int, body: bytes, stream: Optional[bytes] = None):
+        self._offsets[obj_id] = self._pos
+        self._write(f"{obj_id} 0 obj\n".encode() + body)
+        if stream is not None:
+            self._write(b"\nstream\n")
+            self._write(stream)
+            self._write(b"\nendstream")
+        self._write(b"\nendobj\n")
+
+    def _reserve(self, count: int) -> List[int]:
+        ids = list(range(self._next_id, self._next_id + count))
+        self._next_id += count
+        return ids
+
+    def add_page(self, jpeg: bytes, width: int, height: int, dpi: int = 300):
+        """
+        Append one page showing a JPEG at its full size.
+
+        :param jpeg: Baseline RGB JPEG bytes (see image_to_jpeg)
+        :param width: Image width in pixels
+        :param height: Image height in pixels
+        :param dpi: Resolution, which sets the physical page size
+        """
+        image_id, content_id, page_id = self._reserve(3)
+        w_pt, h_pt = width * 72.0 / dpi, height * 72.0 / dpi
+
+        self._object(image_id, (
+            f"<< /Type /XObject /Subtype /Image /Width {width} /Height {height}"
+            f" /ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /DCTDecode"
+            f" /Length {len(jpeg)} >>"
+        ).encode(), jpeg)
+
+        content = f"q {w_pt:.4f} 0 0 {h_pt:.4f} 0 0 cm /Im0 Do Q".encode()
+        self._object(content_id, f"<< /Length {len(content)} >>".encode(), content)
+
+        self._object(page_id, (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {w_pt:.4f} {h_pt:.4f}]"
+            f" /Resources << /XObject << /Im0 {image_id} 0 R >> >> /Contents {content_id} 0 R >>"
+        ).encode())
+        self._page_ids.append(page_id)
+
+    def close(self):
+        """Write the page tree, cross-reference table and trailer."""
+        kids = " ".join(f"{page_id} 0 R" for page_id in self._page_ids)
+        self._object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        self._object(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(self._page_ids)} >>".encode())
+
+        xref_pos = self._pos
+        size = self._next_id
+        lines = [f"xref\n0 {size}\n", "0000000000 65535 f \n"]
+        lines += [f"{self._offsets[obj_id]:010d} 00000 n \n" for obj_id in range(1, size)]
+        self._write("".join(lines).encode())
+        self._write(f"trailer\n<< /Size {size} /Root 1 0 R >>\nstartxref\n{xref_pos}\n%%EOF\n".encode())
+
+
+def compose_card_back(
+    template: Image.Image,
+    font: ImageFont.FreeTypeFont,
+    fields: Dict[str, str],
+    color: Tuple[int, int, int] = CARD_TEXT_COLOR,
+    coords: Optional[Dict[str, Tuple[int, int]]] = None,
+    scale: float = 1.0,
+) -> Image.Image:
+    """
+    Draw donor & witness details onto a copy of the back template.
+
+    :param template: Decoded back template (left untouched)
+    :param font: Loaded TrueType font (already sized for scale)
+    :param fields: name, dob, address, ref_no, phone, witness_name,
+                   witness_relation, witness_phone1 (missing/empty are skipped)
+    :param scale: Template scale relative to the design; coords are scaled to match
+    :return: New card image
+    """
+    img = card_canvas(template)
+    draw = ImageDraw.Draw(img)
+
+    positions = dict(CARD_BACK_COORDS)
+    if coords:
+        positions.update(coords)
+
+    for key, point in positions.items():
+        text = fields.get(key)
+        if text:
+            draw.text(_scaled(point, scale), text.strip(), font=font, fill=color)
+
+    return img
+
+
 def fill_eye_donor_card_fields(
     template_path: str,
     output_dir: str,
@@ -74,46 +348,25 @@ def fill_eye_donor_card_fields(
 
     os.makedirs(output_dir, exist_ok=True)
 
-    img = Image.open(template_path).convert("RGB")
-    draw = ImageDraw.Draw(img)
-
-    if font_path is None:
-        font_path = "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
-
-    font = ImageFont.truetype(font_path, font_size)
-
-    # Default coordinates (tune once if needed)
-    default_coords = {
-        "name": (1265,1392), # (150, 160),
-        "dob": (4109,1397), # (495, 160),
-        "address":(1392,1683),  # (170, 192),
-        "ref_no": (1392, 1925),
-        "phone": (4560, 1925),
-
-        "witness_name": (1320, 2459),
-        "witness_relation": (1441, 2662),
-        "witness_phone1": (1271, 2866),
-    }
-
-    if coords:
-        default_coords.update(coords)
-
-    def put_text(key: str, text: str):
-        if text:
-            x, y = default_coords[key]
-            draw.text((x, y), text.strip(), font=font, fill=color)
-
-    # Donor fields
-    put_text("name", name)
-    put_text("dob", dob)
-    put_text("address", address)
-    put_text("ref_no", ref_no)
-    put_text("phone", phone)
-
-    # Witness fields
-    put_text("witness_name", witness_name)
-    put_text("witness_relation", witness_relation)
-    put_text("witness_phone1", witness_phone1)
+    img = compose_card_back(
+        card_templates.template(template_path),
+        card_templates.font(font_path, font_size),
+        {
+            # Donor fields
+            "name": name,
+            "dob": dob,
+            "address": address,
+            "ref_no": ref_no,
+            "phone": phone,
+
+            # Witness fields
+            "witness_name": witness_name,
+            "witness_relation": witness_relation,
+            "witness_phone1": witness_phone1,
+        },
+        color=color,
+        coords=coords,
+    )
 
     # Unique output filename
     filename = f"eye_donor_card_back_{uuid.uuid4().hex[:10]}.png"
@@ -125,22 +378,37 @@ def fill_eye_donor_card_fields(
 
 
 def make_qr_canvas(qr_data: str, box_w: int, box_h: int) -> Image.Image:
-    # 1) Generate QR (square) 
-    qr = qrcode.QRCode( version=None, error_correction=qrcode.constants.ERROR_CORRECT_M, box_size=10, border=2, ) 
-    qr.add_data(qr_data) 
-    qr.make(fit=True) 
-    qr_img = qr.make_image( fill_color="black", back_color="white" ).convert("RGB") 
-    # Resize QR to fit height (square) 
-    qr_size = min(box_w, box_h) # 97 
-    qr_img = qr_img.resize((qr_size, qr_size), Image.NEAREST) 
-    # 2) Create white canvas of exact placeholder size 
-    qr_canvas = Image.new("RGB", (box_w, box_h), "white") 
-    # Center QR in placeholder 
-    offset_x = (box_w - qr_size) // 2 
-    offset_y = (box_h - qr_size) // 2 
-    qr_canvas.paste(qr_img, (offset_x, offset_y))
-
-    return qr_canvas
+    """
+    QR code centered on a white placeholder of exactly box_w x box_h.
+
+    Rendered straight from the module matrix by qr_codes (cached per payload);
+    this returns a copy the caller may draw on.
+    """
+    return render_qr_canvas(qr_data, box_w, box_h).copy()
+
+
+def compose_card_front(
+    template: Image.Image,
+    qr_data: str,
+    position: Tuple[int, int] = CARD_QR_POSITION,
+    box: Tuple[int, int] = CARD_QR_BOX,
+    scale: float = 1.0,
+    qr_image: Optional[Image.Image] = None,
+) -> Image.Image:
+    """
+    Paste a QR code for qr_data onto a copy of the front template.
+
+    :param template: Decoded front template (left untouched)
+    :param qr_data: Text / URL to encode in QR
+    :param scale: Template scale relative to the design; position and box are scaled to match
+    :param qr_image: Pre-rendered placeholder (e.g. from qr_codes.render_qr_batch)
+    :return: New card image
+    """
+    card = card_canvas(template)
+    if qr_image is None:
+        qr_image = render_qr_canvas(qr_data, *_scaled(box, scale))
+    card.paste(qr_image, _scaled(position, scale))
+    return card
 
 
 def generate_eye_donor_card(
@@ -157,17 +425,10 @@ def generate_eye_donor_card(
     :return: Path to generated image
     """
 
-    # QR placeholder configuration (from your design)
-    QR_POSITION = (2635, 677)      # (x, y)
-    QR_BOX_W, QR_BOX_H = 1325, 1188  # placeholder size
-
     os.makedirs(output_dir, exist_ok=True)
 
-    qr_canvas = make_qr_canvas(qr_data, QR_BOX_W, QR_BOX_H)
-
-    # 3) Load template & paste QR
-    card = Image.open(template_image).convert("RGB")
-    card.paste(qr_canvas, QR_POSITION)
+    # Load template & paste QR
+    card = compose_card_front(card_templates.template(template_image), qr_data)
 
     # 4) Save output
     filename = f"eye_donor_card_{uuid.uuid4().hex[:8]}.png"
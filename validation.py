@@ -0,0 +1,63 @@
+"""
+Pledge Validation
+Server-side rules for a pledge, shared by the web form and bulk import.
+
+Rules are keyed on the pledge form's field names. They are applied rule by
+rule over a whole batch of rows (one pass down each column), so a bulk import
+checks thousands of rows in a handful of loops, and the web form is simply a
+batch of one. Both paths therefore always enforce exactly the same rules.
+"""
+
+# (field, message) for fields that must be present, in the order errors are reported
+REQUIRED_FIELDS = [
+    ('donor_name', 'Donor name is required'),
+    ('address_line1', 'Address is required'),
+    ('city', 'City is required'),
+    ('state', 'State is required'),
+    ('pincode', 'Pincode is required'),
+    ('donor_mobile', 'Mobile number is required'),
+    # Email is optional in the UI, so it is not required here
+    ('witness1_name', 'Witness 1 name is required'),
+    ('donor_consent', 'Consent must be given'),
+]
+
+# (field, check, message) applied to fields that have a value
+FORMAT_RULES = [
+    ('donor_email', lambda value: '@' in value, 'Invalid email address'),
+    ('donor_mobile', lambda value: value.isdigit(), 'Mobile number must contain only digits'),
+]
+
+
+def validate_batch(rows):
+    """
+    Validate a batch of pledges.
+
+    Args:
+        rows: Sequence of mappings keyed by pledge form field name
+
+    Returns:
+        list: One list of error messages per row (empty when the row is valid)
+    """
+    errors = [[] for _ in rows]
+
+    for field, message in REQUIRED_FIELDS:
+        for row_errors, value in zip(errors, [row.get(field) for row in rows]):
+            if not value:
+                row_errors.append(message)
+
+    for field, check, message in FORMAT_RULES:
+        for row_errors, value in zip(errors, [row.get(field) for row in rows]):
+            if value and not check(value):
+                row_errors.append(message)
+
+    return errors
+
+
+def validate_pledge_data(form_data):
+    """
+    Validate one pledge (the web form).
+
+    Returns:
+        list: Error messages (empty when valid)
+    """
+    return validate_batch([form_data])[0]